@@ -11,6 +11,7 @@ from cohort_selection_ontology.core.terminology.client import (
 )
 from cohort_selection_ontology.model.query_metadata import ResourceQueryingMetaData
 from cohort_selection_ontology.model.tree_map import (
+    CompactTreeMap,
     ContextualizedTermCodeInfo,
     ContextualizedTermCodeInfoList,
     TermEntryNode,
@@ -81,7 +82,7 @@ class UITreeGenerator:
         fhir_profile_snapshot: StructureDefinitionSnapshot,
         applicable_querying_meta_data: List[ResourceQueryingMetaData],
         module_dir_name: str,
-    ) -> List[TreeMap]:
+    ) -> List[TreeMap | CompactTreeMap]:
         """
         Translates the given FHIR profile snapshot into a UI tree
         :param fhir_profile_snapshot: FHIR profile snapshot json representation
@@ -89,9 +90,9 @@ class UITreeGenerator:
         :param module_dir_name: Name of the module directory
         :return: root of the ui tree
         """
-        result_map: dict[(TermCode, str), TreeMap] = {}
+        result_map: dict[(TermCode, str), TreeMap | CompactTreeMap] = {}
         for qmd in applicable_querying_meta_data:
-            tree_maps: List[TreeMap] = []
+            tree_maps: List[TreeMap | CompactTreeMap] = []
             if qmd.term_code_defining_id:
                 tree_maps = self.get_term_entries_by_id(
                     fhir_profile_snapshot, qmd.term_code_defining_id, module_dir_name
@@ -113,9 +114,19 @@ class UITreeGenerator:
                     result_map[(context, tree_map.system)] = tree_map
                 else:
                     # Add entries of tree map to existing tree map with same context and system URL
-                    result_map[(context, tree_map.system)].entries.update(
-                        tree_map.entries
-                    )
+                    existing = result_map[(context, tree_map.system)]
+                    if isinstance(existing, TreeMap) and isinstance(tree_map, TreeMap):
+                        existing.entries.update(tree_map.entries)
+                    else:
+                        # Compact tree maps are immutable and have to be rebuilt
+                        result_map[(context, tree_map.system)] = (
+                            CompactTreeMap.from_entries(
+                                {**existing.entries, **tree_map.entries}.values(),
+                                context,
+                                existing.system,
+                                existing.version,
+                            )
+                        )
         return list(result_map.values())
 
     def generate_module_ui_tree(self, module_name) -> TreeMapList:
@@ -154,7 +165,7 @@ class UITreeGenerator:
         fhir_profile_snapshot: StructureDefinitionSnapshot,
         term_code_defining_id,
         module_dir_name: str,
-    ) -> List[TreeMap]:
+    ) -> List[TreeMap | CompactTreeMap]:
         """
         Returns the tree map for the given term code defining id
         :param fhir_profile_snapshot: snapshot of the FHIR profile
@@ -9,9 +9,12 @@ from fhir.resources.parameters import ParametersParameter
 from requests.auth import AuthBase
 from typing_extensions import override, deprecated
 
+from cohort_selection_ontology.core.terminology.closure import (
+    ClosureManager,
+    SubsumptionMap,
+)
 from cohort_selection_ontology.model.tree_map import (
-    TermEntryNode,
-    TreeMap,
+    CompactTreeMap,
     ContextualizedTermCodeInfo,
 )
 from sortedcontainers import SortedSet
@@ -19,28 +22,18 @@ from itertools import groupby
 
 from cohort_selection_ontology.model.ui_data import TermCode
 from common.exceptions import UnsupportedError
-from common.util.http.terminology.client import FhirTerminologyClient
+from common.util.http.terminology.cache import ValueSetExpansionCache
+from common.util.http.recording import ExchangeArchive
+from common.util.http.terminology.client import (
+    REPLAY_BASE_URL,
+    FhirTerminologyClient,
+)
+from common.util.http.terminology.expansion import ExpansionConcept
+from common.util.http.terminology.lookup import CodeSystemLookupEngine
 from common.util.log.functions import get_logger
 from common.util.project import Project
 
 
-def remove_non_direct_ancestors(parents: List[str], input_map: dict):
-    """
-    Removes all ancestors of a node that are not direct ancestors.
-    :param parents: List of parents of a concept
-    :param input_map: Closure map of the value set
-    """
-    if len(parents) < 2:
-        return
-    parents_copy = parents.copy()
-    for parent in parents_copy:
-        if parent in input_map:
-            parent_parents = input_map[parent]
-            for elem in parents_copy:
-                if elem in parent_parents and elem in parents:
-                    parents.remove(elem)
-
-
 class CohortSelectionTerminologyClient(FhirTerminologyClient):
     __logger = get_logger("CohortSelectionTerminologyClient")
     POSSIBLE_CODE_SYSTEMS: frozenset[str] = frozenset(
@@ -48,6 +41,7 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
     )
 
     __project: Project
+    __lookup_engine: CodeSystemLookupEngine
 
     def __init__(
         self,
@@ -57,9 +51,14 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
         cert: Optional[tuple[str, str]] = None,
         timeout: float = 60,
     ):
+        archive = ExchangeArchive.from_config(
+            project.config.terminology.recording, project.path
+        )
         if base_url is None:
             if "ONTOLOGY_SERVER_ADDRESS" in project.env:
                 base_url = project.env["ONTOLOGY_SERVER_ADDRESS"]
+            elif archive is not None and archive.mode == "replay":
+                base_url = REPLAY_BASE_URL
             else:
                 raise ValueError(
                     "Server base URL has to be provided either explicitly through the `base_url` parameter"
@@ -71,7 +70,46 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
                     Path(project.env["SERVER_CERTIFICATE"]),
                     Path(project.env["PRIVATE_KEY"]),
                 )
-        super().__init__(base_url, auth, cert, timeout, project.config.http)
+        cache = ValueSetExpansionCache.from_config(
+            project.config.terminology.cache, project.path
+        )
+        expansion_config = project.config.terminology.expansion
+        super().__init__(
+            base_url,
+            auth,
+            cert,
+            timeout,
+            project.config.http,
+            cache,
+            expansion_config.page_size,
+            expansion_config.page_workers,
+            archive,
+        )
+        self.__lookup_engine = CodeSystemLookupEngine(self)
+
+    def expand_value_set_concepts(
+        self, url: str, version: Optional[str] = None
+    ) -> List[ExpansionConcept]:
+        """
+        Expands a value set and returns the concepts contained in it as lightweight tuples. Concepts are deduplicated
+        and ordered like the term codes returned by `expand_value_set` but are only materialized as `TermCode`
+        instances where required.
+        :param url: Canonical url of the value set
+        :param version: Version of the value set
+        :return: List of concepts contained in the value set ordered by their (normalized) display
+        """
+        concepts = {}
+        for concept in self.iter_value_set_expansion(url, version):
+            key = (concept.system, concept.code)
+            if key not in concepts:
+                concepts[key] = concept._replace(
+                    display=self.normalize_display(concept.display)
+                )
+        if not concepts:
+            self.__logger.debug(
+                f"Value set '{url}' is either not expanded or has an empty expansion"
+            )
+        return sorted(concepts.values(), key=lambda c: c.display.casefold())
 
     @override
     def expand_value_set(
@@ -83,78 +121,51 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
         :param version: Version of the value set
         :return: Sorted set of the term codes contained in the value set
         """
-        term_codes = SortedSet()
-        value_set_data = super().expand_value_set(url, version)
-        if "expansion" in value_set_data:
-            global_version = None
-            for parameter in value_set_data["expansion"]["parameter"]:
-                if parameter["name"] == "version":
-                    global_version = parameter["valueUri"].split("|")[-1]
-            if "contains" not in value_set_data["expansion"]:
-                self.__logger.debug(
-                    f"Value set '{url}' is either not expanded or has an empty expansion"
-                )
-                return term_codes
-            for contains in value_set_data["expansion"]["contains"]:
-                system = contains["system"]
-                code = contains["code"]
-                display = contains["display"]
-                if display.isupper():
-                    display = display.title()
-                if "version" in contains:
-                    version = contains["version"]
-                else:
-                    version = global_version
-                term_code = TermCode(
-                    system=system, code=code, display=display, version=version
-                )
-                term_codes.add(term_code)
-        else:
-            self.__logger.warning(
-                f"Failed to expand value set '{url}' => Returning empty expansion"
-            )
-            return SortedSet()
-        return term_codes
+        return SortedSet(
+            map(self.to_term_code, self.expand_value_set_concepts(url, version))
+        )
 
-    def create_vs_tree_map(self, canonical_url: str) -> TreeMap:
+    @staticmethod
+    def normalize_display(display: Optional[str]) -> str:
+        """
+        Normalizes the display of a concept as it should appear in term codes.
+        :param display: Display of a concept
+        :return: Display with missing values replaced by an empty string and all uppercase values in title case
+        """
+        display = display if display is not None else ""
+        return display.title() if display.isupper() else display
+
+    @staticmethod
+    def to_term_code(concept: ExpansionConcept) -> TermCode:
+        """
+        Materializes a concept of a value set expansion as a term code.
+        :param concept: Concept listed in the expansion of a value set
+        :return: Term code
+        """
+        return TermCode(
+            system=concept.system,
+            code=concept.code,
+            display=CohortSelectionTerminologyClient.normalize_display(concept.display),
+            version=concept.version,
+        )
+
+    def create_vs_tree_map(self, canonical_url: str) -> CompactTreeMap:
         """
         Creates a tree of the value set hierarchy utilizing the closure operation.
         :param canonical_url: Canonical URL of the value set
         :return: TreeMap of the value set hierarchy
         """
         self.__logger.debug(f"Generating tree map for value set '{canonical_url}'")
-        closure_name = self.create_concept_map()
-        vs = self.expand_value_set(canonical_url)
-        treemap: TreeMap = TreeMap({}, None, None, None)
-        treemap.entries = {
-            term_code.code: TermEntryNode(term_code=term_code) for term_code in vs
-        }
-        treemap.system = vs[0].system
-        treemap.version = vs[0].version
+        # Entries are only materialized as term codes when the tree map is serialized or traversed
+        vs = self.expand_value_set_concepts(canonical_url)
+        system = vs[0].system
+        version = vs[0].version
+        ancestors = {}
         try:
-            closure_map_data = self.get_closure_map(vs, closure_name)
-            if groups := closure_map_data.group:
-                if len(groups) > 1:
-                    raise UnsupportedError(
-                        "Multiple groups in closure map are currently not supported"
-                    )
-                for group in groups:
-                    treemap.system = group.source
-                    treemap.version = group.sourceVersion
-                    subsumption_map = group.element
-                    subsumption_map = {
-                        item.code: [target.code for target in item.target]
-                        for item in subsumption_map
-                    }
-                    for code, parents in subsumption_map.items():
-                        remove_non_direct_ancestors(parents, subsumption_map)
-                    for (
-                        node,
-                        parents,
-                    ) in subsumption_map.items():
-                        treemap.entries[node].parents += parents
-                        for parent in parents:
-                            treemap.entries[parent].children.append(node)
+            subsumption = self.get_subsumption_map(vs)
+            system = subsumption.system
+            version = subsumption.version
+            ancestors = subsumption.ancestors
         except Exception as e:
             self.__logger.error(
                 f"Failed to generate tree map from value set '{canonical_url}' => Returning empty "
@@ -163,7 +174,16 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
                 stack_info=True,
             )
 
-        return treemap
+        return CompactTreeMap.from_hierarchy(vs, ancestors, None, system, version)
+
+    def get_subsumption_map(self, term_codes: Iterable[TermCode]) -> SubsumptionMap:
+        """
+        Returns the subsumption relationships among a set of term codes. The closure table of the code system version
+        is shared across all calls such that only term codes not seen before are sent to the server.
+        :param term_codes: Term codes of a single code system version
+        :return: Subsumption map listing all ancestors of each term code within the set
+        """
+        return ClosureManager.for_client(self).subsumption_map(term_codes)
 
     def create_concept_map(self, name: Optional[str] = None):
         """
@@ -267,9 +287,10 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
         :return: The term info of the value set
         """
         value_set_canonical_url = value_set_canonical_url.replace("|", "&version=")
-        term_codes = self.expand_value_set(value_set_canonical_url)
+        concepts = self.expand_value_set_concepts(value_set_canonical_url)
         return [
-            ContextualizedTermCodeInfo(term_code=term_code) for term_code in term_codes
+            ContextualizedTermCodeInfo(term_code=self.to_term_code(concept))
+            for concept in concepts
         ]
 
     def get_termcodes_for_value_set(
@@ -284,7 +305,12 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
         self.__logger.debug(
             f"Retrieving term codes for value set '{value_set_canonical_url}'"
         )
-        return list(self.expand_value_set(value_set_canonical_url))
+        return list(
+            map(
+                self.to_term_code,
+                self.expand_value_set_concepts(value_set_canonical_url),
+            )
+        )
 
     @staticmethod
     def get_term_code_from_contains(contains):
@@ -482,12 +508,16 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
         :param code: Code value of the term code
         :return: Display value of the term code or "" if no display is available
         """
-        parameters = self.code_system_lookup(system, code)
-        for parameter in parameters.parameter:
-            if name := parameter.name:
-                if name == "display":
-                    return str(parameter.valueString) if parameter.valueString else ""
-        return ""
+        return self.__lookup_engine.display(system, code)
+
+    def prefetch_term_code_displays(self, concepts: Iterable[tuple[str, str]]):
+        """
+        Resolves the displays of multiple term codes at once such that subsequent calls to `get_term_code_display`
+        for them are served from memory.
+        :param concepts: Tuples of code system URL and code value of the term codes
+        """
+        self.__lookup_engine.request_all(concepts)
+        self.__lookup_engine.resolve()
 
     def get_system_from_code(self, code: str):
         """
@@ -496,7 +526,10 @@ class CohortSelectionTerminologyClient(FhirTerminologyClient):
         :return: List of PossibleSystems that contain the code or an empty list if no system contains the code
         """
         result = []
-        for system in self.POSSIBLE_CODE_SYSTEMS:
+        # Sorted since the iteration order of sets varies between processes which would change the batch requests
+        systems = sorted(self.POSSIBLE_CODE_SYSTEMS)
+        self.prefetch_term_code_displays((system, code) for system in systems)
+        for system in systems:
             if self.get_term_code_display(system, code):
                 result.append(system)
         return result
@@ -0,0 +1,162 @@
+import threading
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Set,
+    Iterable,
+    NamedTuple,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from fhir.resources.R4B.conceptmap import ConceptMap
+
+from cohort_selection_ontology.model.ui_data import TermCode
+from common.exceptions import UnsupportedError
+from common.util.log.functions import get_class_logger
+
+if TYPE_CHECKING:
+    from cohort_selection_ontology.core.terminology.client import (
+        CohortSelectionTerminologyClient,
+    )
+
+ClosureKey = Tuple[str, Optional[str]]
+
+
+class SubsumptionMap(NamedTuple):
+    """
+    Subsumption relationships among a set of concepts of a single code system version
+    """
+
+    system: str
+    version: Optional[str]
+    # Maps each concept code to the codes of all of its ancestors within the set
+    ancestors: Dict[str, List[str]]
+
+
+class _Closure:
+    def __init__(self, name: str, system: str, version: Optional[str]):
+        self.name = name
+        self.system = system
+        self.version = version
+        self.known: Set[str] = set()
+        self.ancestors: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+
+
+class ClosureManager:
+    """
+    Maintains one server-side closure table per code system version for the lifetime of the process. Only concepts
+    that were not yet added to a closure table are sent to the server and the incremental `ConceptMap` returned by the
+    `$closure` operation is merged into a local copy of the transitive closure. Subsumption maps of arbitrary concept
+    sets are then derived from the local copy, avoiding repeated computation of overlapping hierarchies. Instances are
+    shared by all clients targeting the same server
+    """
+
+    __logger = get_class_logger("ClosureManager")
+
+    __instances: dict[str, "ClosureManager"] = {}
+    __instances_lock = threading.Lock()
+
+    __client: "CohortSelectionTerminologyClient"
+    __closures: Dict[ClosureKey, _Closure]
+    __lock: threading.Lock
+
+    def __init__(self, client: "CohortSelectionTerminologyClient"):
+        """
+        :param client: Client used to invoke the `$closure` operation
+        """
+        self.__client = client
+        self.__closures = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, client: "CohortSelectionTerminologyClient") -> "ClosureManager":
+        """
+        Returns the shared closure manager for the server the given client targets
+
+        :param client: Client targeting the terminology server
+        :return: `ClosureManager` instance
+        """
+        base_url = client._get_base_url().rstrip("/")
+        with cls.__instances_lock:
+            if base_url not in cls.__instances:
+                cls.__instances[base_url] = cls(client)
+            return cls.__instances[base_url]
+
+    def __closure(self, system: str, version: Optional[str]) -> _Closure:
+        with self.__lock:
+            key = (system, version)
+            if key not in self.__closures:
+                name = self.__client.create_concept_map()
+                self.__logger.debug(
+                    f"Created closure table [name='{name}', system='{system}', version='{version}']"
+                )
+                self.__closures[key] = _Closure(name, system, version)
+            return self.__closures[key]
+
+    def __apply_delta(self, closure: _Closure, delta: ConceptMap):
+        if not (groups := delta.group):
+            return
+        if len(groups) > 1:
+            raise UnsupportedError(
+                "Multiple groups in closure map are currently not supported"
+            )
+        group = groups[0]
+        closure.system = group.source if group.source else closure.system
+        closure.version = (
+            group.sourceVersion if group.sourceVersion else closure.version
+        )
+        for element in group.element or []:
+            for target in element.target or []:
+                if target.code is None:
+                    self.__logger.warning(
+                        f"Coding [system={group.source}, code={element.code}] has no target coding for system "
+                        f"'{group.target}' and will not be added [equivalence={target.equivalence}, "
+                        f"comment='{target.comment}']"
+                    )
+                elif target.equivalence == "specializes":
+                    # Target is a descendant of the source concept
+                    closure.ancestors.setdefault(target.code, set()).add(element.code)
+                else:
+                    closure.ancestors.setdefault(element.code, set()).add(target.code)
+
+    def subsumption_map(self, term_codes: Iterable[TermCode]) -> SubsumptionMap:
+        """
+        Determines the subsumption relationships among the given concepts, adding concepts not yet present in the
+        closure table of their code system version
+
+        :param term_codes: Concepts of a single code system version
+        :return: `SubsumptionMap` listing the ancestors of each concept that are part of the given set
+        """
+        term_codes = list(term_codes)
+        if not term_codes:
+            raise ValueError("At least one concept is required")
+        versions = {(t.system, t.version) for t in term_codes}
+        if len(versions) > 1:
+            raise UnsupportedError(
+                f"Concepts from multiple code systems or code system versions are currently not supported "
+                f"[versions={versions}]"
+            )
+        system, version = versions.pop()
+        closure = self.__closure(system, version)
+        with closure.lock:
+            new_term_codes = list(
+                {t.code: t for t in term_codes if t.code not in closure.known}.values()
+            )
+            if new_term_codes:
+                self.__logger.debug(
+                    f"Adding {len(new_term_codes)} of {len(term_codes)} concepts to closure table "
+                    f"'{closure.name}'"
+                )
+                delta = self.__client.get_closure_map(new_term_codes, closure.name)
+                self.__apply_delta(closure, delta)
+                closure.known.update(t.code for t in new_term_codes)
+            codes = dict.fromkeys(t.code for t in term_codes)
+            ancestors = {}
+            for code in codes:
+                if parents := closure.ancestors.get(code):
+                    if within := sorted(p for p in parents if p in codes and p != code):
+                        ancestors[code] = within
+            return SubsumptionMap(closure.system, closure.version, ancestors)
@@ -1,6 +1,8 @@
+from array import array
+from collections.abc import Mapping as MappingABC
 from dataclasses import dataclass, field
 from logging import Logger
-from typing import List, Dict, Set, Mapping, Tuple
+from typing import List, Dict, Mapping, Tuple, Iterable, Iterator, Optional
 
 import json
 
@@ -9,6 +11,10 @@ from pydantic import BaseModel, Field
 from cohort_selection_ontology.model.ui_profile import del_keys, del_none
 from cohort_selection_ontology.model.ui_data import Module, TermCode
 from common.util.codec.json import JSONSerializable
+from common.util.collections.graph import (
+    transitive_reduction,
+    descendant_or_self_counts,
+)
 from common.util.log.functions import get_class_logger
 
 
@@ -52,9 +58,288 @@ class TreeMap(JSONSerializable):
         return del_none(del_keys(data, self.DO_NOT_SERIALIZE))
 
 
+class CompactTermEntryNode:
+    """
+    Lightweight view of a single entry of a `CompactTreeMap` offering the same interface as `TermEntryNode`
+    """
+
+    __slots__ = ("__tree", "__index")
+
+    def __init__(self, tree: "CompactTreeMap", index: int):
+        self.__tree = tree
+        self.__index = index
+
+    @property
+    def index(self) -> int:
+        return self.__index
+
+    @property
+    def term_code(self) -> TermCode:
+        return self.__tree.term_code(self.__index)
+
+    @property
+    def parents(self) -> List[str]:
+        codes = self.__tree.codes
+        return [codes[i] for i in self.__tree.parent_indices(self.__index)]
+
+    @property
+    def children(self) -> List[str]:
+        codes = self.__tree.codes
+        return [codes[i] for i in self.__tree.child_indices(self.__index)]
+
+    def __repr__(self) -> str:
+        return f"{self.parents} {self.children}"
+
+    def __hash__(self) -> int:
+        return hash(self.term_code)
+
+    def to_ui_tree_entry(self):
+        return {
+            "key": self.__tree.codes[self.__index],
+            "parents": self.parents,
+            "children": self.children,
+        }
+
+
+class _CompactEntries(MappingABC):
+    __slots__ = ("__tree",)
+
+    def __init__(self, tree: "CompactTreeMap"):
+        self.__tree = tree
+
+    def __getitem__(self, code: str) -> CompactTermEntryNode:
+        return CompactTermEntryNode(self.__tree, self.__tree.index_of(code))
+
+    def __contains__(self, code: object) -> bool:
+        return self.__tree.index_of(code, None) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__tree.codes)
+
+    def __len__(self) -> int:
+        return len(self.__tree.codes)
+
+
+class CompactTreeMap:
+    """
+    Array-backed alternative to `TreeMap` for large hierarchies. Codes are interned as integer indices and the parent
+    and child relationships are stored in compressed sparse row (CSR) layout, i.e. as a flat array of neighbor indices
+    per direction alongside an array of offsets into it. Entries are exposed as lightweight `CompactTermEntryNode`
+    views such that instances can be used wherever the entries of a `TreeMap` are only read. Serialization yields the
+    same output as `TreeMap`
+    """
+
+    __slots__ = (
+        "codes",
+        "context",
+        "system",
+        "version",
+        "__index",
+        "__systems",
+        "__displays",
+        "__versions",
+        "__parent_offsets",
+        "__parents",
+        "__child_offsets",
+        "__children",
+    )
+    DO_NOT_SERIALIZE = ["DO_NOT_SERIALIZE"]
+
+    codes: List[str]
+    context: Optional[TermCode]
+    system: Optional[str]
+    version: Optional[str]
+
+    def __init__(
+        self,
+        term_codes: Iterable[TermCode],
+        parents: Mapping[str, Iterable[str]],
+        context: Optional[TermCode] = None,
+        system: Optional[str] = None,
+        version: Optional[str] = None,
+    ):
+        """
+        :param term_codes: Term codes of the entries in the order they should be serialized
+        :param parents: Maps codes of entries to the codes of their direct parents. Parents have to be entries as well
+        :param context: Context of the tree map
+        :param system: Code system of the tree map
+        :param version: Version of the code system
+        """
+        self.codes = []
+        self.__index = {}
+        self.__systems = []
+        self.__displays = []
+        self.__versions = []
+        for term_code in term_codes:
+            if term_code.code in self.__index:
+                i = self.__index[term_code.code]
+                self.__systems[i] = term_code.system
+                self.__displays[i] = term_code.display
+                self.__versions[i] = term_code.version
+            else:
+                self.__index[term_code.code] = len(self.codes)
+                self.codes.append(term_code.code)
+                self.__systems.append(term_code.system)
+                self.__displays.append(term_code.display)
+                self.__versions.append(term_code.version)
+        self.context = context
+        self.system = system
+        self.version = version
+
+        size = len(self.codes)
+        linked: List[Tuple[int, List[int]]] = []
+        child_counts = [0] * size
+        for code, code_parents in parents.items():
+            indices = [self.__index[parent] for parent in code_parents]
+            for p in indices:
+                child_counts[p] += 1
+            linked.append((self.__index[code], indices))
+        parent_lists: List[List[int]] = [[] for _ in range(size)]
+        for i, indices in linked:
+            parent_lists[i] += indices
+        self.__parent_offsets = array("I", [0])
+        self.__parents = array("I")
+        for indices in parent_lists:
+            self.__parents.extend(indices)
+            self.__parent_offsets.append(len(self.__parents))
+        # Children are listed in the order their links were provided, i.e. in the order of the parent lists
+        self.__child_offsets = array("I", [0])
+        for count in child_counts:
+            self.__child_offsets.append(self.__child_offsets[-1] + count)
+        self.__children = array(
+            "I", bytes(self.__parents.itemsize * len(self.__parents))
+        )
+        fill = self.__child_offsets[:-1]
+        for i, indices in linked:
+            for p in indices:
+                self.__children[fill[p]] = i
+                fill[p] += 1
+
+    @classmethod
+    def from_hierarchy(
+        cls,
+        term_codes: Iterable[TermCode],
+        ancestors: Mapping[str, Iterable[str]],
+        context: Optional[TermCode] = None,
+        system: Optional[str] = None,
+        version: Optional[str] = None,
+    ) -> "CompactTreeMap":
+        """
+        Creates a tree map from the transitive closure of a hierarchy
+
+        :param term_codes: Term codes of the entries
+        :param ancestors: Maps codes of entries to the codes of all of their ancestors
+        :param context: Context of the tree map
+        :param system: Code system of the tree map
+        :param version: Version of the code system
+        :return: `CompactTreeMap` instance
+        """
+        return cls(
+            term_codes, transitive_reduction(ancestors), context, system, version
+        )
+
+    @classmethod
+    def from_entries(
+        cls,
+        entries: Iterable[TermEntryNode | CompactTermEntryNode],
+        context: Optional[TermCode] = None,
+        system: Optional[str] = None,
+        version: Optional[str] = None,
+    ) -> "CompactTreeMap":
+        """
+        Creates a tree map from `TermEntryNode`-like entries, e.g. to convert or merge existing tree maps
+
+        :param entries: Entries to include
+        :param context: Context of the tree map
+        :param system: Code system of the tree map
+        :param version: Version of the code system
+        :return: `CompactTreeMap` instance
+        """
+        entries = list(entries)
+        return cls(
+            (e.term_code for e in entries),
+            {e.term_code.code: e.parents for e in entries if e.parents},
+            context,
+            system,
+            version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __repr__(self) -> str:
+        return f"{self.system} {self.version} {self.context} {dict(self.entries)}"
+
+    @property
+    def entries(self) -> Mapping[str, CompactTermEntryNode]:
+        return _CompactEntries(self)
+
+    def index_of(self, code: str, *default) -> int:
+        """
+        Returns the index of an entry
+
+        :param code: Code of the entry
+        :param default: Value returned if no such entry exists. Raises a `KeyError` if omitted
+        :return: Index of the entry
+        """
+        if default:
+            return self.__index.get(code, default[0])
+        return self.__index[code]
+
+    def parent_indices(self, index: int) -> array:
+        return self.__parents[
+            self.__parent_offsets[index] : self.__parent_offsets[index + 1]
+        ]
+
+    def child_indices(self, index: int) -> array:
+        return self.__children[
+            self.__child_offsets[index] : self.__child_offsets[index + 1]
+        ]
+
+    def term_code(self, index: int) -> TermCode:
+        return TermCode(
+            system=self.__systems[index],
+            code=self.codes[index],
+            display=self.__displays[index],
+            version=self.__versions[index],
+        )
+
+    def to_tree_map(self) -> TreeMap:
+        """
+        Converts this instance into a `TreeMap`
+
+        :return: `TreeMap` instance with equivalent entries
+        """
+        return TreeMap(
+            {
+                code: TermEntryNode(
+                    term_code=self.term_code(i),
+                    parents=[self.codes[p] for p in self.parent_indices(i)],
+                    children=[self.codes[c] for c in self.child_indices(i)],
+                )
+                for i, code in enumerate(self.codes)
+            },
+            self.context,
+            self.system,
+            self.version,
+        )
+
+    def to_dict(self):
+        data = {
+            "entries": [
+                CompactTermEntryNode(self, i).to_ui_tree_entry()
+                for i in range(len(self.codes))
+            ],
+            "context": self.context.to_dict() if self.context else self.context,
+            "system": self.system,
+            "version": self.version,
+        }
+        return del_none(del_keys(data, self.DO_NOT_SERIALIZE))
+
+
 @dataclass
 class TreeMapList(JSONSerializable):
-    entries: List[TreeMap] = field(default_factory=list)
+    entries: List[TreeMap | CompactTreeMap] = field(default_factory=list)
     # For naming the files
     module_name: str = None
 
@@ -121,6 +406,33 @@ class ContextualizedTermCodeInfo(BaseModel):
         }
 
 
+def get_descendant_or_self_count_map(
+    tree_map: TreeMap | CompactTreeMap,
+) -> Mapping[str, int]:
+    """
+    Builds up the descendant-or-self count mapping for the given tree map. Concepts are counted using bitsets over the
+    concept indices such that shared descendants in poly hierarchies (like SNOMED CT) are counted only once
+
+    :param tree_map: `TreeMap` instance to build up descendant count mapping for
+    :return: Descendant count mapping
+    """
+    if isinstance(tree_map, CompactTreeMap):
+        codes = tree_map.codes
+        children = [tree_map.child_indices(i) for i in range(len(codes))]
+    else:
+        codes = list(tree_map.entries.keys())
+        index = {code: i for i, code in enumerate(codes)}
+        children = [
+            [index[c] for c in entry.children if c in index]
+            for entry in tree_map.entries.values()
+        ]
+    return {
+        code: count
+        for code, count in zip(codes, descendant_or_self_counts(children))
+        if count is not None
+    }
+
+
 @dataclass
 class ContextualizedTermCodeInfoList(JSONSerializable):
     entries: List[ContextualizedTermCodeInfo] = field(default_factory=list)
@@ -133,7 +445,7 @@ class ContextualizedTermCodeInfoList(JSONSerializable):
         :param tree_map_list: List of tree maps to aggregate descendants in
         """
         count_maps = {
-            f"{tree_map.system}#{tree_map.version}": self.__get_descendant_or_self_count_map(
+            f"{tree_map.system}#{tree_map.version}": get_descendant_or_self_count_map(
                 tree_map
             )
             for tree_map in tree_map_list.entries
@@ -150,61 +462,6 @@ class ContextualizedTermCodeInfoList(JSONSerializable):
                 )
                 continue
 
-    def __get_descendant_or_self_count_map(
-        self, tree_map: TreeMap
-    ) -> Mapping[str, int]:
-        """
-        Builds up the descendant-or-self count mapping for the given tree map
-
-        :param tree_map: `TreeMap` instance to build up descendant count mapping for
-        :return: Descendant count mapping
-        """
-        m = {}
-        entries = tree_map.entries
-        for k, v in entries.items():
-            if len(v.children) == 0:
-                m[k] = 1
-                if len(v.parents) > 0:
-                    for p_key in v.parents:
-                        self.__traverse_parent(p_key, {k}, tree_map, m)
-        return m
-
-    def __traverse_parent(
-        self,
-        parent_key: str,
-        descendants: Set[str],
-        tree_map: TreeMap,
-        count_map: Dict[str, Tuple[int, Set[str]] | int],
-    ):
-        """
-        Internal method for traversing `tree_map` upwards and build up the descendant count map `count_map`. Note that
-        this method is built to handle poly hierarchies (like SNOMED CT) and as such there might be faster algorithms
-        for other types of hierarchies. If the method was called on all parents of all leaf concepts the count map will
-        be complete
-
-        :param parent_key: Key of the parent concept in the tree map
-        :param descendants: Set of descendant concepts of a child concept of the parent concept
-        :param tree_map: Tree map providing information on parents and children of concepts
-        :param count_map: Associates a concept to its currently identified set of descendant concepts and of how many
-                          of its child concepts descendants where already merged into its descendant set. If all
-                          children contributed their descendants than the value will be replaced by the total descendant
-                          count identified
-        """
-        parent = tree_map.entries[parent_key]
-        if parent_key not in count_map:
-            visits = 0
-            p_descendants = {parent_key}
-        else:
-            visits, p_descendants = count_map[parent_key]
-        visits += 1
-        p_descendants.update(descendants)
-        if len(parent.children) <= visits:
-            count_map[parent_key] = len(p_descendants)
-            for p_parent_key in parent.parents:
-                self.__traverse_parent(p_parent_key, p_descendants, tree_map, count_map)
-        else:
-            count_map[parent_key] = (visits, p_descendants)
-
     def to_json(self):
         """
         Builds a JSON string representation of this instance
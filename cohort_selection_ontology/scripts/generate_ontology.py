@@ -2,11 +2,15 @@ from __future__ import annotations
 
 import argparse
 import copy
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from importlib.resources import open_text
 import json
 import os
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import List, ValuesView, Dict, Tuple
+from typing import List, ValuesView, Dict, Tuple, Optional
 
 import docker
 from jsonschema import validate
@@ -26,7 +30,8 @@ from cohort_selection_ontology.core.resolvers.search_parameter import (
 )
 from cohort_selection_ontology.core.generators.ui_profile import UIProfileGenerator
 from cohort_selection_ontology.core.generators.ui_tree import UITreeGenerator
-from cohort_selection_ontology.util.database import DataBaseWriter
+from cohort_selection_ontology.util.database import DataBaseWriter, UIProfileWriter
+from cohort_selection_ontology.util.sql_sink import SqlSinkWriter
 from common.util.fhir.terminal import generate_snapshots
 from common.util.codec.json import write_object_as_json
 from cohort_selection_ontology.model.mapping import (
@@ -37,7 +42,7 @@ from cohort_selection_ontology.model.mapping import (
 from cohort_selection_ontology.model.ui_profile import UIProfile
 from cohort_selection_ontology.model.ui_data import TermCode
 from common.constants.docker import POSTGRES_IMAGE
-from common.util.log.functions import get_logger
+from common.util.log.functions import get_logger, worker_processes
 from common.util.project import Project
 
 logger = get_logger(__file__)
@@ -242,6 +247,19 @@ def configure_args_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--module", nargs="+", help="Modules to generate the ontology for"
     )
+    parser.add_argument(
+        "--database_backend",
+        choices=["embedded", "postgres"],
+        default="embedded",
+        help="Backend UI profiles are written to before being dumped to R__Load_latest_ui_profile.sql. 'embedded' "
+        "emits the script directly while 'postgres' populates and dumps a database container per module",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of modules to generate in parallel, each in a separate process with its own database backend",
+    )
     return parser
 
 
@@ -267,12 +285,13 @@ def generate_result_folder(base_dir: str = ""):
 
 
 def manage_docker_container(
-    volume_dir: str, container_name: str
+    volume_dir: str, container_name: str, host_port: Optional[int] = 5430
 ) -> docker.models.containers.Container:
     """
     Manages the lifecycle of the Docker container for a module.
     :param volume_dir: The directory to mount in the Docker container.
     :param container_name: The name of the Docker container.
+    :param host_port: Host port to bind the database port to. If `None`, a free port is chosen by Docker
     :return: The running Docker container.
     """
     client = docker.from_env()
@@ -290,7 +309,7 @@ def manage_docker_container(
     container = client.containers.run(
         POSTGRES_IMAGE,
         detach=True,
-        ports={"5432/tcp": 5430},
+        ports={"5432/tcp": host_port},
         name=container_name,
         volumes={volume_dir: {"bind": "/opt/db_data", "mode": "rw"}},
         environment={
@@ -303,6 +322,16 @@ def manage_docker_container(
     return container
 
 
+def get_host_port(container: docker.models.containers.Container) -> int:
+    """
+    Returns the host port the database port of the given container is bound to
+    :param container: Running Docker container
+    :return: Host port
+    """
+    container.reload()
+    return int(container.ports["5432/tcp"][0]["HostPort"])
+
+
 def generate_ui_trees(
     resolver: ResourceQueryingMetaDataResolver, module_name: str, project: Project
 ):
@@ -341,14 +370,14 @@ def generate_ui_trees(
 
 def generate_ui_profiles(
     resolver: ResourceQueryingMetaDataResolver,
-    db_writer: DataBaseWriter,
+    db_writer: UIProfileWriter,
     module_name: str,
     project: Project,
 ):
     """
     Generates UI profiles and writes them to files and database
     :param resolver: An instance of ResourceQueryingMetaDataResolver
-    :param db_writer: An instance of DataBaseWriter
+    :param db_writer: An instance of UIProfileWriter
     :param module_name: Name of the module to generate UI profiles for
     :param project: Project to generate for
     """
@@ -457,72 +486,197 @@ def generate_fhir_mapping(
     logger.info("FHIR mapping generated and validated.")
 
 
-def main():
-    parser = configure_args_parser()
-    args = parser.parse_args()
+def generate_module(
+    module: str,
+    args: argparse.Namespace,
+    project: Project,
+    host_port: Optional[int] = 5430,
+) -> bool:
+    """
+    Generates the ontology for a single module using a dedicated database backend
+    :param module: Name of the module to generate the ontology for
+    :param args: Parsed command line arguments
+    :param project: Project to generate for
+    :param host_port: Host port to bind the database container to if the Postgres backend is used. If `None`, a free
+                      port is chosen
+    :return: `True` if the generation succeeded, `False` otherwise
+    """
+    input_modules_dir = project.input.cso / "modules"
+    output_modules_dir = project.output.cso / "modules"
+    container = None
+    db_writer = None
+    succeeded = False
+    try:
+        logger.info(f"Generating ontology for module: {module}")
 
-    project = Project(name=args.project)
-    input_dir = project.input
-    output_dir = project.output
-    input_modules_dir = input_dir.cso / "modules"
-    output_modules_dir = output_dir.cso / "modules"
+        output_module_directory = str((output_modules_dir / module).resolve())
 
-    logger.info(f"Starting FHIR ontology generator for project '{project.name}'")
+        generate_result_folder(output_module_directory)
 
-    modules = (
-        args.module
-        if args.module
-        else [module for module in os.listdir(input_modules_dir)]
-    )
+        if args.database_backend == "postgres":
+            container_name = f"test_db_{module}"
+            container = manage_docker_container(
+                output_module_directory,
+                container_name=container_name,
+                host_port=host_port,
+            )
 
-    for module in modules:
+            db_writer = DataBaseWriter(
+                host_port if host_port is not None else get_host_port(container)
+            )
+        else:
+            db_writer = SqlSinkWriter()
+
+        with open(
+            input_modules_dir / module / "required_packages.json",
+            mode="r",
+            encoding="utf-8",
+        ) as f:
+            required_packages = json.load(f)
+            if args.generate_snapshot:
+                generate_snapshots(input_modules_dir / module, required_packages)
+
+        resolver = StandardDataSetQueryingMetaDataResolver(project=project)
+        if args.generate_ui_trees:
+            generate_ui_trees(resolver, module, project)
+
+        if args.generate_ui_profiles:
+            generate_ui_profiles(resolver, db_writer, module, project)
+
+        if args.generate_mapping:
+            generate_cql_mapping(resolver, module, project)
+            generate_fhir_mapping(resolver, module, project)
+
+        succeeded = True
+    except Exception as e:
+        logger.error(
+            f"An error occurred while running generator for module '{module}': {e}",
+            exc_info=True,
+        )
+    finally:
         try:
-            logger.info(f"Generating ontology for module: {module}")
+            # Dump the database to the module's directory
+            if args.generate_ui_profiles:
+                if container is not None:
+                    dump_database(container)
+                elif isinstance(db_writer, SqlSinkWriter):
+                    db_writer.dump(
+                        output_modules_dir / module / "R__Load_latest_ui_profile.sql"
+                    )
+        except Exception as e:
+            logger.error(
+                f"Failed to dump database of module '{module}': {e}", exc_info=True
+            )
+            succeeded = False
+        finally:
+            if container is not None:
+                # Stop and remove the container
+                container.stop()
+                container.remove()
+    return succeeded
 
-            output_module_directory = str((output_modules_dir / module).resolve())
 
-            generate_result_folder(output_module_directory)
+def _init_worker(log_queue: multiprocessing.Queue):
+    """
+    Forwards all log records of a worker process to the parent process
+    :param log_queue: Queue the log records are sent through
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
 
-            container_name = f"test_db_{module}"
-            container = manage_docker_container(
-                output_module_directory, container_name=container_name
-            )
 
-            db_writer = DataBaseWriter(5430)
+def generate_modules_in_parallel(
+    modules: List[str], args: argparse.Namespace, project: Project, jobs: int
+) -> List[str]:
+    """
+    Generates the ontology for multiple modules in a process pool. If the Postgres backend is used, each module uses
+    its own database container bound to a free host port. The log records of all workers are written by the handlers
+    of the parent process
+    :param modules: Names of the modules to generate the ontology for
+    :param args: Parsed command line arguments
+    :param project: Project to generate for
+    :param jobs: Maximum number of modules generated concurrently
+    :return: Names of the modules for which the generation failed
+    """
+    failed = []
+    with worker_processes(), multiprocessing.Manager() as manager:
+        log_queue = manager.Queue()
+        listener = QueueListener(
+            log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        listener.start()
+        try:
+            # Workers are spawned rather than forked since the parent runs threads (e.g. the log listener) and the
+            # default start method differs across platforms and Python versions
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(log_queue,),
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        generate_module, module, args, project, None
+                    ): module
+                    for module in modules
+                }
+                for future in as_completed(futures):
+                    module = futures[future]
+                    try:
+                        succeeded = future.result()
+                    except Exception as e:
+                        logger.error(
+                            f"Worker generating module '{module}' failed: {e}",
+                            exc_info=True,
+                        )
+                        succeeded = False
+                    if not succeeded:
+                        failed.append(module)
+        finally:
+            listener.stop()
+    return failed
 
-            with open(
-                input_modules_dir / module / "required_packages.json",
-                mode="r",
-                encoding="utf-8",
-            ) as f:
-                required_packages = json.load(f)
-                if args.generate_snapshot:
-                    generate_snapshots(input_modules_dir / module, required_packages)
 
-            resolver = StandardDataSetQueryingMetaDataResolver(project=project)
-            if args.generate_ui_trees:
-                generate_ui_trees(resolver, module, project)
+def main():
+    parser = configure_args_parser()
+    args = parser.parse_args()
 
-            if args.generate_ui_profiles:
-                generate_ui_profiles(resolver, db_writer, module, project)
+    project = Project(name=args.project)
+    input_modules_dir = project.input.cso / "modules"
 
-            if args.generate_mapping:
-                generate_cql_mapping(resolver, module, project)
-                generate_fhir_mapping(resolver, module, project)
+    logger.info(f"Starting FHIR ontology generator for project '{project.name}'")
 
-        except Exception as e:
-            logger.error(
-                f"An error occurred while running generator for module '{module}': {e}",
-                exc_info=True,
-            )
-        finally:
-            # Dump the database to the module's directory
-            if args.generate_ui_profiles:
-                dump_database(container)
+    modules = (
+        args.module
+        if args.module
+        else [module for module in os.listdir(input_modules_dir)]
+    )
 
-            # Stop and remove the container
-            container.stop()
-            container.remove()
+    jobs = min(max(args.jobs, 1), len(modules)) if modules else 1
+    if jobs > 1 and project.config.terminology.recording.mode == "record":
+        logger.warning(
+            "Recording terminology server exchanges is not supported in parallel mode => Generating modules "
+            "sequentially"
+        )
+        jobs = 1
+
+    if jobs > 1:
+        logger.info(f"Generating {len(modules)} modules using {jobs} parallel jobs")
+        failed = generate_modules_in_parallel(modules, args, project, jobs)
+    else:
+        failed = [
+            module for module in modules if not generate_module(module, args, project)
+        ]
+
+    if failed:
+        logger.error(
+            f"Ontology generation failed for {len(failed)} of {len(modules)} modules: "
+            f"{', '.join(sorted(failed))}"
+        )
+    else:
+        logger.info(f"Ontology generation succeeded for all {len(modules)} modules")
 
 
 if __name__ == "__main__":
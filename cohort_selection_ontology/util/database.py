@@ -1,6 +1,8 @@
+import abc
+import io
 import uuid
 from time import sleep
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Any, Iterable, Sequence
 
 import psycopg2.extras
 import psycopg2
@@ -10,6 +12,7 @@ from cohort_selection_ontology.model.ui_profile import UIProfile, CriteriaSet
 from cohort_selection_ontology.model.ui_data import TermCode
 
 from common.util.log.functions import get_class_logger
+from common.util.sql.dump import copy_value
 
 NAMESPACE_UUID = uuid.UUID("00000000-0000-0000-0000-000000000000")
 
@@ -85,15 +88,164 @@ add_comment_on_context_termcode_hash = """
 """
 
 
-class DataBaseWriter:
+"""
+Session-local staging tables rows are streamed into via COPY before being merged into the target tables. Temporary
+tables are not WAL-logged (like unlogged tables) and their rows are removed on commit
+"""
+create_staging_tables = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS code_staging(
+    ord     INTEGER NOT NULL,
+    system  TEXT NOT NULL,
+    code    TEXT NOT NULL,
+    version TEXT NOT NULL,
+    display TEXT NOT NULL
+    ) ON COMMIT DELETE ROWS;
+    CREATE TEMPORARY TABLE IF NOT EXISTS contextualized_termcode_staging(
+    context_termcode_hash TEXT NOT NULL,
+    context_id            INTEGER NOT NULL,
+    termcode_id           INTEGER NOT NULL,
+    ui_profile_id         INTEGER NOT NULL
+    ) ON COMMIT DELETE ROWS;
+"""
+
+
+def copy_rows(rows: Iterable[Sequence[Any]]) -> io.StringIO:
+    """
+    Encodes rows in the text format of the `COPY` command
+    :param rows: Rows to encode
+    :return: Buffer containing the encoded rows
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(v) for v in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+class UIProfileWriter(abc.ABC):
+    """
+    Base class of writers persisting UI profiles and the contextualized term codes they are linked to in the tables of
+    the feasibility tool ontology
+    """
+
+    @staticmethod
+    def calculate_context_term_code_hash(context: TermCode, term_code: TermCode) -> str:
+        """
+        Calculates the hash for the context term code
+        :param context: the context
+        :param term_code: the term code
+        :return: the hash
+        """
+        return str(
+            uuid.uuid3(
+                NAMESPACE_UUID,
+                f"{context.system}{context.code}{context.version if context.version else ''}"
+                f"{term_code.system}{term_code.code}",
+            )
+        )
+
+    @abc.abstractmethod
+    def insert_term_codes(self, term_codes: List[TermCode]):
+        """
+        Inserts the term codes into the termcode table
+        :param term_codes: the term codes to be inserted
+        """
+        pass
+
+    @abc.abstractmethod
+    def insert_context_codes(self, context_codes: List[TermCode]):
+        """
+        Inserts the context codes into the context table
+        :param context_codes: the context codes to be inserted
+        """
+        pass
+
+    @abc.abstractmethod
+    def insert_ui_profiles(self, named_ui_profile: Dict[str, UIProfile]):
+        """
+        Inserts the ui profiles into the ui_profile table
+        :param named_ui_profile: the ui profiles to be inserted keyed by name
+        """
+        pass
+
+    @abc.abstractmethod
+    def link_contextualized_term_code_to_ui_profile(
+        self, contextualized_term_codes: List[Tuple[TermCode, TermCode, str]]
+    ):
+        """
+        Links a list of contextualized term codes to their corresponding ui profiles
+        :param contextualized_term_codes: List of tuples each containing a context, a term code, and a UI profile name
+        """
+        pass
+
+    def add_critieria_set(self, criteria_set: CriteriaSet):
+        """
+        Adds the value set to the database
+        :param criteria_set: the criteria set to be added
+        """
+        entries = criteria_set.contextualized_term_codes
+        # TODO: Remove this context once we know the context:
+        self.insert_context_codes([entry[0] for entry in entries])
+
+        self.insert_term_codes(list(entry[1] for entry in entries))
+
+    def write_ui_profiles_to_db(
+        self,
+        contextualized_term_code_to_ui_profile,
+        named_ui_profiles,
+        contextualized_codes_exist: bool = False,
+    ):
+        context_codes = [
+            context_code
+            for (context_code, _) in contextualized_term_code_to_ui_profile.keys()
+        ]
+        term_codes = [
+            term_code
+            for (_, term_code) in contextualized_term_code_to_ui_profile.keys()
+        ]
+        if not contextualized_codes_exist:
+            self.insert_context_codes(context_codes)
+            self.insert_term_codes(term_codes)
+        self.insert_ui_profiles(named_ui_profiles)
+        values = [
+            (context_code, term_code, ui_profile_name)
+            for (
+                context_code,
+                term_code,
+            ), ui_profile_name in contextualized_term_code_to_ui_profile.items()
+        ]
+        self.link_contextualized_term_code_to_ui_profile(values)
+
+    def write_vs_to_db(self, profiles: List[UIProfile]):
+        for ui_profile in profiles:
+            for attribute_definition in ui_profile.attributeDefinitions:
+                if attribute_definition.type == "reference":
+                    profile_criteria_set = attribute_definition.referencedCriteriaSet
+                    # TODO: Maybe better to get them upfront
+                    for single_criteria_set in profile_criteria_set:
+                        self.add_critieria_set(single_criteria_set)
+
+
+class DataBaseWriter(UIProfileWriter):
     """
     DataBaseWriter is a class that handles the connection to the database and the insertion of data into the database
-    for the feasibility tool ontology.
+    for the feasibility tool ontology. By default, rows are bulk loaded by streaming them into staging tables via
+    `COPY ... FROM STDIN` and merging them into the target tables with a single set-based statement per table.
     """
 
     __logger = get_class_logger("DataBaseWriter")
 
-    def __init__(self, port=5432):
+    def __init__(self, port=5432, bulk_load: bool = True):
+        """
+        :param port: Port the database listens on
+        :param bulk_load: Whether rows should be bulk loaded via `COPY` instead of being inserted in batches of
+                          individual statements
+        """
+        self.bulk_load = bulk_load
+        self.__context_ids: Dict[Tuple[str, str, str], int] = {}
+        self.__term_code_ids: Dict[Tuple[str, str, str], int] = {}
+        self.__ui_profile_ids: Dict[str, int] = {}
         self.db_connection = None
         for _ in range(30):  # retry for 30 times
             try:
@@ -119,6 +271,8 @@ class DataBaseWriter:
             self.cursor.execute(create_ui_profile_table)
             self.cursor.execute(create_contextualized_term_code)
             self.cursor.execute(add_comment_on_context_termcode_hash)
+            if bulk_load:
+                self.cursor.execute(create_staging_tables)
             self.db_connection.commit()
 
     def __del__(self):
@@ -130,64 +284,99 @@ class DataBaseWriter:
             self.db_connection.close()
 
     @staticmethod
-    def calculate_context_term_code_hash(context: TermCode, term_code: TermCode) -> str:
+    def __code_key(term_code: TermCode) -> Tuple[str, str, str]:
+        return (
+            term_code.system,
+            term_code.code,
+            term_code.version if term_code.version else "",
+        )
+
+    def __resolve_code_ids(
+        self,
+        table: str,
+        ids: Dict[Tuple[str, str, str], int],
+        keys: Iterable[Tuple[str, str, str]],
+    ):
         """
-        Calculates the hash for the context term code
-        :param context: the context
-        :param term_code: the term code
-        :return: the hash
+        Looks up the IDs of codes which are not known locally, e.g. because they were inserted by another writer, with a
+        single join per page of keys
+        :param table: Name of the table (either `termcode` or `context`)
+        :param ids: Local mapping of (system, code, version) to IDs which is updated with the resolved IDs
+        :param keys: Keys of the codes whose IDs should be resolved
         """
-        return str(
-            uuid.uuid3(
-                NAMESPACE_UUID,
-                f"{context.system}{context.code}{context.version if context.version else ''}"
-                f"{term_code.system}{term_code.code}",
-            )
+        missing = [key for key in dict.fromkeys(keys) if key not in ids]
+        if not missing:
+            return
+        rows = psycopg2.extras.execute_values(
+            self.cursor,
+            f"""
+            SELECT X.id, X.system, X.code, X.version
+            FROM {table} X
+            JOIN (VALUES %s) V (system, code, version)
+                ON X.system = V.system AND X.code = V.code AND X.version = V.version
+            """,
+            missing,
+            page_size=1000,
+            fetch=True,
         )
+        for row_id, *key in rows:
+            ids[tuple(key)] = row_id
+
+    def __insert_codes(
+        self, table: str, ids: Dict[Tuple[str, str, str], int], codes: List[TermCode]
+    ):
+        """
+        Inserts codes not yet present into the target table and records the IDs returned by the database locally such
+        that linking does not need to look them up again
+        :param table: Name of the target table (either `termcode` or `context`)
+        :param ids: Local mapping of (system, code, version) to IDs of the target table
+        :param codes: Codes to be inserted
+        """
+        displays: Dict[Tuple[str, str, str], str] = {}
+        for code in codes:
+            displays.setdefault(self.__code_key(code), code.display)
+        rows = [(*key, display) for key, display in displays.items() if key not in ids]
+        if not rows:
+            return
+        if self.bulk_load:
+            self.cursor.copy_expert(
+                "COPY code_staging (ord, system, code, version, display) FROM STDIN",
+                copy_rows((i, *row) for i, row in enumerate(rows)),
+            )
+            self.cursor.execute(f"""
+                INSERT INTO {table} (system, code, version, display)
+                SELECT system, code, version, display FROM code_staging ORDER BY ord
+                ON CONFLICT DO NOTHING
+                RETURNING id, system, code, version;
+                """)
+            returned = self.cursor.fetchall()
+        else:
+            returned = psycopg2.extras.execute_values(
+                self.cursor,
+                f"INSERT INTO {table} (system, code, version, display) VALUES %s "
+                "ON CONFLICT DO NOTHING RETURNING id, system, code, version",
+                rows,
+                fetch=True,
+            )
+        for row_id, *key in returned:
+            ids[tuple(key)] = row_id
+        # Conflicting rows are not returned
+        self.__resolve_code_ids(table, ids, (row[:3] for row in rows))
+        self.db_connection.commit()
 
     def insert_term_codes(self, term_codes: List[TermCode]):
         """
         Inserts the term codes into the database
         :param term_codes: the term codes to be inserted
         """
-        values = set(
-            (
-                term_code.system,
-                term_code.code,
-                term_code.version if term_code.version else "",
-                term_code.display,
-            )
-            for term_code in term_codes
-        )
-        psycopg2.extras.execute_batch(
-            self.cursor,
-            "INSERT INTO termcode (system, code, version, display) VALUES (%s, %s, %s, %s)"
-            "ON CONFLICT DO NOTHING",
-            values,
-        )
-        self.db_connection.commit()
+        self.__insert_codes("termcode", self.__term_code_ids, term_codes)
 
     def insert_context_codes(self, context_codes: List[TermCode]):
         """
         Inserts the context codes into the database
         :param context_codes: the context codes to be inserted
         """
-        values = set(
-            (
-                context_code.system,
-                context_code.code,
-                context_code.version if context_code.version else "",
-                context_code.display,
-            )
-            for context_code in context_codes
-        )
-        psycopg2.extras.execute_batch(
-            self.cursor,
-            "INSERT INTO context (system, code, version, display) VALUES (%s, %s, %s, %s)"
-            "ON CONFLICT DO NOTHING",
-            values,
-        )
-        self.db_connection.commit()
+        self.__insert_codes("context", self.__context_ids, context_codes)
 
     def context_exists(self, context: TermCode):
         """
@@ -233,38 +422,74 @@ class DataBaseWriter:
         self, contextualized_term_codes: List[Tuple[TermCode, TermCode, str]]
     ):
         """
-        Links a list of contextualized term codes to their corresponding ui profiles
+        Links a list of contextualized term codes to their corresponding ui profiles. The IDs of contexts, term codes
+        and UI profiles are taken from the rows inserted by this writer such that links are written with literal IDs.
+        Links referencing unknown rows are dropped
         :param contextualized_term_codes: List of tuples each containing a context, a term code, and a UI profile name
         """
         self.__logger.info("Linking contextualized term codes to UI profiles")
-        values = [
+        self.__resolve_code_ids(
+            "context",
+            self.__context_ids,
+            (self.__code_key(context) for context, _, _ in contextualized_term_codes),
+        )
+        self.__resolve_code_ids(
+            "termcode",
+            self.__term_code_ids,
             (
-                self.calculate_context_term_code_hash(context, term_code),
-                context.system,
-                context.code,
-                context.version if context.version else "",
-                term_code.system,
-                term_code.code,
-                term_code.version if term_code.version else "",
-                ui_profile_name,
+                self.__code_key(term_code)
+                for _, term_code, _ in contextualized_term_codes
+            ),
+        )
+        self.__resolve_ui_profile_ids(name for _, _, name in contextualized_term_codes)
+        # Later entries take precedence over earlier ones with the same hash like they do when linking them one by one
+        values: Dict[str, Tuple[str, int, int, int]] = {}
+        for context, term_code, ui_profile_name in contextualized_term_codes:
+            context_id = self.__context_ids.get(self.__code_key(context))
+            term_code_id = self.__term_code_ids.get(self.__code_key(term_code))
+            ui_profile_id = self.__ui_profile_ids.get(ui_profile_name)
+            if context_id is None or term_code_id is None or ui_profile_id is None:
+                continue
+            context_term_code_hash = self.calculate_context_term_code_hash(
+                context, term_code
+            )
+            values[context_term_code_hash] = (
+                context_term_code_hash,
+                context_id,
+                term_code_id,
+                ui_profile_id,
+            )
+        if len(values) < len(contextualized_term_codes):
+            self.__logger.debug(
+                f"Skipped {len(contextualized_term_codes) - len(values)} duplicate or unresolvable links"
             )
-            for context, term_code, ui_profile_name in contextualized_term_codes
-        ]
 
-        psycopg2.extras.execute_batch(
-            self.cursor,
-            """
-            INSERT INTO contextualized_termcode (context_termcode_hash, context_id, termcode_id, ui_profile_id) 
-            SELECT %s, C.id, T.id, U.id
-            FROM 
-                (SELECT id FROM context WHERE system = %s AND code = %s AND version = %s) C,
-                (SELECT id FROM termcode WHERE system = %s AND code = %s AND version = %s) T,
-                (SELECT id FROM ui_profile WHERE name = %s) U
-            ON CONFLICT (context_termcode_hash)
-            DO UPDATE SET ui_profile_id = EXCLUDED.ui_profile_id;
-            """,
-            values,
-        )
+        if self.bulk_load:
+            self.cursor.copy_expert(
+                """
+                COPY contextualized_termcode_staging (context_termcode_hash, context_id, termcode_id, ui_profile_id)
+                FROM STDIN
+                """,
+                copy_rows(values.values()),
+            )
+            self.cursor.execute("""
+                INSERT INTO contextualized_termcode (context_termcode_hash, context_id, termcode_id, ui_profile_id)
+                SELECT context_termcode_hash, context_id, termcode_id, ui_profile_id
+                FROM contextualized_termcode_staging
+                ON CONFLICT (context_termcode_hash)
+                DO UPDATE SET ui_profile_id = EXCLUDED.ui_profile_id;
+                """)
+        else:
+            psycopg2.extras.execute_values(
+                self.cursor,
+                """
+                INSERT INTO contextualized_termcode (context_termcode_hash, context_id, termcode_id, ui_profile_id)
+                VALUES %s
+                ON CONFLICT (context_termcode_hash)
+                DO UPDATE SET ui_profile_id = EXCLUDED.ui_profile_id;
+                """,
+                list(values.values()),
+            )
         self.db_connection.commit()
 
     def link_contextualized_term_code_to_mapping(
@@ -300,6 +525,21 @@ class DataBaseWriter:
         )
         self.db_connection.commit()
 
+    def __resolve_ui_profile_ids(self, names: Iterable[str]):
+        """
+        Looks up the IDs of UI profiles which are not known locally, e.g. because they were inserted by another writer
+        :param names: Names of the UI profiles whose IDs should be resolved
+        """
+        missing = [name for name in set(names) if name not in self.__ui_profile_ids]
+        if not missing:
+            return
+        self.cursor.execute(
+            "SELECT id, name FROM ui_profile WHERE name = ANY(%s) ORDER BY id",
+            (missing,),
+        )
+        for row_id, name in self.cursor.fetchall():
+            self.__ui_profile_ids.setdefault(name, row_id)
+
     def insert_ui_profiles(self, named_ui_profile: Dict[str, UIProfile]):
         """
         Inserts the ui profile into the database
@@ -309,11 +549,17 @@ class DataBaseWriter:
         values = [
             (name, profile.to_json()) for name, profile in named_ui_profile.items()
         ]
-        psycopg2.extras.execute_batch(
+        if not values:
+            return
+        returned = psycopg2.extras.execute_values(
             self.cursor,
-            "INSERT INTO ui_profile (name , ui_profile) VALUES (%s, %s)",
+            "INSERT INTO ui_profile (name , ui_profile) VALUES %s RETURNING id, name",
             values,
+            fetch=True,
         )
+        for row_id, name in returned:
+            # Links reference the first UI profile inserted with a given name
+            self.__ui_profile_ids.setdefault(name, row_id)
         self.db_connection.commit()
 
     def insert_mappings(self, named_mappings: Dict, mapping_type):
@@ -459,33 +705,6 @@ class DataBaseWriter:
         )
         return bool(self.cursor.fetchone())
 
-    def write_ui_profiles_to_db(
-        self,
-        contextualized_term_code_to_ui_profile,
-        named_ui_profiles,
-        contextualized_codes_exist: bool = False,
-    ):
-        context_codes = [
-            context_code
-            for (context_code, _) in contextualized_term_code_to_ui_profile.keys()
-        ]
-        term_codes = [
-            term_code
-            for (_, term_code) in contextualized_term_code_to_ui_profile.keys()
-        ]
-        if not contextualized_codes_exist:
-            self.insert_context_codes(context_codes)
-            self.insert_term_codes(term_codes)
-        self.insert_ui_profiles(named_ui_profiles)
-        values = [
-            (context_code, term_code, ui_profile_name)
-            for (
-                context_code,
-                term_code,
-            ), ui_profile_name in contextualized_term_code_to_ui_profile.items()
-        ]
-        self.link_contextualized_term_code_to_ui_profile(values)
-
     def write_mapping_to_db(
         self,
         contextualized_term_code_to_mapping,
@@ -513,15 +732,6 @@ class DataBaseWriter:
         ]
         self.link_contextualized_term_code_to_mapping(values)
 
-    def write_vs_to_db(self, profiles: List[UIProfile]):
-        for ui_profile in profiles:
-            for attribute_definition in ui_profile.attributeDefinitions:
-                if attribute_definition.type == "reference":
-                    profile_criteria_set = attribute_definition.referencedCriteriaSet
-                    # TODO: Maybe better to get them upfront
-                    for single_criteria_set in profile_criteria_set:
-                        self.add_critieria_set(single_criteria_set)
-
     @deprecated(
         "No longer serves a purpose as its goal is already ensured via NON NULL constraint on the column"
     )
@@ -532,23 +742,19 @@ class DataBaseWriter:
         leaking into the table and resulting in rows without any UI profile reference. Due to other SQL statements not
         overwriting existing entries (based on the rows term code hash value), these incomplete entries will persist
         """
-        self.cursor.execute(
-            """
+        self.cursor.execute("""
             SELECT COUNT(*)
             FROM contextualized_termcode
             WHERE ui_profile_id IS NULL;
-        """
-        )
+        """)
         row = self.cursor.fetchone()
         cnt = row[0] if row else 0
         if cnt > 0:
             self.__logger.info(
                 f"Removing {cnt} contextualized term code entries without reference to any UI profile"
             )
-            self.cursor.execute(
-                """
+            self.cursor.execute("""
                 DELETE FROM contextualized_termcode
                 WHERE ui_profile_id IS NULL;
-            """
-            )
+            """)
             self.db_connection.commit()
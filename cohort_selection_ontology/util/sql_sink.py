@@ -0,0 +1,156 @@
+from os import PathLike
+from pathlib import Path
+from typing import List, Tuple, Dict, Optional, Any, Sequence
+
+from cohort_selection_ontology.model.ui_data import TermCode
+from cohort_selection_ontology.model.ui_profile import UIProfile
+from cohort_selection_ontology.util.database import UIProfileWriter
+from common.util.log.functions import get_class_logger
+from common.util.sql.dump import (
+    DUMP_HEADER,
+    DUMP_FOOTER,
+    write_table_data,
+    write_sequence_set,
+)
+
+
+class _Table:
+    """
+    In-memory table with a serial primary key and an optional unique key
+    """
+
+    def __init__(self, name: str, columns: Sequence[str]):
+        self.name = name
+        self.columns = columns
+        self.rows: List[List[Any]] = []
+        self.ids: Dict[Any, int] = {}
+
+    @property
+    def last_id(self) -> int:
+        return len(self.rows)
+
+    def insert(self, row: Sequence[Any], key: Any = None) -> int:
+        """
+        Inserts a row unless a row with the same key exists (`ON CONFLICT DO NOTHING`)
+        :param row: Column values without the ID
+        :param key: Unique key of the row or `None` if the row has no unique key
+        :return: ID of the inserted or conflicting row
+        """
+        if key is not None and key in self.ids:
+            return self.ids[key]
+        row_id = len(self.rows) + 1
+        self.rows.append([row_id, *row])
+        if key is not None:
+            self.ids[key] = row_id
+        return row_id
+
+
+class SqlSinkWriter(UIProfileWriter):
+    """
+    Writer collecting the rows of the feasibility tool ontology tables in memory and emitting them as a data-only SQL
+    script equivalent to the `pg_dump` output of a module database populated by `DataBaseWriter`. This avoids starting
+    and populating a PostgreSQL instance per module. Constraints are emulated as follows:
+
+    - `termcode` and `context` rows are unique per (system, code, version) and the first display wins
+    - `contextualized_termcode` rows are unique per hash and later links update the UI profile reference
+    - Links referencing unknown contexts, term codes or UI profiles are dropped
+    """
+
+    __logger = get_class_logger("SqlSinkWriter")
+
+    __term_codes: _Table
+    __contexts: _Table
+    __ui_profiles: _Table
+    __ui_profile_ids: Dict[str, int]
+    __contextualized_term_codes: Dict[str, List[Any]]
+
+    def __init__(self):
+        self.__term_codes = _Table(
+            "termcode", ("id", "system", "code", "version", "display")
+        )
+        self.__contexts = _Table(
+            "context", ("id", "system", "code", "version", "display")
+        )
+        self.__ui_profiles = _Table("ui_profile", ("id", "name", "ui_profile"))
+        self.__ui_profile_ids = {}
+        self.__contextualized_term_codes = {}
+
+    @staticmethod
+    def __code_key(term_code: TermCode) -> Tuple[str, str, str]:
+        return (
+            term_code.system,
+            term_code.code,
+            term_code.version if term_code.version else "",
+        )
+
+    def __insert_codes(self, table: _Table, term_codes: List[TermCode]):
+        for term_code in term_codes:
+            key = self.__code_key(term_code)
+            table.insert((*key, term_code.display), key)
+
+    def insert_term_codes(self, term_codes: List[TermCode]):
+        self.__insert_codes(self.__term_codes, term_codes)
+
+    def insert_context_codes(self, context_codes: List[TermCode]):
+        self.__insert_codes(self.__contexts, context_codes)
+
+    def context_exists(self, context: TermCode) -> bool:
+        return self.__code_key(context) in self.__contexts.ids
+
+    def termcode_exists(self, term_code: TermCode) -> bool:
+        return self.__code_key(term_code) in self.__term_codes.ids
+
+    def ui_profile_exists(self, ui_profile_name: str) -> bool:
+        return ui_profile_name in self.__ui_profile_ids
+
+    def insert_ui_profiles(self, named_ui_profile: Dict[str, UIProfile]):
+        for name, profile in named_ui_profile.items():
+            row_id = self.__ui_profiles.insert((name, profile.to_json()))
+            self.__ui_profile_ids.setdefault(name, row_id)
+
+    def link_contextualized_term_code_to_ui_profile(
+        self, contextualized_term_codes: List[Tuple[TermCode, TermCode, str]]
+    ):
+        self.__logger.info("Linking contextualized term codes to UI profiles")
+        for context, term_code, ui_profile_name in contextualized_term_codes:
+            context_id = self.__contexts.ids.get(self.__code_key(context))
+            term_code_id = self.__term_codes.ids.get(self.__code_key(term_code))
+            ui_profile_id = self.__ui_profile_ids.get(ui_profile_name)
+            if context_id is None or term_code_id is None or ui_profile_id is None:
+                continue
+            context_term_code_hash = self.calculate_context_term_code_hash(
+                context, term_code
+            )
+            if row := self.__contextualized_term_codes.get(context_term_code_hash):
+                row[3] = ui_profile_id
+            else:
+                self.__contextualized_term_codes[context_term_code_hash] = [
+                    context_term_code_hash,
+                    context_id,
+                    term_code_id,
+                    ui_profile_id,
+                ]
+
+    def dump(self, file: str | PathLike[str], encoding: Optional[str] = "utf-8"):
+        """
+        Writes the collected rows as a data-only SQL script loading them via `COPY` statements
+        :param file: Path of the script file
+        :param encoding: Encoding of the script file
+        """
+        path = Path(file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tables = [self.__contexts, self.__term_codes, self.__ui_profiles]
+        with open(path, mode="w", encoding=encoding, newline="\n") as f:
+            f.write(DUMP_HEADER)
+            for table in tables:
+                write_table_data(f, table.name, table.columns, table.rows)
+            write_table_data(
+                f,
+                "contextualized_termcode",
+                ("context_termcode_hash", "context_id", "termcode_id", "ui_profile_id"),
+                list(self.__contextualized_term_codes.values()),
+            )
+            for table in tables:
+                write_sequence_set(f, f"{table.name}_id_seq", table.last_id)
+            f.write(DUMP_FOOTER)
+        self.__logger.info(f"Database dumped to {path.name}")
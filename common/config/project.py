@@ -1,4 +1,4 @@
-from typing import Annotated, Any, Dict
+from typing import Annotated, Any, Dict, Literal
 
 import isodate
 from pydantic import BaseModel
@@ -25,6 +25,25 @@ class FhirPackageManagerConfig(BaseModel):
     ]
 
 
+class FhirResourceStoreConfig(BaseModel):
+    enabled: Annotated[
+        bool,
+        Field(
+            frozen=True,
+            default=False,
+            description="Whether parsed resources of the FHIR package cache should be stored on disk",
+        ),
+    ]
+    path: Annotated[
+        str,
+        Field(
+            frozen=True,
+            default=".cache/fhir/resources.sqlite",
+            description="Path of the store database relative to the project directory",
+        ),
+    ]
+
+
 class FhirPackagesConfig(BaseModel):
     manager: Annotated[
         FhirPackageManagerConfig,
@@ -34,6 +53,61 @@ class FhirPackagesConfig(BaseModel):
             default=FhirPackageManagerConfig(),
         ),
     ]
+    store: Annotated[
+        FhirResourceStoreConfig,
+        Field(
+            frozen=True,
+            description="Config for the persistent store of parsed resources",
+            default=FhirResourceStoreConfig(),
+        ),
+    ]
+
+
+class ThrottlingConfig(BaseModel):
+    requests_per_second: Annotated[
+        float | None,
+        Field(
+            frozen=True,
+            default=None,
+            description="Maximum request rate (token bucket refill rate), None => unlimited",
+        ),
+    ]
+    burst: Annotated[
+        int | None,
+        Field(
+            frozen=True,
+            default=None,
+            description="Token bucket capacity, None => one second worth of requests",
+        ),
+    ]
+    initial_concurrency: Annotated[
+        int,
+        Field(frozen=True, default=4, description="Initial concurrency limit"),
+    ]
+    min_concurrency: Annotated[
+        int,
+        Field(frozen=True, default=1, description="Lower bound of concurrency limit"),
+    ]
+    max_concurrency: Annotated[
+        int,
+        Field(frozen=True, default=64, description="Upper bound of concurrency limit"),
+    ]
+    decrease_factor: Annotated[
+        float,
+        Field(
+            frozen=True,
+            default=0.5,
+            description="Factor the concurrency limit is multiplied with on 429/503 responses",
+        ),
+    ]
+    max_retry_after: Annotated[
+        float,
+        Field(
+            frozen=True,
+            default=300,
+            description="Upper bound in seconds for pauses requested via 'Retry-After'",
+        ),
+    ]
 
 
 class HTTPConfig(BaseModel):
@@ -53,6 +127,96 @@ class HTTPConfig(BaseModel):
         float,
         Field(frozen=True, default=2, description="Retry backoff factor in seconds"),
     ]
+    pool_connections: Annotated[
+        int,
+        Field(
+            frozen=True,
+            default=10,
+            description="Number of connection pools (i.e. distinct hosts) to cache",
+        ),
+    ]
+    pool_maxsize: Annotated[
+        int,
+        Field(
+            frozen=True,
+            default=10,
+            description="Maximum number of connections kept per connection pool",
+        ),
+    ]
+    pool_block: Annotated[
+        bool,
+        Field(
+            frozen=True,
+            default=False,
+            description="Whether requests should wait for a free connection once the pool is exhausted",
+        ),
+    ]
+    keep_alive: Annotated[
+        int | None,
+        Field(
+            frozen=True,
+            default=None,
+            description="Idle time in seconds after which TCP keep-alive probes are sent, None => disabled",
+        ),
+    ]
+    coalesce_requests: Annotated[
+        bool,
+        Field(
+            frozen=True,
+            default=True,
+            description="Whether identical concurrent GET/POST requests should share a single network call. POST "
+            "requests are only considered identical if their bodies match (compared by hash)",
+        ),
+    ]
+    max_concurrency: Annotated[
+        int,
+        Field(
+            frozen=True,
+            default=10,
+            description="Maximum number of requests in flight for asynchronous clients",
+        ),
+    ]
+    throttling: Annotated[
+        ThrottlingConfig | None,
+        Field(
+            frozen=True,
+            default=None,
+            description="Client-side rate limiting and adaptive concurrency, None => disabled",
+        ),
+    ]
+    server_throttling: Annotated[
+        Dict[str, ThrottlingConfig],
+        Field(
+            frozen=True,
+            default={},
+            description="Throttling configuration overrides keyed by server authority (host[:port])",
+        ),
+    ]
+    http2: Annotated[
+        bool,
+        Field(
+            frozen=True,
+            default=False,
+            description="Whether to use the HTTP/2-capable transport (requires 'httpx[http2]')",
+        ),
+    ]
+    metrics_report: Annotated[
+        bool,
+        Field(
+            frozen=True,
+            default=False,
+            description="Whether to write a JSON report of HTTP client metrics to the logging directory on exit. "
+            "Worker processes write separate reports suffixed with their process ID",
+        ),
+    ]
+    metrics_prometheus: Annotated[
+        bool,
+        Field(
+            frozen=True,
+            default=False,
+            description="Whether to additionally write the HTTP client metrics in Prometheus text format",
+        ),
+    ]
 
     @field_validator("timeout", mode="before")
     @classmethod
@@ -62,6 +226,114 @@ class HTTPConfig(BaseModel):
         return value
 
 
+class TerminologyCacheConfig(BaseModel):
+    enabled: Annotated[
+        bool,
+        Field(
+            frozen=True,
+            default=False,
+            description="Whether value set expansions should be cached on disk",
+        ),
+    ]
+    directory: Annotated[
+        str,
+        Field(
+            frozen=True,
+            default=".cache/terminology/expansions",
+            description="Cache directory relative to the project directory",
+        ),
+    ]
+    ttl: Annotated[
+        int | str,
+        Field(
+            frozen=True,
+            default=86400,
+            description="Time in seconds after which cached expansions are revalidated",
+        ),
+    ]
+    max_size: Annotated[
+        int,
+        Field(
+            frozen=True,
+            default=2**30,
+            description="Maximum size of all cached expansions in bytes",
+        ),
+    ]
+
+    @field_validator("ttl", mode="before")
+    @classmethod
+    def parse_iso_if_str(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return int(isodate.parse_duration(value).total_seconds())
+        return value
+
+
+class ExpansionConfig(BaseModel):
+    page_size: Annotated[
+        int | None,
+        Field(
+            frozen=True,
+            default=None,
+            description="Number of concepts requested per page when expanding value sets, None => no paging",
+        ),
+    ]
+    page_workers: Annotated[
+        int,
+        Field(
+            frozen=True,
+            default=4,
+            description="Maximum number of expansion pages fetched concurrently",
+        ),
+    ]
+
+
+class RecordingConfig(BaseModel):
+    mode: Annotated[
+        Literal["off", "record", "replay"],
+        Field(
+            frozen=True,
+            default="off",
+            description="Whether terminology server exchanges should be recorded to or replayed from the archive",
+        ),
+    ]
+    archive: Annotated[
+        str,
+        Field(
+            frozen=True,
+            default=".cache/terminology/recording.ndjson.zst",
+            description="Archive file relative to the project directory. Compressed with zstd if 'zstandard' is "
+            "installed and with gzip otherwise",
+        ),
+    ]
+
+
+class TerminologyConfig(BaseModel):
+    expansion: Annotated[
+        ExpansionConfig,
+        Field(
+            frozen=True,
+            default=ExpansionConfig(),
+            description="Configuration options related to value set expansion",
+        ),
+    ]
+    cache: Annotated[
+        TerminologyCacheConfig,
+        Field(
+            frozen=True,
+            default=TerminologyCacheConfig(),
+            description="Configuration options related to caching of terminology server responses",
+        ),
+    ]
+    recording: Annotated[
+        RecordingConfig,
+        Field(
+            frozen=True,
+            default=RecordingConfig(),
+            description="Configuration options related to recording and replaying terminology server exchanges",
+        ),
+    ]
+
+
 class ProjectConfig(BaseModel):
     fhir_packages: Annotated[
         FhirPackagesConfig,
@@ -80,3 +352,11 @@ class ProjectConfig(BaseModel):
             description="Configuration options related to HTTP clients",
         ),
     ]
+    terminology: Annotated[
+        TerminologyConfig,
+        Field(
+            frozen=True,
+            default=TerminologyConfig(),
+            description="Configuration options related to terminology server access",
+        ),
+    ]
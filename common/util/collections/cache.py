@@ -0,0 +1,51 @@
+from typing import Any, Callable, Mapping, Optional
+
+import cachetools
+
+
+class MeteredLRUCache(cachetools.LRUCache):
+    """
+    Least recently used cache counting hits and misses of lookups via `get` as well as evictions. If a size function is
+    provided the cache is bounded by the total size of its values rather than their number
+    """
+
+    def __init__(self, maxsize: int, getsizeof: Optional[Callable[[Any], int]] = None):
+        """
+        :param maxsize: Maximum number of entries or maximum total size of all values if `getsizeof` is provided
+        :param getsizeof: (Optional) function estimating the size of a value
+        """
+        super().__init__(maxsize, getsizeof)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        if key in self:
+            self.hits += 1
+            # Item access refreshes the recency of the entry
+            return self[key]
+        self.misses += 1
+        return default
+
+    def popitem(self):
+        # Called by `cachetools.Cache.__setitem__` to make room for new entries
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def stats(self) -> Mapping[str, int | float]:
+        """
+        Returns the counters of the cache alongside its current and maximum size
+
+        :return: Mapping of counter names to values
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+            "size": self.currsize,
+            "max_size": self.maxsize,
+        }
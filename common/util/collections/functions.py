@@ -29,3 +29,23 @@ def first(f: Callable[[T], bool], xs: Iterable[T]) -> Optional[T]:
     :return: First matching element or `None` if no match was found
     """
     return next(filter(f, xs), None)
+
+
+def batched(xs: Iterable[T], n: int) -> Iterable[List[T]]:
+    """
+    Splits the provided iterable into consecutive batches of at most `n` elements
+
+    :param xs: Iterable to split
+    :param n: Maximum size of each batch
+    :return: Iterable of batches
+    """
+    if n < 1:
+        raise ValueError("Batch size must be at least 1")
+    batch = []
+    for x in xs:
+        batch.append(x)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,130 @@
+from typing import (
+    Mapping,
+    Dict,
+    List,
+    TypeVar,
+    Hashable,
+    Collection,
+    Sequence,
+    Optional,
+)
+
+K = TypeVar("K", bound=Hashable)
+
+
+def transitive_reduction(ancestors: Mapping[K, Collection[K]]) -> Dict[K, List[K]]:
+    """
+    Computes the transitive reduction of a directed acyclic graph given as its transitive closure, i.e. determines the
+    direct parents of each node from the set of all of its ancestors (e.g. as returned by the `$closure` operation).
+
+    Since each node has strictly more ancestors than any of its ancestors, the number of ancestors of a node (its rank)
+    induces a topological order. The ancestor with the highest rank is always a direct parent and if its rank is one
+    less than that of the node, it is the only one, which settles the common case in time linear in the number of
+    ancestors. Otherwise, the ancestors of the selected parent are removed from the remaining candidates and the
+    candidate with the highest rank is selected next until no candidates remain. This avoids the cubic cost of pairwise list scans
+
+    :param ancestors: Maps each node to all of its ancestors. Nodes without an entry are considered roots
+    :return: Maps each node with at least one ancestor to its direct parents, preserving the order of the input
+    """
+    rank: Dict[K, int] = {node: len(a) for node, a in ancestors.items()}
+    # Ancestors without an entry of their own are roots
+    for node in set().union(*ancestors.values()).difference(rank):
+        rank[node] = 0
+    get_rank = rank.__getitem__
+    # Ancestor sets are materialized lazily since only those of direct parents of nodes with multiple parents are
+    # needed
+    ancestor_sets: Dict[K, frozenset[K]] = {}
+    no_ancestors: frozenset[K] = frozenset()
+
+    def ancestor_set(n: K) -> frozenset[K]:
+        s = ancestor_sets.get(n)
+        if s is None:
+            s = ancestor_sets[n] = frozenset(ancestors.get(n, no_ancestors))
+        return s
+
+    reduction: Dict[K, List[K]] = {}
+    for node, node_ancestors in ancestors.items():
+        if not node_ancestors:
+            continue
+        nearest = max(node_ancestors, key=get_rank)
+        if rank[nearest] == rank[node] - 1 and nearest != node:
+            reduction[node] = [nearest]
+            continue
+        direct = set()
+        remaining = set(node_ancestors)
+        remaining.discard(node)
+        while remaining:
+            parent = max(remaining, key=get_rank)
+            direct.add(parent)
+            remaining.discard(parent)
+            remaining.difference_update(ancestor_set(parent))
+        # Restore the input order
+        reduction[node] = [a for a in node_ancestors if a in direct]
+    return reduction
+
+
+def descendant_or_self_counts(children: Sequence[Sequence[int]]) -> List[Optional[int]]:
+    """
+    Counts the descendants-or-self of each node of a directed acyclic graph whose nodes are identified by consecutive
+    integer indices.
+
+    Nodes are visited iteratively in depth-first post-order starting from the roots, i.e. each node is visited after
+    all of its descendants. The descendant-or-self set of a node is represented as a bitset (an arbitrary precision
+    integer) obtained by OR-ing the bitsets of its children, such that shared descendants in poly-hierarchies are
+    counted once without materializing sets of codes. Bit positions are assigned in visiting order and each bitset is
+    stored relative to its lowest bit. Hence, the descendants of a node occupy a narrow range of bits and the size of a
+    bitset is bounded by the span of its descendants rather than the size of the graph. The bitset of a node is
+    released as soon as all of its parents were visited
+
+    :param children: Lists the indices of the direct children of each node
+    :return: Number of descendants-or-self of each node or `None` for nodes that are part of or above a cycle or are
+             not reachable from any root
+    """
+    size = len(children)
+    # Number of parents that did not yet consume the bitset of a node
+    pending_parents = [0] * size
+    for node_children in children:
+        for child in node_children:
+            pending_parents[child] += 1
+    position = 0
+    offsets: List[int] = [0] * size
+    bitsets: List[Optional[int]] = [None] * size
+    counts: List[Optional[int]] = [None] * size
+    entered = bytearray(size)
+    for root in range(size):
+        if pending_parents[root] or entered[root]:
+            continue
+        entered[root] = 1
+        stack = [(root, iter(children[root]))]
+        while stack:
+            node, it = stack[-1]
+            for child in it:
+                if not entered[child]:
+                    entered[child] = 1
+                    stack.append((child, iter(children[child])))
+                    break
+            else:
+                stack.pop()
+                offset = position
+                bitset = 1
+                for child in children[node]:
+                    child_bitset = bitsets[child]
+                    if child_bitset is None:
+                        # Child is part of or above a cycle
+                        bitset = None
+                        break
+                    child_offset = offsets[child]
+                    if child_offset < offset:
+                        bitset = (bitset << (offset - child_offset)) | child_bitset
+                        offset = child_offset
+                    else:
+                        bitset |= child_bitset << (child_offset - offset)
+                    pending_parents[child] -= 1
+                    if not pending_parents[child]:
+                        bitsets[child] = 0
+                position += 1
+                if bitset is not None:
+                    counts[node] = bitset.bit_count()
+                    offsets[node] = offset
+                    bitsets[node] = bitset if pending_parents[node] else 0
+    return counts
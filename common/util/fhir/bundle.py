@@ -1,4 +1,8 @@
+from datetime import datetime, timezone
 from enum import Enum
+from typing import List
+
+from fhir.resources.R4B.bundle import Bundle, BundleEntry
 
 
 class BundleType(Enum):
@@ -15,3 +19,12 @@ class BundleType(Enum):
 
 def create_bundle(bundle_type: BundleType):
     return {"resourceType": "Bundle", "type": bundle_type.value, "entry": []}
+
+
+def build_bundle(bundle_type: BundleType, bundle_entries: List[BundleEntry]) -> Bundle:
+    return Bundle(
+        type=bundle_type.value,
+        timestamp=datetime.now(timezone.utc),
+        total=len(bundle_entries),
+        entry=bundle_entries,
+    )
@@ -2,17 +2,28 @@ import abc
 import functools
 import json
 import logging
+import multiprocessing
 import os
 import re
 import shutil
 import subprocess
 import tarfile
-from collections import defaultdict, OrderedDict
+import tempfile
+from collections import defaultdict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from contextlib import contextmanager
 from logging import Logger
 from pathlib import Path
 from subprocess import CalledProcessError
 from typing import (
+    Iterable,
     Iterator,
     Mapping,
     Any,
@@ -22,6 +33,7 @@ from typing import (
     ContextManager,
     Annotated,
     Union,
+    NamedTuple,
 )
 
 import cachetools
@@ -41,8 +53,17 @@ from common.model.fhir.structure_definition import idx_struct_def_discriminator
 from common.model.fhir.pydantic import construct_model
 
 from common.util.codec.json import load_json
+from common.util.collections.cache import MeteredLRUCache
+from common.util.fhir.package.store import ResourceStore
 from common.util.http.client import BaseClient
+from common.util.http.exceptions import raise_appropriate_exception
 from common.util.log.decorators import inject_logger
+from common.util.log.functions import worker_processes
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 
 def _version_matches(fuzzy: str, exact: str) -> bool:
@@ -93,47 +114,228 @@ def _profile_cache_key(*args, **kwargs) -> str:
         return param.url
 
 
-def build_package_index(package_dir: Path) -> Mapping[str, Any]:
+# Keys always present in entries of generated index files
+_INDEX_ENTRY_KEYS = (
+    "resourceType",
+    "id",
+    "url",
+    "version",
+    "kind",
+    "type",
+    "supplements",
+    "content",
+)
+# Marks index files generated by `build_package_index`. Index files shipped with packages may lack entry keys relied on
+# (e.g. `baseDefinition`) and are replaced. Increment if the content of entries changes
+_INDEX_FORMAT_KEY = "x-ontology-generator-index"
+_INDEX_FORMAT = 1
+# Files larger than this are streamed when extracting their top-level fields to bound the memory used by each worker
+_INDEX_STREAMING_MIN_BYTES = 8 * 2**20
+# Packages with fewer files are indexed serially since distributing the work would cost more than it saves
+_INDEX_PARALLEL_MIN_FILES = 64
+
+
+def _top_level_scalars_streaming(file_path: Path) -> Mapping[str, Any]:
+    scalars = {}
+    depth = 0
+    key = None
+    with open(file_path, mode="rb") as f:
+        # ijson does not accept a UTF-8 BOM
+        if f.read(3) != b"\xef\xbb\xbf":
+            f.seek(0)
+        for event, value in ijson.basic_parse(f, use_float=True):
+            match event:
+                case "map_key":
+                    if depth == 1:
+                        key = value
+                case "start_map" | "start_array":
+                    depth += 1
+                case "end_map" | "end_array":
+                    depth -= 1
+                case _:
+                    if depth == 1:
+                        scalars[key] = value
+    return scalars
+
+
+def _index_entry(file_path: Path) -> Mapping[str, Any]:
+    """
+    Builds the index file entry of a single file of a package
+
+    :param file_path: Path to the JSON file
+    :return: Mapping representing the entry
+    """
+    if ijson is not None and file_path.stat().st_size >= _INDEX_STREAMING_MIN_BYTES:
+        try:
+            content = _top_level_scalars_streaming(file_path)
+        except ijson.JSONError as exc:
+            raise ValueError(
+                f"Failed to parse JSON file content @ {file_path}"
+            ) from exc
+    else:
+        content = load_json(file_path, encoding=["utf-8", "utf-8-sig"], fail=True)
+    entry = {"filename": os.path.basename(file_path)}
+    for k in _INDEX_ENTRY_KEYS:
+        entry[k] = content.get(k)
+    for k, v in content.items():
+        if k not in entry and isinstance(v, str):
+            entry[k] = v
+    return entry
+
+
+def build_package_index(
+    package_dir: Path, executor: Optional[Executor] = None
+) -> Mapping[str, Any]:
     """
     Build the content of an index file for the given package
 
     :param package_dir: Path to directory of the packages content
+    :param executor: (Optional) executor to distribute the parsing of the package's files to. Since parsing is CPU
+                     bound this should be a `ProcessPoolExecutor`
     :return: Mapping representing index file content
     """
-    files = []
-    index = {"index-version": 2, "files": files}
-    for file_path in package_dir.glob("package/**/[!.]*.json"):
-        bn = os.path.basename(file_path)
-        content = load_json(file_path, encoding=["utf-8", "utf-8-sig"], fail=True)
-        entry = {
-            "filename": bn,
-            "resourceType": content.get("resourceType"),
-            "id": content.get("id"),
-            "url": content.get("url"),
-            "version": content.get("version"),
-            "kind": content.get("kind"),
-            "type": content.get("type"),
-            "supplements": content.get("supplements"),
-            "content": content.get("content"),
-        }
-        for k, v in content.items():
-            if k not in entry and isinstance(v, str):
-                entry[k] = v
-        files.append(entry)
+    file_paths = list(package_dir.glob("package/**/[!.]*.json"))
+    if executor is not None and len(file_paths) >= _INDEX_PARALLEL_MIN_FILES:
+        chunk_size = max(1, len(file_paths) // (4 * (os.cpu_count() or 1)))
+        files = list(executor.map(_index_entry, file_paths, chunksize=chunk_size))
+    else:
+        files = [_index_entry(file_path) for file_path in file_paths]
+    return {"index-version": 2, _INDEX_FORMAT_KEY: _INDEX_FORMAT, "files": files}
+
+
+def read_package_index_file(package_dir: Path) -> Optional[Mapping[str, Any]]:
+    """
+    Reads the index file of the given package if it was generated by `build_package_index`
+
+    :param package_dir: Path to directory of the packages content
+    :return: Mapping representing the index file content or `None` if the index file is missing, unreadable or was
+             not generated by this implementation
+    """
+    idx_path = package_dir / "package" / ".index.json"
+    try:
+        index = load_json(idx_path)
+    except (OSError, UnicodeDecodeError):
+        return None
+    if (
+        not isinstance(index, Mapping)
+        or index.get("index-version") != 2
+        or index.get(_INDEX_FORMAT_KEY) != _INDEX_FORMAT
+        or not isinstance(index.get("files"), list)
+    ):
+        return None
     return index
 
 
-def update_package_index_file(package_dir: Path):
+def update_package_index_file(
+    package_dir: Path, executor: Optional[Executor] = None
+) -> Mapping[str, Any]:
     """
-    Generates new index file content and add it to the package content/replaces the old index file
+    Generates new index file content and add it to the package content/replaces the old index file. The file is
+    replaced atomically such that concurrent readers and writers never encounter a partially written index file
 
     :param package_dir: Path to directory of the packages content
+    :param executor: (Optional) executor to distribute the parsing of the package's files to
+    :return: Mapping representing the new index file content
     """
-    index = build_package_index(package_dir)
-    with open(
-        package_dir / "package" / ".index.json", mode="w+", encoding="utf-8"
+    index = build_package_index(package_dir, executor)
+    idx_path = package_dir / "package" / ".index.json"
+    with tempfile.NamedTemporaryFile(
+        mode="w",
+        encoding="utf-8",
+        dir=idx_path.parent,
+        prefix=f"{idx_path.name}.",
+        suffix=".tmp",
+        delete=False,
     ) as idx_f:
-        json.dump(index, idx_f, indent=2)
+        try:
+            json.dump(index, idx_f, indent=2)
+        except BaseException:
+            idx_f.close()
+            os.remove(idx_f.name)
+            raise
+    os.replace(idx_f.name, idx_path)
+    return index
+
+
+def _index_mp_context() -> multiprocessing.context.BaseContext:
+    """
+    Returns the context index worker processes are started with. Forking is avoided since it copies the state of
+    threads running concurrently (e.g. package downloads holding locks) into the children which may deadlock them
+
+    :return: `forkserver` context if supported by the platform and `spawn` context otherwise
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+# Size of the buffer used to read package tarballs from the response stream
+_DOWNLOAD_BUFFER_SIZE = 2**20
+
+
+# Combinations of `.index.json` entry keys for which hash indexes are maintained, ordered by their selectivity
+_INDEXED_KEYS: tuple[tuple[str, ...], ...] = (
+    ("url", "version"),
+    ("url",),
+    ("baseDefinition",),
+    ("resourceType", "kind"),
+)
+
+FileIndex = Mapping[tuple[str, ...], Mapping[tuple, List[Mapping[str, Any]]]]
+
+
+def _build_file_index(files: List[Mapping[str, Any]]) -> FileIndex:
+    """
+    Builds hash indexes over the entries of a package's `.index.json` file for each combination of keys in
+    `_INDEXED_KEYS`. Entries missing any of the keys of a combination are not part of the respective index
+
+    :param files: Entries of the `.index.json` file
+    :return: Mapping from key combinations to mappings from value combinations to matching entries in file order
+    """
+    file_index = {}
+    for keys in _INDEXED_KEYS:
+        index = defaultdict(list)
+        for entry in files:
+            if all(k in entry for k in keys):
+                try:
+                    index[tuple(entry[k] for k in keys)].append(entry)
+                except TypeError:
+                    # Unhashable values cannot be equal to hashable pattern values
+                    continue
+        file_index[keys] = dict(index)
+    return file_index
+
+
+def _index_lookup(
+    index_pattern: Optional[Mapping[str, Any]],
+) -> Optional[tuple[tuple[str, ...], tuple]]:
+    """
+    Determines the most selective hash index that can be used to find entries matching the given pattern
+
+    :param index_pattern: Pattern to select entries in the `.index.json` file
+    :return: Tuple of key combination and values to look up or `None` if no index can be used, e.g. if the pattern only
+             contains regex patterns
+    """
+    if not index_pattern:
+        return None
+    for keys in _INDEXED_KEYS:
+        if all(
+            k in index_pattern and not isinstance(index_pattern[k], re.Pattern)
+            for k in keys
+        ):
+            values = tuple(index_pattern[k] for k in keys)
+            try:
+                hash(values)
+            except TypeError:
+                continue
+            return keys, values
+    return None
+
+
+class _CachedResource(NamedTuple):
+    resource: Resource
+    # Estimated number of bytes occupied by the parsed resource
+    size: int
 
 
 def _contained_in(dict_a, dict_b) -> bool:
@@ -160,21 +362,65 @@ class FhirPackageManager(abc.ABC):
     """
 
     _logger: Logger
-    __cache: OrderedDict[Path, Resource]
-    __cache_size: int = 10000
+    __cache: MeteredLRUCache
+    # Maximum estimated number of bytes occupied by cached resources
+    _cache_max_bytes: int = 2**30
+    # Ratio of the memory occupied by a parsed resource to the size of its JSON file (~15-22 for StructureDefinitions)
+    _resource_size_factor: int = 16
+    # Maximum number of processes parsing package files when building index files (`None` => number of CPUs)
+    _index_workers: Optional[int] = None
+    # (Optional) persistent store of parsed resources consulted before parsing files of the package cache
+    resource_store: Optional[ResourceStore] = None
 
     def __init__(self, package_cache_dir: Path):
         self.__package_cache_dir = package_cache_dir
         self._index = defaultdict(dict)
-        self.__cache = OrderedDict()
+        self.__file_indexes: dict[tuple[str, str], FileIndex] = {}
+        self.__packages: dict[
+            bool, List[tuple[Mapping[str, Any], Mapping[str, Any], FileIndex]]
+        ] = {}
+        self.__cache = MeteredLRUCache(
+            self._cache_max_bytes, getsizeof=lambda e: e.size
+        )
 
         if not self.__package_cache_dir.exists():
             raise Exception(f"No FHIR cache directory @ {self.__package_cache_dir}")
 
-    def __add_to_cache(self, key: Path, res: Resource):
-        if len(self.__cache) == self.__cache_size and key not in self.__cache:
-            self.__cache.popitem()
-        self.__cache[key] = res
+    def __add_to_cache(self, key: Path, res: Resource, file_size: int):
+        try:
+            self.__cache[key] = _CachedResource(
+                res, file_size * self._resource_size_factor
+            )
+        except ValueError:
+            self._logger.debug(f"Resource @ {key} is too large to be cached")
+
+    def __load_resource(
+        self, file_path: Path, rel_file_path: Path, file_stat: os.stat_result
+    ) -> Resource:
+        store_key = rel_file_path.as_posix()
+        if self.resource_store is not None:
+            if res := self.resource_store.get(store_key, file_stat):
+                return res
+        json_data = load_json(file_path, fail=True)
+        if (res_type := json_data.get("resourceType")) == "StructureDefinition":
+            res = ensure_struct_def_is_navigable(
+                construct_model(idx_struct_def_discriminator, **json_data)
+            )
+        else:
+            model_class = fhir.resources.get_fhir_model_class(res_type)
+            res = model_class.model_validate(json_data)
+        if self.resource_store is not None:
+            self.resource_store.put(store_key, file_stat, res)
+        return res
+
+    def cache_stats(self) -> Mapping[str, int | float]:
+        """
+        Returns the hit, miss and eviction counters as well as the current and maximum (estimated) size in bytes of
+        the cache of parsed resources
+
+        :return: Mapping of counter names to values
+        """
+        return self.__cache.stats()
 
     def cache_location(self) -> Path:
         """
@@ -184,7 +430,9 @@ class FhirPackageManager(abc.ABC):
         """
         return self.__package_cache_dir
 
-    def _update_index_with_package(self, package_dir: Path):
+    def _update_index_with_package(
+        self, package_dir: Path, executor: Optional[Executor] = None
+    ):
         with open(
             package_dir / "package" / "package.json", mode="r", encoding="utf-8"
         ) as f:
@@ -193,22 +441,46 @@ class FhirPackageManager(abc.ABC):
             name_entry = self._index[name]
             version = package_info.get("version")
             if version not in name_entry:
-                idx_path = package_dir / "package" / ".index.json"
-                if not idx_path.exists() or idx_path.is_file():
-                    update_package_index_file(package_dir)
-                with open(
-                    idx_path,
-                    mode="r",
-                    encoding="utf-8",
-                ) as idx_f:
-                    name_entry[version] = (package_info, json.load(idx_f))
+                index = read_package_index_file(package_dir)
+                if index is None:
+                    index = update_package_index_file(package_dir, executor)
+                name_entry[version] = (package_info, index)
+                self.__file_indexes[(name, version)] = _build_file_index(
+                    index.get("files", [])
+                )
+                # Package order has to be determined again
+                self.__packages.clear()
+
+    @contextmanager
+    def _index_executor(self) -> Iterator[Optional[Executor]]:
+        """
+        Provides the executor the parsing of package files is distributed to when building index files. Worker processes
+        are only started once work is submitted. Within worker processes (e.g. of `generate_ontology.py --jobs`) files
+        are parsed serially since each worker would otherwise start a pool sized to the number of CPUs
+
+        :return: Context manager yielding the executor or `None` if files should be parsed serially
+        """
+        if multiprocessing.parent_process() is not None:
+            yield None
+            return
+        with (
+            worker_processes(),
+            ProcessPoolExecutor(
+                max_workers=self._index_workers, mp_context=_index_mp_context()
+            ) as executor,
+        ):
+            yield executor
 
     def _update_index(self):
         cache_path = self.cache_location()
-        for package_path in cache_path.iterdir():
-            if not package_path.is_dir():
-                continue
-            self._update_index_with_package(self.cache_location() / package_path)
+        package_paths = [p for p in cache_path.iterdir() if p.is_dir()]
+        if not package_paths:
+            return
+        with self._index_executor() as executor:
+            for package_path in package_paths:
+                self._update_index_with_package(
+                    self.cache_location() / package_path, executor
+                )
 
     def has_package(self, name: str, version: Optional[str]) -> bool:
         """
@@ -227,6 +499,27 @@ class FhirPackageManager(abc.ABC):
                     return True
             return False
 
+    def __sorted_packages(
+        self, latest_only: bool
+    ) -> List[tuple[Mapping[str, Any], Mapping[str, Any], FileIndex]]:
+        """
+        Lists the packages in the cache ordered by name and descending version alongside their hash indexes. The result
+        is kept until the index is updated
+
+        :param latest_only: If `True` only the latest version of each package is listed
+        :return: List of tuples of `package.json` content, `.index.json` content and hash indexes
+        """
+        packages = self.__packages.get(latest_only)
+        if packages is None:
+            packages = self.__packages[latest_only] = [
+                (package_info, index, self.__file_indexes[(name, version)])
+                for name, entry in self._index.items()
+                for version, (package_info, index) in sorted(
+                    entry.items(), key=lambda p: p[0], reverse=True
+                )[: 1 if latest_only else None]
+            ]
+        return packages
+
     def iterate_cache(
         self,
         package_pattern: Optional[Mapping[str, Any]] = None,
@@ -238,7 +531,9 @@ class FhirPackageManager(abc.ABC):
         Iterates over entries of the FHIR projects cache. Results can be filtered on package and index entry level via
         patterns. The patterns structure should mirror their respective file content in the package: entries in the
         patterns are evaluated against the corresponding files content. If the value of a patterns entry is an instance
-        of `re.Pattern` then regex matching will be performed against the respective entry of the content
+        of `re.Pattern` then regex matching will be performed against the respective entry of the content. Index entries
+        are looked up via hash indexes if the index pattern contains exact values for the `url` (and `version`),
+        `baseDefinition` or `resourceType` and `kind` keys and scanned otherwise
 
         :param package_pattern: (Optional) pattern to select only packages with matching `package.json` file content
         :param index_pattern: (Optional) pattern to select only package content with matching entry in the `.index.json`
@@ -247,46 +542,32 @@ class FhirPackageManager(abc.ABC):
         :param skip_on_fail: IF `True` skips failed entry and continues iteration
         :return: Iterator of all selected resources in the cache
         """
-        packages = filter(
-            lambda t: _contained_in(package_pattern, t[0]),
-            [
-                package
-                for entry in self._index.values()
-                for _, package in (
-                    sorted(entry.items(), key=lambda p: p[0], reverse=True)[:1]
-                    if latest_only
-                    else sorted(entry.items(), key=lambda p: p[0], reverse=True)
-                )
-            ],
-        )
-        for package_info, index in packages:
+        lookup = _index_lookup(index_pattern)
+        for package_info, index, file_index in self.__sorted_packages(latest_only):
+            if not _contained_in(package_pattern, package_info):
+                continue
             cache_path = self.__package_cache_dir
             package_dir_name = (
                 f"{package_info.get('name')}#{package_info.get('version')}"
             )
-            for file_entry in index.get("files", []):
+            if lookup:
+                keys, values = lookup
+                file_entries = file_index[keys].get(values, [])
+            else:
+                file_entries = index.get("files", [])
+            for file_entry in file_entries:
                 if _contained_in(index_pattern, file_entry):
                     rel_file_path = Path(
                         package_dir_name, "package", file_entry.get("filename")
                     )
                     file_path = cache_path.joinpath(rel_file_path)
                     try:
-                        if res := self.__cache.get(rel_file_path):
-                            yield res
+                        if cached := self.__cache.get(rel_file_path):
+                            yield cached.resource
                             continue
-                        json_data = load_json(file_path, fail=True)
-                        if (
-                            res_type := json_data.get("resourceType")
-                        ) == "StructureDefinition":
-                            res = ensure_struct_def_is_navigable(
-                                construct_model(
-                                    idx_struct_def_discriminator, **json_data
-                                )
-                            )
-                        else:
-                            model_class = fhir.resources.get_fhir_model_class(res_type)
-                            res = model_class.model_validate(json_data)
-                        self.__add_to_cache(rel_file_path, res)
+                        file_stat = file_path.stat()
+                        res = self.__load_resource(file_path, rel_file_path, file_stat)
+                        self.__add_to_cache(rel_file_path, res, file_stat.st_size)
                         yield res
                     except Exception as exc:
                         msg = f"Failed to load data @ {file_path}"
@@ -590,7 +871,15 @@ class RepositoryPackageManager(FhirPackageManager):
         repo_url: str,
         auth: Optional[AuthBase] = None,
         reinit: bool = False,
+        max_workers: int = 4,
     ):
+        """
+        :param package_dir: Directory containing the `package.json` file and the package cache
+        :param repo_url: Base URL of the repository hosting the package tarballs
+        :param auth: (Optional) authentication to use when requesting packages
+        :param reinit: If `True` the package directory is removed before initialization
+        :param max_workers: Maximum number of packages downloaded concurrently
+        """
         if not shutil.which("fhir"):
             logging.warning(
                 "Tool 'firely.terminal' was not found. Package inflation will not be available"
@@ -609,6 +898,7 @@ class RepositoryPackageManager(FhirPackageManager):
         self.__client = BaseClient(repo_url, auth)
         self.__inflated = set()
         self.__inflated_file_path = package_cache_dir / ".inflated"
+        self.__max_workers = max(1, max_workers)
         super().__init__(package_cache_dir)
 
     def inflate_cache(self, force: bool = False):
@@ -660,6 +950,131 @@ class RepositoryPackageManager(FhirPackageManager):
             stream=True,
         )
 
+    def __download_package(
+        self, name_and_version: tuple[str, str], staging_dir: Path
+    ) -> tuple[Path, Mapping[str, Any]]:
+        """
+        Downloads a package and extracts its tarball while it is being received. The package is extracted into a staging
+        directory first which is then moved into the package cache in a single (atomic) rename
+
+        :param name_and_version: Name and version of the package
+        :param staging_dir: Empty directory on the file system of the package cache to extract the package into
+        :return: Directory of the installed package and the content of its `package.json` file
+        """
+        with self._request_package(name_and_version) as response:
+            if not response.ok:
+                raise_appropriate_exception(response)
+            # Only undo the content encoding applied for the transfer. The compression of the tarball itself is handled
+            # by `tarfile`
+            response.raw.decode_content = True
+            with tarfile.open(
+                fileobj=response.raw, mode="r|*", bufsize=_DOWNLOAD_BUFFER_SIZE
+            ) as tgz_file:
+                tgz_file.extractall(staging_dir)
+        pkg_info = load_json(staging_dir / "package" / "package.json", fail=True)
+        package_dir = (
+            self.cache_location() / f"{pkg_info.get('name')}#{pkg_info.get('version')}"
+        )
+        try:
+            os.rename(staging_dir, package_dir)
+        except OSError:
+            if not package_dir.is_dir():
+                raise
+            # Package was installed concurrently (e.g. by another process) in the meantime
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return package_dir, pkg_info
+
+    def __install_packages(
+        self,
+        packages: Iterable[tuple[str, str]],
+        lenient_on_deps: bool = False,
+        lenient: bool = False,
+    ):
+        """
+        Installs packages and their (transitive) dependencies. The dependency graph is resolved while packages are
+        downloaded concurrently: Once a package is installed its missing dependencies are scheduled for download such
+        that each package (identified by name and requested version) is fetched exactly once
+
+        :param packages: Names and versions of the packages to install
+        :param lenient_on_deps: If `True` failing installations of dependencies are logged instead of raised
+        :param lenient: If `True` failing installations of the given packages are logged instead of raised
+        """
+        tmp_dir = self.cache_location() / ".tmp"
+        tmp_dir.mkdir(exist_ok=True)
+        install_dir = Path(tempfile.mkdtemp(dir=tmp_dir))
+        requested = set()
+        pending: dict[Future, tuple[tuple[str, str], Optional[tuple[str, str]]]] = {}
+        try:
+            with (
+                ThreadPoolExecutor(max_workers=self.__max_workers) as downloads,
+                self._index_executor() as indexing,
+            ):
+
+                def schedule(
+                    package: tuple[str, str], dependent: Optional[tuple[str, str]]
+                ):
+                    if package in requested:
+                        return
+                    requested.add(package)
+                    if self.has_package(*package):
+                        self._logger.debug(
+                            f"Package {package[0]}-{package[1]} is already installed"
+                        )
+                        return
+                    if dependent:
+                        self._logger.debug(
+                            f"Installing (missing) dependency {package} of package {dependent[0]}-{dependent[1]}"
+                        )
+                    else:
+                        self._logger.info(
+                            f"Installing package {package[0]}-{package[1]}"
+                        )
+                    staging_dir = install_dir / str(len(requested))
+                    staging_dir.mkdir()
+                    future = downloads.submit(
+                        self.__download_package, package, staging_dir
+                    )
+                    pending[future] = (package, dependent)
+
+                for p in packages:
+                    match p:
+                        case (name, version):
+                            schedule((name, version), None)
+                        case _:
+                            raise UnsupportedError(
+                                f"A package version has to be provided in this implementation"
+                            )
+                while pending:
+                    done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        package, dependent = pending.pop(future)
+                        try:
+                            package_dir, pkg_info = future.result()
+                            self._update_index_with_package(package_dir, indexing)
+                        except Exception as exc:
+                            if dependent:
+                                msg = f"Failed to install dependency {package} of package {dependent[0]}-{dependent[1]}"
+                                is_lenient = lenient_on_deps
+                            else:
+                                msg = f"Failed to install package {package[0]}-{package[1]}"
+                                is_lenient = lenient
+                            if is_lenient:
+                                self._logger.warning(msg)
+                                self._logger.debug("Details:", exc_info=exc)
+                                continue
+                            for f in pending.keys():
+                                f.cancel()
+                            raise Exception(msg) from exc
+                        for dep in pkg_info.get("dependencies", {}).items():
+                            schedule(dep, package)
+        finally:
+            shutil.rmtree(install_dir, ignore_errors=True)
+            try:
+                tmp_dir.rmdir()
+            except OSError:
+                # Still in use by concurrent installations
+                pass
+
     def install(
         self,
         *packages: tuple[str, str],
@@ -670,72 +1085,7 @@ class RepositoryPackageManager(FhirPackageManager):
             raise ValueError(
                 "Package inflation is not possible due to missing tool 'firely.terminal'"
             )
-        tmp_dir = self.cache_location() / ".tmp"
-        try:
-            for p in packages:
-                match p:
-                    case (name, version):
-                        name_and_version = f"{name}-{version}"
-                    case _:
-                        raise UnsupportedError(
-                            f"A package version has to be provided in this implementation"
-                        )
-                if self.has_package(name, version):
-                    self._logger.debug(
-                        f"Package {name_and_version} is already installed"
-                    )
-                    continue
-                try:
-                    self._logger.info(f"Installing package {name_and_version}")
-                    # Download and install package
-                    with self._request_package((name, version)) as response:
-                        tmp_dir.mkdir(exist_ok=True)
-                        package_tgz = tmp_dir / "package.tgz"
-                        package_tgz.touch(mode=0o666)
-                        with package_tgz.open(mode="wb") as tgz_file:
-                            for chunk in response.iter_content(chunk_size=128):
-                                tgz_file.write(chunk)
-                        tmp_package_dir = tmp_dir / f"{p[0]}#{p[1]}"
-                        tmp_package_dir.mkdir(exist_ok=True)
-                        with tarfile.open(package_tgz, mode="r:*") as tgz_file:
-                            tgz_file.extractall(tmp_package_dir)
-                        package_tgz.unlink(missing_ok=True)
-                        pkg_info = load_json(
-                            tmp_package_dir / "package" / "package.json"
-                        )
-                        name = pkg_info.get("name")
-                        version = pkg_info.get("version")
-                        package_dir = self.cache_location() / f"{name}#{version}"
-                        shutil.copytree(tmp_package_dir, package_dir)
-                        shutil.rmtree(tmp_package_dir)
-                    # Install dependencies
-                    deps = [
-                        (pkg, ver)
-                        for pkg, ver in pkg_info.get("dependencies", {}).items()
-                        if not self.has_package(pkg, ver)
-                    ]
-                    if deps:
-                        self._logger.debug(
-                            f"Installing (missing) dependencies of package {name_and_version}: {deps}"
-                        )
-                        for dep in deps:
-                            try:
-                                self.install(dep, inflate=False)
-                            except Exception as exc:
-                                msg = f"Failed to install dependency {dep}"
-                                if lenient_on_deps:
-                                    self._logger.warning(msg)
-                                    self._logger.debug("Details:", exc_info=exc)
-                                else:
-                                    raise Exception(msg) from exc
-                    # Update index
-                    self._update_index_with_package(package_dir)
-                except Exception as exc:
-                    raise Exception(
-                        f"Failed to install package {name_and_version}"
-                    ) from exc
-        finally:
-            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.__install_packages(packages, lenient_on_deps=lenient_on_deps)
         if inflate:
             self.inflate_cache()
 
@@ -753,14 +1103,7 @@ class RepositoryPackageManager(FhirPackageManager):
             self._logger.info(
                 f"Restoring (missing) package dependencies {', '.join(map(lambda t: t[0] + '@' + t[1], packages))}"
             )
-            for pkg in packages:
-                try:
-                    self.install(pkg, inflate=False, lenient_on_deps=lenient)
-                except Exception as exc:
-                    if lenient:
-                        self._logger.warning(exc)
-                    else:
-                        raise exc
+            self.__install_packages(packages, lenient_on_deps=lenient, lenient=lenient)
         else:
             self._logger.info("All dependencies are already present")
         if inflate:
@@ -782,12 +1125,14 @@ class GitHubPackageManager(RepositoryPackageManager):
         path: str = "package-tarballs",
         auth: Optional[AuthBase] = None,
         reinit: bool = False,
+        max_workers: int = 4,
     ):
         super().__init__(
             package_dir,
             f"https://github.com/{org}/{repo}/contents/{path}",
             auth=auth,
             reinit=reinit,
+            max_workers=max_workers,
         )
         self.__org = org
         self.__repo = repo
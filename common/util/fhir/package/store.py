@@ -0,0 +1,169 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+from importlib.metadata import version
+from importlib.resources import files
+from pathlib import Path
+from typing import Optional
+
+from fhir.resources.R4B.resource import Resource
+
+import common.model.fhir
+from common.config.project import FhirResourceStoreConfig
+from common.util.log.functions import get_class_logger
+
+# Increment if the layout of the store changes
+_STORE_VERSION = 1
+
+
+def _fingerprint() -> str:
+    """
+    Identifies the code pickled resources depend on. Stored resources are discarded if it changes, e.g. after updating
+    the FHIR model library or changing the navigable model classes
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        f"{_STORE_VERSION}|{sys.version_info[:2]}|{pickle.HIGHEST_PROTOCOL}".encode()
+    )
+    for dist in ["fhir.resources", "pydantic"]:
+        digest.update(f"|{dist}={version(dist)}".encode())
+    model_dir = files(common.model.fhir)
+    for path in sorted(Path(str(model_dir)).glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class ResourceStore:
+    """
+    Persistent store of parsed (and for StructureDefinitions navigable) resources of a FHIR package cache backed by a
+    SQLite database. Resources are stored pickled and keyed by their path relative to the package cache directory. The
+    modification time and size of the source file are stored alongside and entries whose source file changed are
+    ignored. This allows warm starts to skip parsing and validating the JSON content of the package cache
+    """
+
+    __logger = get_class_logger("ResourceStore")
+
+    __path: Path
+    __fingerprint: str
+    __lock: threading.Lock
+    __connection: Optional[sqlite3.Connection]
+    __pid: Optional[int]
+
+    def __init__(self, path: str | Path):
+        """
+        :param path: Path of the database file. Parent directories will be created if they do not exist
+        """
+        self.__path = Path(path)
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.__fingerprint = _fingerprint()
+        self.__lock = threading.Lock()
+        self.__connection = None
+        self.__pid = None
+
+    @classmethod
+    def from_config(
+        cls, config: FhirResourceStoreConfig, base_dir: Path
+    ) -> Optional["ResourceStore"]:
+        """
+        Returns a store instance described by the given configuration
+
+        :param config: Store configuration
+        :param base_dir: Directory relative to which the configured store path is resolved
+        :return: `ResourceStore` instance or `None` if the store is disabled
+        """
+        if not config.enabled:
+            return None
+        return cls(base_dir / config.path)
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    def __connect(self) -> sqlite3.Connection:
+        # Connections cannot be shared with forked worker processes
+        if self.__connection is None or self.__pid != os.getpid():
+            connection = sqlite3.connect(
+                self.__path, timeout=30, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS resource (
+                    key      TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size     INTEGER NOT NULL,
+                    data     BLOB NOT NULL
+                )
+                """)
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'fingerprint'"
+            ).fetchone()
+            if row is None or row[0] != self.__fingerprint:
+                if row is not None:
+                    self.__logger.info(
+                        f"Discarding resources stored @ {self.__path} since they were created by different code"
+                    )
+                connection.execute("DELETE FROM resource")
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)",
+                    (self.__fingerprint,),
+                )
+            connection.commit()
+            self.__connection = connection
+            self.__pid = os.getpid()
+        return self.__connection
+
+    def get(self, key: str, stat: os.stat_result) -> Optional[Resource]:
+        """
+        Looks up a resource in the store
+
+        :param key: Path of the source file relative to the package cache directory
+        :param stat: Current status of the source file
+        :return: Stored resource or `None` if there is no entry or the source file was modified since it was stored
+        """
+        with self.__lock:
+            row = (
+                self.__connect()
+                .execute(
+                    "SELECT data FROM resource WHERE key = ? AND mtime_ns = ? AND size = ?",
+                    (key, stat.st_mtime_ns, stat.st_size),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as exc:
+            self.__logger.warning(f"Failed to load stored resource '{key}' => Ignoring")
+            self.__logger.debug("Details:", exc_info=exc)
+            return None
+
+    def put(self, key: str, stat: os.stat_result, resource: Resource):
+        """
+        Stores a resource
+
+        :param key: Path of the source file relative to the package cache directory
+        :param stat: Status of the source file the resource was parsed from
+        :param resource: Resource to store
+        """
+        data = pickle.dumps(resource, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.__lock:
+            connection = self.__connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO resource (key, mtime_ns, size, data) VALUES (?, ?, ?, ?)",
+                (key, stat.st_mtime_ns, stat.st_size, data),
+            )
+            connection.commit()
+
+    def close(self):
+        with self.__lock:
+            if self.__connection is not None and self.__pid == os.getpid():
+                self.__connection.close()
+            self.__connection = None
@@ -0,0 +1,231 @@
+import io
+import socket
+import time
+from typing import Optional, Any
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter, BaseAdapter
+from requests.exceptions import RetryError, ConnectionError, Timeout
+from requests.structures import CaseInsensitiveDict
+from urllib3 import Retry
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import MaxRetryError
+
+from common.config.project import HTTPConfig
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def _keep_alive_socket_options(idle: int) -> list[tuple[int, int, int]]:
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    # Platform-specific options are only available on some systems (e.g. not on Windows or macOS)
+    for name, value in [("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", max(idle // 3, 1))]:
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    `HTTPAdapter` with configurable connection pool sizing and TCP keep-alive
+    """
+
+    __keep_alive: Optional[int]
+
+    def __init__(self, keep_alive: Optional[int] = None, **kwargs):
+        """
+        :param keep_alive: Idle time in seconds after which TCP keep-alive probes are sent on pooled connections.
+                           `None` disables TCP keep-alive
+        :param kwargs: Arguments passed to `HTTPAdapter`
+        """
+        self.__keep_alive = keep_alive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.__keep_alive is not None:
+            pool_kwargs["socket_options"] = (
+                HTTPConnection.default_socket_options
+                + _keep_alive_socket_options(self.__keep_alive)
+            )
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+
+class _HTTPXStream(io.RawIOBase):
+    """
+    File-like view of the body of a streamed `httpx.Response` serving as the `raw` attribute of converted responses.
+    Content is decoded by `httpx` already, hence `decode_content` has no effect and is only present for compatibility
+    with consumers of `urllib3` responses
+    """
+
+    decode_content: bool = True
+
+    def __init__(self, resp: "httpx.Response", request: PreparedRequest):
+        super().__init__()
+        self.__resp = resp
+        self.__request = request
+        self.__chunks = resp.iter_bytes()
+        self.__chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        try:
+            while not self.__chunk:
+                chunk = next(self.__chunks, None)
+                if chunk is None:
+                    return 0
+                self.__chunk = memoryview(chunk)
+        except httpx.TimeoutException as err:
+            raise Timeout(err, request=self.__request)
+        except httpx.TransportError as err:
+            raise ConnectionError(err, request=self.__request)
+        n = min(len(buffer), len(self.__chunk))
+        buffer[:n] = self.__chunk[:n]
+        self.__chunk = self.__chunk[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.__resp.close()
+        super().close()
+
+
+class HTTPXAdapter(BaseAdapter):
+    """
+    Transport adapter routing requests issued via a `requests.Session` through an `httpx.Client`. This allows HTTP/2
+    to be used such that many in-flight requests can be multiplexed over a single connection per host. Requires the
+    optional `httpx[http2]` dependency
+    """
+
+    __client: Any
+    __max_retries: Retry
+
+    def __init__(
+        self,
+        http2: bool = True,
+        max_retries: Retry | int = 0,
+        pool_maxsize: int = 10,
+        keep_alive: Optional[int] = None,
+        cert: Optional[tuple[str, str]] = None,
+    ):
+        """
+        :param http2: Whether HTTP/2 should be negotiated with the server
+        :param max_retries: Retry configuration to apply to requests
+        :param pool_maxsize: Maximum number of connections kept in the pool
+        :param keep_alive: Time in seconds idle connections are kept in the pool. Defaults to 5 seconds
+        :param cert: Client certificate and private key files to authenticate with. Since the underlying client is
+                     configured once, per-request certificates and proxies passed by the session are ignored
+        """
+        if httpx is None:
+            raise ImportError(
+                "HTTP/2 transport requires the optional dependency 'httpx[http2]' to be installed"
+            )
+        super().__init__()
+        self.__client = httpx.Client(
+            http2=http2,
+            cert=tuple(str(p) for p in cert) if cert else None,
+            limits=httpx.Limits(
+                max_connections=pool_maxsize,
+                max_keepalive_connections=pool_maxsize,
+                keepalive_expiry=keep_alive if keep_alive is not None else 5.0,
+            ),
+        )
+        self.__max_retries = (
+            max_retries
+            if isinstance(max_retries, Retry)
+            else Retry(total=max_retries, read=False)
+        )
+
+    def __convert_response(
+        self, request: PreparedRequest, resp: "httpx.Response", stream: bool
+    ) -> Response:
+        response = Response()
+        response.status_code = resp.status_code
+        response.headers = CaseInsensitiveDict(resp.headers)
+        if stream:
+            # The body is read from the connection on demand, e.g. via `iter_content` or `raw`
+            response.raw = _HTTPXStream(resp, request)
+        else:
+            response._content = resp.content
+            response._content_consumed = True
+            response.raw = io.BytesIO(resp.content)
+        response.encoding = resp.encoding
+        response.reason = resp.reason_phrase
+        response.url = str(resp.url)
+        response.request = request
+        response.connection = self
+        return response
+
+    def send(
+        self,
+        request: PreparedRequest,
+        stream=False,
+        timeout=None,
+        verify=True,
+        cert=None,
+        proxies=None,
+    ) -> Response:
+        retries = self.__max_retries
+        while True:
+            try:
+                resp = self.__client.send(
+                    self.__client.build_request(
+                        request.method,
+                        request.url,
+                        headers=dict(request.headers),
+                        content=request.body,
+                        timeout=timeout,
+                    ),
+                    stream=stream,
+                )
+            except httpx.TimeoutException as err:
+                raise Timeout(err, request=request)
+            except httpx.TransportError as err:
+                raise ConnectionError(err, request=request)
+            has_retry_after = "Retry-After" in resp.headers
+            if not retries.is_retry(request.method, resp.status_code, has_retry_after):
+                return self.__convert_response(request, resp, stream)
+            resp.close()
+            try:
+                retries = retries.increment(method=request.method, url=request.url)
+            except MaxRetryError as err:
+                raise RetryError(err, request=request)
+            time.sleep(retries.get_backoff_time())
+
+    def close(self):
+        self.__client.close()
+
+
+def create_adapter(
+    http_config: Optional[HTTPConfig],
+    retries: Retry | int,
+    cert: Optional[tuple[str, str]] = None,
+) -> BaseAdapter:
+    """
+    Creates the transport adapter described by the given configuration
+
+    :param http_config: HTTP configuration. Defaults are used if `None`
+    :param retries: Retry configuration to apply to requests
+    :param cert: Client certificate and private key files to authenticate with
+    :return: Transport adapter to mount on a `requests.Session`
+    """
+    if http_config is None:
+        return HTTPAdapter(max_retries=retries)
+    if http_config.http2:
+        return HTTPXAdapter(
+            max_retries=retries,
+            pool_maxsize=http_config.pool_maxsize,
+            keep_alive=http_config.keep_alive,
+            cert=cert,
+        )
+    return PooledHTTPAdapter(
+        keep_alive=http_config.keep_alive,
+        pool_connections=http_config.pool_connections,
+        pool_maxsize=http_config.pool_maxsize,
+        pool_block=http_config.pool_block,
+        max_retries=retries,
+    )
@@ -0,0 +1,228 @@
+import asyncio
+import time
+from typing import Mapping, Optional, Any, Self
+
+from requests.exceptions import RetryError
+from urllib3 import Retry, HTTPResponse
+from urllib3.exceptions import MaxRetryError
+
+from common.config.project import HTTPConfig
+from common.constants.http import RETRYABLE_STATUS_CODES
+from common.util.http.exceptions import ClientError, ServerError
+from common.util.http.metrics import HTTPMetrics, endpoint_of
+from common.util.http.retries import CustomRetry
+from common.util.http.url import insert_path_params, format_query_params, merge_urls
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def _raise_appropriate_exception(response: "httpx.Response") -> None:
+    if 400 <= response.status_code < 500:
+        raise ClientError(
+            response.status_code, response.reason_phrase, response.content
+        )
+    elif 500 <= response.status_code < 600:
+        raise ServerError(
+            response.status_code, response.reason_phrase, response.content
+        )
+
+
+class AsyncBaseClient:
+    """
+    Asynchronous counterpart of `BaseClient` built on `httpx.AsyncClient`. The number of requests in flight at any time
+    is bounded by a semaphore and failed requests are retried using the same `CustomRetry` semantics as `BaseClient`.
+    Requires the optional `httpx` dependency
+    """
+
+    __client: Any
+    __base_url: str
+    __timeout: float
+    __retries: Retry
+    __semaphore: asyncio.Semaphore
+    __metrics: HTTPMetrics
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: Optional[Any] = None,
+        cert: Optional[tuple[str, str]] = None,
+        timeout: float = 60,
+        http_config: HTTPConfig = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        """
+        :param base_url: Base URL of the server
+        :param auth: `httpx.Auth` instance to authenticate requests with
+        :param cert: Client certificate and private key files to authenticate with
+        :param timeout: Timeout in seconds. Overridden by `http_config` if provided
+        :param http_config: HTTP configuration
+        :param max_concurrency: Maximum number of requests in flight. Defaults to `HTTPConfig.max_concurrency`
+        """
+        if httpx is None:
+            raise ImportError(
+                "Asynchronous clients require the optional dependency 'httpx' to be installed"
+            )
+        self.__base_url = base_url
+        self.__timeout = timeout if not http_config else http_config.timeout
+        self.__retries = (
+            CustomRetry(
+                total=http_config.retries,
+                backoff_factor=http_config.backoff_factor,
+                status_forcelist=RETRYABLE_STATUS_CODES,
+                allowed_methods=["GET", "POST"],
+            )
+            if http_config
+            else Retry(total=0)
+        )
+        self.__metrics = HTTPMetrics.instance()
+        if http_config and http_config.metrics_report:
+            self.__metrics.register_report(http_config.metrics_prometheus)
+        http_config = http_config if http_config else HTTPConfig()
+        self.__semaphore = asyncio.Semaphore(
+            max_concurrency if max_concurrency else http_config.max_concurrency
+        )
+        self.__client = httpx.AsyncClient(
+            auth=auth,
+            cert=tuple(str(p) for p in cert) if cert else None,
+            http2=http_config.http2,
+            limits=httpx.Limits(
+                max_connections=http_config.pool_maxsize,
+                max_keepalive_connections=http_config.pool_maxsize,
+            ),
+        )
+
+    def _get_base_url(self) -> str:
+        return self.__base_url
+
+    def _get_timeout(self) -> float:
+        return self.__timeout
+
+    def _get_retries(self) -> Retry:
+        return self.__retries
+
+    async def aclose(self):
+        await self.__client.aclose()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    def __determine_url(
+        self,
+        context_path: Optional[str] = None,
+        full_url: Optional[str] = None,
+        path_params: Optional[Mapping[str, str]] = None,
+    ) -> str:
+        url = (
+            full_url
+            if full_url is not None
+            else merge_urls(self.__base_url, context_path)
+        )
+        return insert_path_params(url, **(path_params if path_params else {}))
+
+    def __endpoint(
+        self, context_path: Optional[str] = None, full_url: Optional[str] = None
+    ) -> str:
+        return endpoint_of(
+            full_url
+            if full_url is not None
+            else merge_urls(self.__base_url, context_path)
+        )
+
+    async def __request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        content: Optional[bytes] = None,
+        headers: Mapping[str, str] = None,
+        query_params: Mapping[str, str | list[str]] = None,
+    ) -> "httpx.Response":
+        params = format_query_params(query_params)
+        if params is not None:
+            params = {k: v for k, v in params.items() if v is not None}
+        retries = self.__retries
+        start = time.perf_counter()
+        response = None
+        try:
+            while True:
+                async with self.__semaphore:
+                    response = await self.__client.request(
+                        method,
+                        url,
+                        content=content,
+                        params=params,
+                        headers=headers,
+                        timeout=self.__timeout,
+                    )
+                has_retry_after = "Retry-After" in response.headers
+                if not retries.is_retry(method, response.status_code, has_retry_after):
+                    break
+                try:
+                    retries = retries.increment(
+                        method=method,
+                        url=url,
+                        response=HTTPResponse(
+                            status=response.status_code,
+                            headers=dict(response.headers),
+                        ),
+                    )
+                except MaxRetryError as err:
+                    raise RetryError(err)
+                # Back off outside the semaphore so other requests can proceed in the meantime
+                await asyncio.sleep(retries.get_backoff_time())
+        finally:
+            self.__metrics.observe_request(
+                method,
+                endpoint,
+                response.status_code if response is not None else None,
+                time.perf_counter() - start,
+                len(content) if content else 0,
+                len(response.content) if response is not None else 0,
+            )
+        if response.status_code < 400:
+            return response
+        _raise_appropriate_exception(response)
+
+    async def get(
+        self,
+        context_path: Optional[str] = None,
+        full_url: Optional[str] = None,
+        headers: Mapping[str, str] = None,
+        path_params: Mapping[str, str] = None,
+        query_params: Mapping[str, str | list[str]] = None,
+    ) -> "httpx.Response":
+        request_url = self.__determine_url(context_path, full_url, path_params)
+        return await self.__request(
+            "GET",
+            request_url,
+            self.__endpoint(context_path, full_url),
+            headers=headers,
+            query_params=query_params,
+        )
+
+    async def post(
+        self,
+        context_path: Optional[str] = None,
+        full_url: Optional[str] = None,
+        body: str = None,
+        headers: Mapping[str, str] = None,
+        path_params: Mapping[str, str] = None,
+        query_params: Mapping[str, str | list[str]] = None,
+    ) -> "httpx.Response":
+        if not body:
+            raise ValueError("Body of a POST request cannot be empty")
+        request_url = self.__determine_url(context_path, full_url, path_params)
+        return await self.__request(
+            "POST",
+            request_url,
+            self.__endpoint(context_path, full_url),
+            content=body.encode("utf-8"),
+            headers=headers,
+            query_params=query_params,
+        )
@@ -1,24 +1,35 @@
-from typing import Mapping, Optional, ContextManager
+import functools
+import time
+from typing import Mapping, Optional, ContextManager, Callable
 
 from requests import Session, Response
-from requests.adapters import HTTPAdapter
 from requests.auth import AuthBase
 from urllib3 import Retry
 
 from common.config.project import HTTPConfig
 from common.constants.http import RETRYABLE_STATUS_CODES
+from common.util.http.adapters import create_adapter
 from common.util.http.exceptions import (
     raise_appropriate_exception,
 )
+from common.util.http.metrics import HTTPMetrics, endpoint_of
 from common.util.http.retries import CustomRetry
+from common.util.http.singleflight import SingleFlight, request_key
+from common.util.http.throttling import RequestThrottle
 from common.util.http.url import insert_path_params, format_query_params, merge_urls
 
 
 class BaseClient:
+    # Shared across all instances such that identical requests issued by different clients are coalesced as well
+    __single_flight: SingleFlight = SingleFlight()
+
     __session: Session
     __base_url: str
     __timeout: float
     __retries: Retry | int
+    __coalesce: bool
+    __throttle: Optional[RequestThrottle]
+    __metrics: HTTPMetrics
 
     def __init__(
         self,
@@ -34,18 +45,26 @@ class BaseClient:
         self.__base_url = base_url
 
         self.__timeout = timeout if not http_config else http_config.timeout
+        self.__throttle = RequestThrottle.for_server(base_url, http_config)
         self.__retries = (
             CustomRetry(
                 total=http_config.retries,
                 backoff_factor=http_config.backoff_factor,
                 status_forcelist=RETRYABLE_STATUS_CODES,
                 allowed_methods=["GET", "POST"],
+                throttle=self.__throttle,
             )
             if http_config
             else 0
         )
 
-        adapter = HTTPAdapter(max_retries=self.__retries)
+        self.__coalesce = http_config.coalesce_requests if http_config else True
+
+        self.__metrics = HTTPMetrics.instance()
+        if http_config and http_config.metrics_report:
+            self.__metrics.register_report(http_config.metrics_prometheus)
+
+        adapter = create_adapter(http_config, self.__retries, cert)
         self.__session.mount("http://", adapter=adapter)
         self.__session.mount("https://", adapter=adapter)
 
@@ -61,6 +80,90 @@ class BaseClient:
     def _get_retries(self) -> Retry | int:
         return self.__retries
 
+    def __throttled(self, fn: Callable[[], Response]) -> Response:
+        if self.__throttle is None:
+            return fn()
+        with self.__throttle:
+            response = fn()
+        self.__throttle.on_response(response.status_code)
+        return response
+
+    def __measured(
+        self,
+        method: str,
+        endpoint: str,
+        bytes_sent: int,
+        fn: Callable[[], Response],
+        stream: bool = False,
+    ) -> Response:
+        start = time.perf_counter()
+        response = None
+        try:
+            response = fn()
+            return response
+        finally:
+            if response is None:
+                status_code, bytes_received = None, 0
+            elif stream:
+                # Reading the body would consume the stream, so the announced length is used instead
+                status_code = response.status_code
+                bytes_received = int(response.headers.get("Content-Length", 0))
+            else:
+                status_code, bytes_received = response.status_code, len(
+                    response.content
+                )
+            self.__metrics.observe_request(
+                method,
+                endpoint,
+                status_code,
+                time.perf_counter() - start,
+                bytes_sent,
+                bytes_received,
+            )
+
+    def __coalesced(
+        self,
+        method: str,
+        request_url: str,
+        params: Optional[Mapping[str, str | list[str]]],
+        headers: Optional[Mapping[str, str]],
+        body: Optional[str],
+        endpoint: str,
+        fn: Callable[[], Response],
+    ) -> Response:
+        """
+        Executes a request unless an equivalent one is already in flight, in which case its response is shared. Requests
+        are equivalent if their method, URL, query parameters and headers match. POST requests are only coalesced if
+        their bodies match as well which is determined by comparing the bodies' SHA-256 hashes
+        """
+        bytes_sent = len(body.encode("utf-8")) if body else 0
+        fn = functools.partial(
+            self.__measured,
+            method,
+            endpoint,
+            bytes_sent,
+            functools.partial(self.__throttled, fn),
+        )
+        if not self.__coalesce:
+            return fn()
+        # Requests with differing credentials must not share responses
+        context = (
+            repr(self.__session.cert),
+            id(self.__session.auth) if self.__session.auth is not None else None,
+        )
+        executed = False
+
+        def leader_fn() -> Response:
+            nonlocal executed
+            executed = True
+            return fn()
+
+        key = request_key(method, request_url, params, headers, body, context=context)
+        response = self.__single_flight.do(key, leader_fn)
+        if not executed:
+            self.__metrics.observe_coalesced(method, endpoint)
+        return response
+
     def __del__(self):
         self.__session.close()
 
@@ -77,6 +180,16 @@ class BaseClient:
         )
         return insert_path_params(url, **(path_params if path_params else {}))
 
+    def __endpoint(
+        self, context_path: Optional[str] = None, full_url: Optional[str] = None
+    ) -> str:
+        # Path parameters are not inserted such that e.g. all reads of a resource type share a single endpoint
+        return endpoint_of(
+            full_url
+            if full_url is not None
+            else merge_urls(self.__base_url, context_path)
+        )
+
     def get(
         self,
         context_path: Optional[str] = None,
@@ -87,21 +200,34 @@ class BaseClient:
         stream: bool = False,
     ) -> Response | ContextManager[Response]:
         request_url = self.__determine_url(context_path, full_url, path_params)
+        endpoint = self.__endpoint(context_path, full_url)
         if stream:
             # Return context manager
-            return self.__session.get(
-                request_url,
-                params=format_query_params(query_params),
-                headers=headers,
-                timeout=self.__timeout,
-                stream=stream,
+            return self.__measured(
+                "GET",
+                endpoint,
+                0,
+                lambda: self.__session.get(
+                    request_url,
+                    params=format_query_params(query_params),
+                    headers=headers,
+                    timeout=self.__timeout,
+                    stream=stream,
+                ),
+                stream=True,
             )
         else:
-            response = self.__session.get(
+            params = format_query_params(query_params)
+            response = self.__coalesced(
+                "GET",
                 request_url,
-                params=format_query_params(query_params),
-                headers=headers,
-                timeout=self.__timeout,
+                params,
+                headers,
+                None,
+                endpoint,
+                lambda: self.__session.get(
+                    request_url, params=params, headers=headers, timeout=self.__timeout
+                ),
             )
             if response.ok:
                 return response
@@ -119,12 +245,21 @@ class BaseClient:
         if not body:
             raise ValueError("Body of a POST request cannot be empty")
         request_url = self.__determine_url(context_path, full_url, path_params)
-        response = self.__session.post(
+        params = format_query_params(query_params)
+        response = self.__coalesced(
+            "POST",
             request_url,
-            data=body.encode("utf-8"),
-            params=format_query_params(query_params),
-            headers=headers,
-            timeout=self.__timeout,
+            params,
+            headers,
+            body,
+            self.__endpoint(context_path, full_url),
+            lambda: self.__session.post(
+                request_url,
+                data=body.encode("utf-8"),
+                params=params,
+                headers=headers,
+                timeout=self.__timeout,
+            ),
         )
         if response.ok:
             return response
@@ -0,0 +1,438 @@
+import atexit
+import bisect
+import json
+import math
+import multiprocessing
+import multiprocessing.util
+import os
+import random
+import sys
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional, Mapping, Any, List
+from urllib.parse import urlsplit
+
+from common.util.log import LOGGING_DIR
+from common.util.log.functions import get_class_logger
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    math.inf,
+)
+# Percentiles included in the JSON report
+REPORTED_PERCENTILES: tuple[int, ...] = (50, 95, 99)
+
+
+def endpoint_of(url: str) -> str:
+    """
+    Derives the endpoint label of a request URL, i.e. its authority and path without query parameters. Path templates
+    (e.g. `/ValueSet/{id}`) should be passed unformatted to keep the number of distinct endpoints bounded
+
+    :param url: Request URL (template)
+    :return: Endpoint label
+    """
+    split = urlsplit(url)
+    return f"{split.netloc}{split.path or '/'}"
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LatencyHistogram:
+    """
+    Records request latencies in fixed buckets (as used by Prometheus histograms) and keeps a bounded uniform sample
+    of the observed values (reservoir sampling) to compute percentiles from
+    """
+
+    __counts: List[int]
+    __sum: float
+    __count: int
+    __samples: List[float]
+    __max_samples: int
+
+    def __init__(self, max_samples: int = 10000):
+        """
+        :param max_samples: Maximum number of observations retained for computing percentiles
+        """
+        self.__counts = [0] * len(LATENCY_BUCKETS)
+        self.__sum = 0
+        self.__count = 0
+        self.__samples = []
+        self.__max_samples = max_samples
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    def observe(self, value: float):
+        self.__counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.__sum += value
+        self.__count += 1
+        if len(self.__samples) < self.__max_samples:
+            self.__samples.append(value)
+        else:
+            i = random.randrange(self.__count)
+            if i < self.__max_samples:
+                self.__samples[i] = value
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Computes a percentile of the observed values using the nearest-rank method
+
+        :param p: Percentile in the range [0, 100]
+        :return: Percentile value or `None` if nothing was observed
+        """
+        if not self.__samples:
+            return None
+        samples = sorted(self.__samples)
+        rank = max(math.ceil(p / 100 * len(samples)), 1)
+        return samples[rank - 1]
+
+    def cumulative_buckets(self) -> List[tuple[float, int]]:
+        buckets = []
+        total = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.__counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.status_codes: dict[int, int] = defaultdict(int)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.coalesced = 0
+        self.latency = LatencyHistogram()
+
+
+class HTTPMetrics:
+    """
+    Thread-safe collector of HTTP client metrics. Tracks per-endpoint request counts, status codes, latencies and
+    transferred bytes alongside retry counts and cache hit ratios. A process-wide instance is shared by all clients
+    and can be obtained via `HTTPMetrics.instance()`
+    """
+
+    __logger = get_class_logger("HTTPMetrics")
+
+    __instance: Optional["HTTPMetrics"] = None
+    __instance_lock = threading.Lock()
+
+    __lock: threading.Lock
+    __endpoints: dict[tuple[str, str], _EndpointStats]
+    __retries: dict[tuple[str, str], dict[str, int]]
+    __caches: dict[str, dict[str, int]]
+    __report_registered: bool
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__endpoints = defaultdict(_EndpointStats)
+        self.__retries = defaultdict(lambda: defaultdict(int))
+        self.__caches = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.__report_registered = False
+
+    @classmethod
+    def instance(cls) -> "HTTPMetrics":
+        with cls.__instance_lock:
+            if cls.__instance is None:
+                cls.__instance = cls()
+            return cls.__instance
+
+    def reset(self):
+        with self.__lock:
+            self.__endpoints.clear()
+            self.__retries.clear()
+            self.__caches.clear()
+
+    def observe_request(
+        self,
+        method: str,
+        endpoint: str,
+        status_code: Optional[int],
+        duration: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+    ):
+        """
+        Records a completed request
+
+        :param method: HTTP method
+        :param endpoint: Endpoint label (see `endpoint_of`)
+        :param status_code: Status code of the final response or `None` if the request failed without one
+        :param duration: Time in seconds spent on the request including retries
+        :param bytes_sent: Size of the request body
+        :param bytes_received: Size of the response body
+        """
+        with self.__lock:
+            stats = self.__endpoints[(method, endpoint)]
+            stats.requests += 1
+            if status_code is None or status_code >= 400:
+                stats.errors += 1
+            stats.status_codes[status_code if status_code is not None else 0] += 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.latency.observe(duration)
+
+    def observe_coalesced(self, method: str, endpoint: str):
+        """
+        Records a request that was answered with the response of an identical in-flight request
+        """
+        with self.__lock:
+            self.__endpoints[(method, endpoint)].coalesced += 1
+
+    def observe_retry(self, method: Optional[str], url: Optional[str], reason: Any):
+        """
+        Records a retry attempt
+
+        :param method: HTTP method of the retried request
+        :param url: URL or path of the retried request
+        :param reason: Status code or error causing the retry
+        """
+        with self.__lock:
+            key = (method or "N/A", urlsplit(url).path if url else "N/A")
+            self.__retries[key][str(reason)] += 1
+
+    def observe_cache(self, cache: str, hit: bool):
+        """
+        Records a cache lookup
+
+        :param cache: Name of the cache
+        :param hit: Whether the lookup was served from the cache
+        """
+        with self.__lock:
+            self.__caches[cache]["hits" if hit else "misses"] += 1
+
+    def report(self) -> Mapping[str, Any]:
+        """
+        Summarizes the collected metrics
+
+        :return: JSON-serializable report
+        """
+        with self.__lock:
+            endpoints = []
+            for (method, endpoint), stats in sorted(self.__endpoints.items()):
+                latency = stats.latency
+                endpoints.append(
+                    {
+                        "method": method,
+                        "endpoint": endpoint,
+                        "requests": stats.requests,
+                        "errors": stats.errors,
+                        "coalesced": stats.coalesced,
+                        "status_codes": {
+                            str(k): v for k, v in sorted(stats.status_codes.items())
+                        },
+                        "bytes_sent": stats.bytes_sent,
+                        "bytes_received": stats.bytes_received,
+                        "latency": {
+                            "count": latency.count,
+                            "total": latency.sum,
+                            "mean": (
+                                latency.sum / latency.count if latency.count else None
+                            ),
+                            **{
+                                f"p{p}": latency.percentile(p)
+                                for p in REPORTED_PERCENTILES
+                            },
+                        },
+                    }
+                )
+            retries = [
+                {"method": method, "path": path, "reasons": dict(reasons)}
+                for (method, path), reasons in sorted(self.__retries.items())
+            ]
+            caches = {
+                name: {
+                    **counts,
+                    "hit_ratio": (
+                        counts["hits"] / (counts["hits"] + counts["misses"])
+                        if counts["hits"] + counts["misses"]
+                        else None
+                    ),
+                }
+                for name, counts in sorted(self.__caches.items())
+            }
+        return {
+            "totals": {
+                "requests": sum(e["requests"] for e in endpoints),
+                "errors": sum(e["errors"] for e in endpoints),
+                "retries": sum(sum(r["reasons"].values()) for r in retries),
+                "bytes_sent": sum(e["bytes_sent"] for e in endpoints),
+                "bytes_received": sum(e["bytes_received"] for e in endpoints),
+                "time_spent": sum(e["latency"]["total"] for e in endpoints),
+            },
+            "endpoints": endpoints,
+            "retries": retries,
+            "caches": caches,
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Renders the collected metrics in the Prometheus text exposition format
+
+        :return: Metrics in Prometheus text format
+        """
+
+        def labels(**kv) -> str:
+            return (
+                "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in kv.items()) + "}"
+            )
+
+        def fmt_bound(bound: float) -> str:
+            return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+        lines = []
+        with self.__lock:
+            endpoints = sorted(self.__endpoints.items())
+            lines += [
+                "# HELP http_client_requests_total Number of HTTP requests issued",
+                "# TYPE http_client_requests_total counter",
+            ]
+            for (method, endpoint), stats in endpoints:
+                for status, count in sorted(stats.status_codes.items()):
+                    lines.append(
+                        f"http_client_requests_total{labels(method=method, endpoint=endpoint, status=status)} {count}"
+                    )
+            lines += [
+                "# HELP http_client_coalesced_requests_total Number of requests served by an identical in-flight request",
+                "# TYPE http_client_coalesced_requests_total counter",
+            ]
+            for (method, endpoint), stats in endpoints:
+                lines.append(
+                    f"http_client_coalesced_requests_total{labels(method=method, endpoint=endpoint)} {stats.coalesced}"
+                )
+            for direction in ("sent", "received"):
+                lines += [
+                    f"# HELP http_client_bytes_{direction}_total Number of body bytes {direction}",
+                    f"# TYPE http_client_bytes_{direction}_total counter",
+                ]
+                for (method, endpoint), stats in endpoints:
+                    lines.append(
+                        f"http_client_bytes_{direction}_total{labels(method=method, endpoint=endpoint)} "
+                        f"{getattr(stats, f'bytes_{direction}')}"
+                    )
+            lines += [
+                "# HELP http_client_request_duration_seconds Duration of HTTP requests including retries",
+                "# TYPE http_client_request_duration_seconds histogram",
+            ]
+            for (method, endpoint), stats in endpoints:
+                for bound, count in stats.latency.cumulative_buckets():
+                    lines.append(
+                        f"http_client_request_duration_seconds_bucket"
+                        f"{labels(method=method, endpoint=endpoint, le=fmt_bound(bound))} {count}"
+                    )
+                lines.append(
+                    f"http_client_request_duration_seconds_sum{labels(method=method, endpoint=endpoint)} "
+                    f"{stats.latency.sum}"
+                )
+                lines.append(
+                    f"http_client_request_duration_seconds_count{labels(method=method, endpoint=endpoint)} "
+                    f"{stats.latency.count}"
+                )
+            lines += [
+                "# HELP http_client_retries_total Number of retried HTTP requests",
+                "# TYPE http_client_retries_total counter",
+            ]
+            for (method, path), reasons in sorted(self.__retries.items()):
+                for reason, count in sorted(reasons.items()):
+                    lines.append(
+                        f"http_client_retries_total{labels(method=method, path=path, reason=reason)} {count}"
+                    )
+            lines += [
+                "# HELP http_client_cache_lookups_total Number of cache lookups",
+                "# TYPE http_client_cache_lookups_total counter",
+            ]
+            for name, counts in sorted(self.__caches.items()):
+                for result, key in (("hit", "hits"), ("miss", "misses")):
+                    lines.append(
+                        f"http_client_cache_lookups_total{labels(cache=name, result=result)} {counts[key]}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path: Path, prometheus: bool = False):
+        """
+        Writes the JSON report to the given path
+
+        :param path: Path of the JSON report
+        :param prometheus: Whether to additionally write the metrics in Prometheus text format to a file with the same
+                           name but the extension `.prom`
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, mode="w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        if prometheus:
+            with open(path.with_suffix(".prom"), mode="w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+
+    def register_report(self, prometheus: bool = False):
+        """
+        Registers an exit handler writing the report of the running script to the logging directory. Subsequent calls
+        have no effect
+
+        :param prometheus: Whether to additionally write the metrics in Prometheus text format
+        """
+        with self.__lock:
+            if self.__report_registered:
+                return
+            self.__report_registered = True
+        script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        in_worker = multiprocessing.parent_process() is not None
+        if in_worker:
+            # Each worker process reports the requests it sent itself
+            path = LOGGING_DIR / f"{script_name}.{os.getpid()}.http-metrics.json"
+        else:
+            path = LOGGING_DIR / f"{script_name}.http-metrics.json"
+
+        def write():
+            if not self.__endpoints and not self.__caches:
+                return
+            try:
+                self.write_report(path, prometheus)
+            except OSError as err:
+                self.__logger.warning(f"Failed to write HTTP metrics report: {err}")
+
+        if in_worker:
+            # Worker processes exit without running `atexit` handlers but do run the finalizers of `multiprocessing`
+            multiprocessing.util.Finalize(self, write, exitpriority=10)
+        else:
+            atexit.register(write)
+
+    def _reset_after_fork(self):
+        # Forked children start with an empty copy such that requests of the parent are not reported twice. Locks are
+        # replaced since they might have been held by another thread of the parent at the time of the fork
+        self.__lock = threading.Lock()
+        self.__endpoints = defaultdict(_EndpointStats)
+        self.__retries = defaultdict(lambda: defaultdict(int))
+        self.__caches = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.__report_registered = False
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        cls.__instance_lock = threading.Lock()
+        if cls.__instance is not None:
+            cls.__instance._reset_after_fork()
+
+
+os.register_at_fork(after_in_child=HTTPMetrics._after_fork_in_child)
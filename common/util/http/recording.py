@@ -0,0 +1,390 @@
+import atexit
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Literal, Mapping, Any, IO
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+
+from common.config.project import RecordingConfig
+from common.util.log.functions import get_class_logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+# Request headers affecting the response which thus have to be part of the exchange key
+KEY_HEADERS: tuple[str, ...] = (
+    "Accept",
+    "Content-Type",
+    "If-None-Match",
+    "If-Modified-Since",
+)
+# Responses with these status codes reflect transient server state and are not recorded
+TRANSIENT_STATUS_CODES: frozenset[int] = frozenset([429, 500, 502, 503, 504])
+
+RecordingMode = Literal["record", "replay"]
+
+
+def _stable_body(path: str, body: Optional[bytes]) -> Optional[bytes]:
+    """
+    Removes values from a request body that differ between otherwise identical requests issued by separate runs and
+    would thus prevent recorded exchanges from being replayed:
+
+    - `timestamp` of `Bundle` resources (set to the current time when batch bundles are built)
+    - `name` parameter of `$closure` invocations (closure tables are named with random UUIDs)
+
+    :param path: Path of the request URL
+    :param body: Request body
+    :return: Body without the volatile values or the unmodified body if there are none
+    """
+    if not body or not body.lstrip().startswith(b"{"):
+        return body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(data, dict):
+        return body
+    match data.get("resourceType"):
+        case "Bundle" if "timestamp" in data:
+            del data["timestamp"]
+        case "Parameters" if path.endswith("$closure"):
+            data["parameter"] = [
+                p for p in data.get("parameter", []) if p.get("name") != "name"
+            ]
+        case _:
+            return body
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+class ExchangeArchive:
+    """
+    Archive of HTTP request/response pairs stored as NDJSON, one exchange per line, keyed by a hash of the request.
+    The archive is compressed with zstd if the optional `zstandard` dependency is installed and with gzip otherwise.
+    In record mode exchanges are collected in memory and written atomically when the archive is flushed, which happens
+    automatically on exit. Existing entries are retained such that an archive can be extended by subsequent runs
+    """
+
+    __logger = get_class_logger("ExchangeArchive")
+
+    __instances: dict[Path, "ExchangeArchive"] = {}
+    __instances_lock = threading.Lock()
+
+    __path: Path
+    __mode: RecordingMode
+    __entries: dict[str, Mapping[str, Any]]
+    __dirty: bool
+    __lock: threading.Lock
+
+    def __init__(self, path: Path, mode: RecordingMode = "replay"):
+        """
+        :param path: Path of the archive file. If the zstd compression is not available, a `.zst` suffix is replaced
+                     with `.gz`
+        :param mode: Whether exchanges are recorded to (`record`) or served from (`replay`) the archive
+        """
+        self.__path = self.__resolve_path(Path(path))
+        self.__mode = mode
+        self.__entries = {}
+        self.__dirty = False
+        self.__lock = threading.Lock()
+        if self.__path.exists():
+            self.__load()
+        elif mode == "replay":
+            raise FileNotFoundError(f"Recording archive '{self.__path}' does not exist")
+
+    @classmethod
+    def shared(cls, path: Path, mode: RecordingMode = "replay") -> "ExchangeArchive":
+        """
+        Returns the archive instance operating on the given file, creating it if necessary. Archives in record mode
+        are flushed on exit
+
+        :param path: Path of the archive file
+        :param mode: Whether exchanges are recorded to or served from the archive
+        :return: `ExchangeArchive` instance
+        """
+        path = Path(path).resolve()
+        with cls.__instances_lock:
+            if path not in cls.__instances:
+                archive = cls(path, mode)
+                if mode == "record":
+                    atexit.register(archive.flush)
+                cls.__instances[path] = archive
+            return cls.__instances[path]
+
+    @classmethod
+    def from_config(
+        cls, config: RecordingConfig, base_dir: Path
+    ) -> Optional["ExchangeArchive"]:
+        """
+        Returns the shared archive described by the given configuration
+
+        :param config: Recording configuration
+        :param base_dir: Directory relative to which the configured archive path is resolved
+        :return: `ExchangeArchive` instance or `None` if recording is disabled
+        """
+        if config.mode == "off":
+            return None
+        return cls.shared(base_dir / config.archive, config.mode)
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def mode(self) -> RecordingMode:
+        return self.__mode
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @staticmethod
+    def __resolve_path(path: Path) -> Path:
+        if path.suffix == ".zst" and zstandard is None:
+            return path.with_suffix(".gz")
+        return path
+
+    def __open(self, mode: Literal["rb", "wb"], path: Path) -> IO[bytes]:
+        if mode == "rb":
+            with open(path, mode="rb") as f:
+                magic = f.read(4)
+            if magic.startswith(_ZSTD_MAGIC):
+                if zstandard is None:
+                    raise ImportError(
+                        f"Reading zstd-compressed archive '{path}' requires the optional dependency 'zstandard'"
+                    )
+                return zstandard.open(path, mode="rb")
+            if magic.startswith(_GZIP_MAGIC):
+                return gzip.open(path, mode="rb")
+            return open(path, mode="rb")
+        if zstandard is not None and self.__path.suffix == ".zst":
+            return zstandard.open(path, mode="wb")
+        if self.__path.suffix == ".gz":
+            return gzip.open(path, mode="wb")
+        return open(path, mode="wb")
+
+    def __load(self):
+        with self.__open("rb", self.__path) as f:
+            for line in io.TextIOWrapper(f, encoding="utf-8"):
+                if line.strip():
+                    entry = json.loads(line)
+                    self.__entries[entry["key"]] = entry
+        self.__logger.debug(
+            f"Loaded {len(self.__entries)} exchanges from archive '{self.__path}'"
+        )
+
+    @staticmethod
+    def key(
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        body: Optional[bytes] = None,
+    ) -> str:
+        """
+        Computes the key identifying a request in the archive
+
+        :param method: HTTP method
+        :param url: Request URL. Query parameters are normalized by sorting them
+        :param headers: Request headers. Only headers listed in `KEY_HEADERS` are considered
+        :param body: Request body. Values differing between runs (e.g. timestamps) are disregarded
+        :return: Hex digest identifying the request
+        """
+        split = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(split.query, keep_blank_values=True)))
+        headers = CaseInsensitiveDict(headers or {})
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    method.upper(),
+                    split.path,
+                    query,
+                    [headers.get(h) for h in KEY_HEADERS],
+                    hashlib.sha256(_stable_body(split.path, body) or b"").hexdigest(),
+                ]
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[Mapping[str, Any]]:
+        return self.__entries.get(key)
+
+    def add(
+        self,
+        key: str,
+        method: str,
+        url: str,
+        status_code: int,
+        headers: Mapping[str, str],
+        content: bytes,
+    ):
+        """
+        Adds an exchange to the archive
+
+        :param key: Key of the request
+        :param method: HTTP method of the request
+        :param url: URL of the request
+        :param status_code: Status code of the response
+        :param headers: Headers of the response
+        :param content: (Decoded) body of the response
+        """
+        try:
+            body, encoding = content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        # The body is stored decoded so transfer-specific headers no longer apply
+        headers = {
+            k: v
+            for k, v in headers.items()
+            if k.lower()
+            not in {"content-encoding", "content-length", "transfer-encoding"}
+        }
+        with self.__lock:
+            self.__entries[key] = {
+                "key": key,
+                "method": method,
+                "url": url,
+                "status": status_code,
+                "headers": headers,
+                "encoding": encoding,
+                "body": body,
+            }
+            self.__dirty = True
+
+    def flush(self):
+        """
+        Writes all exchanges to the archive file if any were added since the last flush
+        """
+        with self.__lock:
+            if not self.__dirty:
+                return
+            self.__path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.__path.with_name(f".{self.__path.name}.{os.getpid()}")
+            with self.__open("wb", tmp_path) as f:
+                for entry in self.__entries.values():
+                    f.write(json.dumps(entry).encode("utf-8"))
+                    f.write(b"\n")
+            os.replace(tmp_path, self.__path)
+            self.__dirty = False
+        self.__logger.debug(
+            f"Wrote {len(self.__entries)} exchanges to archive '{self.__path}'"
+        )
+
+
+class RecordReplayAdapter(BaseAdapter):
+    """
+    Transport adapter recording exchanges to or replaying them from an `ExchangeArchive`. In record mode requests are
+    forwarded to the wrapped adapter and the responses are added to the archive. In replay mode responses are served
+    from the archive exclusively and requests without a recorded response fail with a `ConnectionError`. Request URLs
+    are keyed relative to the given base URL such that archives can be replayed against any server address
+    """
+
+    __archive: ExchangeArchive
+    __base_url: str
+    __delegate: Optional[BaseAdapter]
+
+    def __init__(
+        self,
+        archive: ExchangeArchive,
+        base_url: str,
+        delegate: Optional[BaseAdapter] = None,
+    ):
+        """
+        :param archive: Archive to record to or replay from
+        :param base_url: Base URL of the server
+        :param delegate: Adapter sending the actual requests in record mode
+        """
+        if archive.mode == "record" and delegate is None:
+            raise ValueError("Recording requires an adapter to send requests with")
+        super().__init__()
+        self.__archive = archive
+        self.__base_url = base_url.rstrip("/")
+        self.__delegate = delegate
+
+    def __relative_url(self, url: str) -> str:
+        if url.startswith(self.__base_url):
+            return url[len(self.__base_url) :] or "/"
+        return url
+
+    @staticmethod
+    def __body_bytes(request: PreparedRequest) -> Optional[bytes]:
+        if isinstance(request.body, str):
+            return request.body.encode("utf-8")
+        return request.body
+
+    def __to_response(
+        self, request: PreparedRequest, entry: Mapping[str, Any]
+    ) -> Response:
+        content = (
+            base64.b64decode(entry["body"])
+            if entry["encoding"] == "base64"
+            else entry["body"].encode("utf-8")
+        )
+        response = Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = content
+        response._content_consumed = True
+        # Allows streaming consumers reading from the raw response to be served as well
+        response.raw = io.BytesIO(content)
+        response.encoding = "utf-8" if entry["encoding"] == "utf-8" else None
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def send(
+        self,
+        request: PreparedRequest,
+        stream=False,
+        timeout=None,
+        verify=True,
+        cert=None,
+        proxies=None,
+    ) -> Response:
+        body = self.__body_bytes(request)
+        url = self.__relative_url(request.url)
+        key = ExchangeArchive.key(request.method, url, request.headers, body)
+        if self.__archive.mode == "replay":
+            entry = self.__archive.get(key)
+            if entry is None:
+                raise ConnectionError(
+                    f"No recorded response for {request.method} {url} in archive '{self.__archive.path}'",
+                    request=request,
+                )
+            return self.__to_response(request, entry)
+
+        response = self.__delegate.send(
+            request,
+            stream=stream,
+            timeout=timeout,
+            verify=verify,
+            cert=cert,
+            proxies=proxies,
+        )
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            return response
+        entry_headers = dict(response.headers)
+        # Consumes the response body such that it is available for recording
+        content = response.content
+        self.__archive.add(
+            key, request.method, url, response.status_code, entry_headers, content
+        )
+        if stream:
+            response.raw = io.BytesIO(content)
+        return response
+
+    def close(self):
+        if self.__delegate is not None:
+            self.__delegate.close()
@@ -1,11 +1,18 @@
 import logging
-from typing import Self
+from typing import Self, Optional, TYPE_CHECKING
 
 from urllib3 import Retry, HTTPResponse
 
+from common.util.http.metrics import HTTPMetrics
+
+if TYPE_CHECKING:
+    from common.util.http.throttling import RequestThrottle
+
 
 class CustomRetry(Retry):
-    def __init__(self, *args, **kwargs):
+    throttle: Optional["RequestThrottle"]
+
+    def __init__(self, *args, throttle: Optional["RequestThrottle"] = None, **kwargs):
         """
         Retry wrapper with custom logging
         :param total: nr of total retries. None for infinite
@@ -13,8 +20,16 @@ class CustomRetry(Retry):
                 {backoff factor} * (2 ** ({number of total retries} - 1))
         :param status_forcelist: list of status codes to retry on
         :param allowed_methods: list of allowed methods. ["GET", "POST"]
+        :param throttle: Throttle to inform about overload responses and to acquire rate limit tokens from before
+                         retrying
         """
         super().__init__(*args, **kwargs)
+        self.throttle = throttle
+
+    def new(self, **kw) -> Self:
+        new_retry = super().new(**kw)
+        new_retry.throttle = self.throttle
+        return new_retry
 
     def increment(self, *args, **kwargs) -> Self:
         response: HTTPResponse = kwargs.get("response")
@@ -26,8 +41,32 @@ class CustomRetry(Retry):
             f"Retrying due to {status_code} "
             f"(attempts remaining: {self.total if self.total is not None else '∞'}){delay_text}"
         )
+        error = kwargs.get("error")
+        # urllib3 passes the method and URL positionally
+        method = kwargs.get("method", args[0] if len(args) > 0 else None)
+        url = kwargs.get("url", args[1] if len(args) > 1 else None)
+        HTTPMetrics.instance().observe_retry(
+            method,
+            url,
+            (
+                status_code
+                if response is not None
+                else type(error).__name__ if error is not None else "N/A"
+            ),
+        )
         new_entry = super().increment(*args, **kwargs)
 
+        if self.throttle is not None:
+            retry_after = (
+                self.get_retry_after(response) if response is not None else None
+            )
+            if response is not None:
+                self.throttle.on_response(response.status, retry_after)
+            # Retries are subject to rate limiting as well unless the delay requested by the server is already
+            # respected when sleeping before the next attempt
+            if retry_after is None:
+                self.throttle.acquire_token()
+
         if response is not None:
             new_entry.last_response = response
         return new_entry
@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from typing import Callable, Hashable, TypeVar, Optional, Mapping, Any
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent invocations sharing the same key into a single execution. The first caller (leader) executes
+    the function while all callers arriving before it finished wait for and receive the leader's result (or exception).
+    Once the execution finished, the next invocation with the same key triggers a new execution
+    """
+
+    __lock: threading.Lock
+    __calls: dict[Hashable, _Call]
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calls = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Executes the function unless an execution with the same key is already in flight, in which case its outcome
+        is awaited and shared
+
+        :param key: Key identifying equivalent invocations
+        :param fn: Function to execute
+        :return: Result of the (shared) execution
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.__calls[key] = call
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.done.set()
+        return call.result
+
+
+def request_key(
+    method: str,
+    url: str,
+    query_params: Optional[Mapping[str, Any]] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    body: Optional[str] = None,
+    context: tuple[Hashable, ...] = (),
+) -> Hashable:
+    """
+    Computes a key identifying equivalent HTTP requests
+
+    :param method: HTTP method
+    :param url: Request URL
+    :param query_params: Query parameters
+    :param headers: Request headers
+    :param body: Request body. Only its SHA-256 hash is part of the key
+    :param context: Additional values distinguishing otherwise equal requests (e.g. credentials)
+    :return: Hashable key
+    """
+
+    def freeze(v: Any) -> Hashable:
+        return tuple(v) if isinstance(v, list) else v
+
+    params = tuple(
+        sorted(
+            ((k, freeze(v)) for k, v in (query_params or {}).items() if v is not None),
+            key=lambda kv: kv[0],
+        )
+    )
+    header_items = tuple(sorted((k.lower(), v) for k, v in (headers or {}).items()))
+    body_hash = (
+        hashlib.sha256(body.encode("utf-8")).hexdigest() if body is not None else None
+    )
+    return method, url, params, header_items, body_hash, *context
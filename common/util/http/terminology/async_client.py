@@ -0,0 +1,181 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Mapping, Optional, List, Literal, Any, Iterable
+
+from fhir.resources.R4B.bundle import Bundle, BundleEntry, BundleEntryRequest
+from fhir.resources.R4B.conceptmap import ConceptMap
+from fhir.resources.R4B.parameters import Parameters
+from fhir.resources.R4B.valueset import ValueSet
+
+from common.config.project import HTTPConfig
+from common.exceptions import UnsupportedError
+from common.util.fhir.bundle import BundleType, build_bundle
+from common.util.http.async_client import AsyncBaseClient
+from common.util.http.terminology.cache import ValueSetExpansionCache
+from common.util.project import Project
+
+
+class AsyncFhirTerminologyClient(AsyncBaseClient):
+    """
+    Asynchronous variant of `FhirTerminologyClient` covering value set search and expansion, code system lookups and
+    `$closure`. Operations can be awaited concurrently (e.g. via `asyncio.gather`) while the number of requests in
+    flight stays bounded by the client's semaphore. Expansions share the on-disk cache with `FhirTerminologyClient`.
+
+    Unlike `FhirTerminologyClient` it does not yet support paged expansions, recording and replaying of exchanges,
+    request throttling or coalescing of identical requests. None of the generators use it so far
+    """
+
+    __content_type_header: tuple[str, str] = ("Content-Type", "application/fhir+json")
+    __accept_header: tuple[str, str] = ("Accept", "application/fhir+json")
+    __headers = dict([__content_type_header, __accept_header])
+
+    __cache: Optional[ValueSetExpansionCache]
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: Optional[Any] = None,
+        cert: Optional[tuple[str, str]] = None,
+        timeout: float = 60,
+        http_config: HTTPConfig = None,
+        cache: Optional[ValueSetExpansionCache] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        super().__init__(
+            base_url=base_url,
+            auth=auth,
+            cert=cert,
+            timeout=timeout,
+            http_config=http_config,
+            max_concurrency=max_concurrency,
+        )
+        self.__cache = cache
+
+    @staticmethod
+    def from_project(
+        project: Project,
+        auth: Optional[Any] = None,
+        timeout: float = 60,
+        max_concurrency: Optional[int] = None,
+    ):
+        if "ONTOLOGY_SERVER_ADDRESS" in project.env:
+            base_url = project.env["ONTOLOGY_SERVER_ADDRESS"]
+        else:
+            raise ValueError(
+                "Server base URL has to be provided either explicitly through the `base_url` parameter"
+                "or implicitly via environment variable `ONTOLOGY_SERVER_ADDRESS`"
+            )
+        if "SERVER_CERTIFICATE" in project.env and "PRIVATE_KEY" in project.env:
+            cert = (
+                Path(project.env["SERVER_CERTIFICATE"]),
+                Path(project.env["PRIVATE_KEY"]),
+            )
+        else:
+            cert = None
+        if project.config.terminology.recording.mode != "off":
+            raise UnsupportedError(
+                "Recording and replaying terminology server exchanges is not supported by the asynchronous client"
+            )
+        cache = ValueSetExpansionCache.from_config(
+            project.config.terminology.cache, project.path
+        )
+        return AsyncFhirTerminologyClient(
+            base_url, auth, cert, timeout, project.config.http, cache, max_concurrency
+        )
+
+    async def search_value_set(self, url: str) -> list[ValueSet]:
+        response = await self.get(
+            "/ValueSet", headers=dict([self.__accept_header]), query_params={"url": url}
+        )
+        bundle = response.json()
+        return [
+            ValueSet.model_validate(entry["resource"])
+            for entry in bundle.get("entry", [])
+            if "resource" in entry
+        ]
+
+    async def expand_value_set(
+        self, url: str, version: Optional[str] = None
+    ) -> Optional[Mapping[str, any]]:
+        headers = dict([self.__accept_header])
+        query_params = {"url": url, "version": version}
+        if self.__cache is None:
+            response = await self.get(
+                "/ValueSet/$expand", headers=headers, query_params=query_params
+            )
+            return response.json()
+
+        lookup = self.__cache.begin_expansion(
+            self._get_base_url(), url, version, headers
+        )
+        if lookup.fresh:
+            return json.loads(lookup.body)
+        response = await self.get(
+            "/ValueSet/$expand", headers=headers, query_params=query_params
+        )
+        return json.loads(
+            self.__cache.finish_expansion(
+                lookup, response.status_code, response.headers, lambda: response.content
+            )
+        )
+
+    async def expand_value_sets(
+        self, urls: Iterable[str | tuple[str, Optional[str]]]
+    ) -> List[Optional[Mapping[str, any]]]:
+        """
+        Expands multiple value sets concurrently
+
+        :param urls: Canonical URLs of the value sets optionally paired with a version
+        :return: Expansions in the order of the provided URLs
+        """
+        return await asyncio.gather(
+            *(self.expand_value_set(*((u,) if isinstance(u, str) else u)) for u in urls)
+        )
+
+    async def code_system_lookup(
+        self,
+        system: str,
+        code: str,
+        version: Optional[str] = None,
+        properties: Optional[List[str]] = None,
+    ) -> Parameters:
+        response = await self.get(
+            "/CodeSystem/$lookup",
+            headers=self.__headers,
+            query_params={
+                "system": system,
+                "code": code,
+                "version": version,
+                "property": properties,
+            },
+        )
+        return Parameters.model_validate_json(response.text)
+
+    async def closure(self, parameters: Parameters) -> ConceptMap:
+        response = await self.post(
+            "/$closure",
+            headers=dict([self.__content_type_header]),
+            body=parameters.model_dump_json(),
+        )
+        return ConceptMap(**response.json())
+
+    async def bulk_lookup(
+        self,
+        parameters: List[Parameters],
+        mode: Literal[
+            BundleType.BATCH, BundleType.TRANSACTION
+        ] = BundleType.TRANSACTION,
+    ) -> Bundle:
+        entries = [
+            BundleEntry(
+                resource=p,
+                request=BundleEntryRequest(method="POST", url="CodeSystem/$lookup"),
+            )
+            for p in parameters
+        ]
+        bundle = build_bundle(mode, entries)
+        response = await self.post(
+            headers=dict([self.__content_type_header]), body=bundle.model_dump_json()
+        )
+        return Bundle.model_validate(response.json())
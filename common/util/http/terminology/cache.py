@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Mapping, Any, Tuple, NamedTuple, Callable, MutableMapping
+
+from common.config.project import TerminologyCacheConfig
+from common.util.http.metrics import HTTPMetrics
+from common.util.log.functions import get_class_logger
+
+
+class ExpansionLookup(NamedTuple):
+    """
+    Outcome of looking up a value set expansion before requesting it from the server
+    """
+
+    key: str
+    url: str
+    version: Optional[str]
+    # Cached response body or `None` if there is no entry
+    body: Optional[bytes]
+    meta: Mapping[str, Any]
+    # Whether the cached body can be served without contacting the server
+    fresh: bool
+
+
+class ValueSetExpansionCache:
+    """
+    Persistent, content-addressed on-disk cache for `ValueSet/$expand` responses. Entries are keyed by the terminology
+    server base URL and the canonical URL and version of the expanded value set. Each entry consists of the response
+    body and a small metadata file holding the validators (`ETag`, `Last-Modified`) returned by the server alongside the
+    time of the last (re)validation. Entries younger than the configured TTL are served without contacting the server,
+    older ones are revalidated using a conditional request. If the total size of all stored bodies exceeds the
+    configured maximum, the least recently used entries are evicted
+    """
+
+    __logger = get_class_logger("ValueSetExpansionCache")
+
+    __instances: dict[Path, "ValueSetExpansionCache"] = {}
+    __instances_lock = threading.Lock()
+
+    __directory: Path
+    __ttl: float
+    __max_size: int
+    __lock: threading.RLock
+    __sizes: dict[str, int]
+
+    def __init__(self, directory: Path, ttl: float = 86400, max_size: int = 2**30):
+        """
+        :param directory: Directory to store cache entries in. Will be created if it does not exist
+        :param ttl: Time in seconds after which an entry has to be revalidated with the server
+        :param max_size: Maximum number of bytes the stored response bodies may occupy
+        """
+        self.__directory = Path(directory)
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        self.__ttl = ttl
+        self.__max_size = max_size
+        self.__lock = threading.RLock()
+        self.__sizes = {}
+        for body_path in self.__directory.glob("*/*.json"):
+            if not body_path.name.endswith(".meta.json"):
+                self.__sizes[body_path.stem] = body_path.stat().st_size
+
+    @classmethod
+    def shared(
+        cls, directory: Path, ttl: float = 86400, max_size: int = 2**30
+    ) -> "ValueSetExpansionCache":
+        """
+        Returns the cache instance operating on the given directory, creating it if necessary. This ensures that all
+        clients within a process share the same in-memory bookkeeping of a cache directory
+
+        :param directory: Directory to store cache entries in
+        :param ttl: Time in seconds after which an entry has to be revalidated with the server
+        :param max_size: Maximum number of bytes the stored response bodies may occupy
+        :return: `ValueSetExpansionCache` instance
+        """
+        directory = Path(directory).resolve()
+        with cls.__instances_lock:
+            if directory not in cls.__instances:
+                cls.__instances[directory] = cls(directory, ttl, max_size)
+            return cls.__instances[directory]
+
+    @classmethod
+    def from_config(
+        cls, config: TerminologyCacheConfig, base_dir: Path
+    ) -> Optional["ValueSetExpansionCache"]:
+        """
+        Returns the shared cache instance described by the given configuration
+
+        :param config: Cache configuration
+        :param base_dir: Directory relative to which the configured cache directory is resolved
+        :return: `ValueSetExpansionCache` instance or `None` if caching is disabled
+        """
+        if not config.enabled:
+            return None
+        return cls.shared(base_dir / config.directory, config.ttl, config.max_size)
+
+    @property
+    def directory(self) -> Path:
+        return self.__directory
+
+    @property
+    def size(self) -> int:
+        return sum(self.__sizes.values())
+
+    @staticmethod
+    def key(server: str, url: str, version: Optional[str] = None) -> str:
+        """
+        Computes the content address of a cache entry
+
+        :param server: Base URL of the terminology server
+        :param url: Canonical URL of the value set
+        :param version: Version of the value set
+        :return: Hex digest identifying the entry
+        """
+        return hashlib.sha256(
+            json.dumps([server.rstrip("/"), url, version]).encode("utf-8")
+        ).hexdigest()
+
+    def __paths(self, key: str) -> Tuple[Path, Path]:
+        entry_dir = self.__directory / key[:2]
+        return entry_dir / f"{key}.json", entry_dir / f"{key}.meta.json"
+
+    @staticmethod
+    def __write_atomically(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+        with open(tmp_path, mode="wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, key: str) -> Tuple[Optional[bytes], Mapping[str, Any]]:
+        """
+        Looks up an entry in the cache
+
+        :param key: Key of the entry
+        :return: Tuple of the cached response body (or `None` if no entry exists) and its metadata
+        """
+        body_path, meta_path = self.__paths(key)
+        with self.__lock:
+            try:
+                with open(meta_path, mode="r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                body = body_path.read_bytes()
+            except (OSError, ValueError):
+                return None, {}
+            # Update access time used for LRU eviction
+            os.utime(body_path)
+            return body, meta
+
+    def is_fresh(self, meta: Mapping[str, Any]) -> bool:
+        """
+        Checks whether an entry can be served without revalidating it with the server
+
+        :param meta: Metadata of the entry
+        :return: `True` if the entry was validated less than TTL seconds ago
+        """
+        return time.time() - meta.get("validated", 0) < self.__ttl
+
+    def store(
+        self,
+        key: str,
+        body: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        **info,
+    ):
+        """
+        Stores a response body in the cache and evicts entries if the maximum size is exceeded
+
+        :param key: Key of the entry
+        :param body: Response body
+        :param etag: Value of the `ETag` response header
+        :param last_modified: Value of the `Last-Modified` response header
+        :param info: Additional information stored in the entry metadata
+        """
+        body_path, meta_path = self.__paths(key)
+        meta = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "validated": time.time(),
+            **info,
+        }
+        with self.__lock:
+            self.__write_atomically(body_path, body)
+            self.__write_atomically(meta_path, json.dumps(meta).encode("utf-8"))
+            self.__sizes[key] = len(body)
+            self.__evict()
+
+    def touch(self, key: str, meta: Mapping[str, Any]):
+        """
+        Marks an entry as successfully revalidated
+
+        :param key: Key of the entry
+        :param meta: Current metadata of the entry
+        """
+        _, meta_path = self.__paths(key)
+        with self.__lock:
+            self.__write_atomically(
+                meta_path,
+                json.dumps({**meta, "validated": time.time()}).encode("utf-8"),
+            )
+
+    def begin_expansion(
+        self,
+        server: str,
+        url: str,
+        version: Optional[str],
+        headers: MutableMapping[str, str],
+    ) -> ExpansionLookup:
+        """
+        Looks up the expansion of a value set before it is requested. Stale entries have to be revalidated, hence the
+        validators of the entry are added to the headers of the (conditional) request
+
+        :param server: Base URL of the terminology server
+        :param url: Canonical URL of the value set
+        :param version: Version of the value set
+        :param headers: Headers of the expansion request which are updated in place
+        :return: `ExpansionLookup` instance to pass to `finish_expansion` unless the cached body is fresh
+        """
+        key = self.key(server, url, version)
+        body, meta = self.lookup(key)
+        fresh = body is not None and self.is_fresh(meta)
+        if fresh:
+            HTTPMetrics.instance().observe_cache("value_set_expansion", hit=True)
+        elif body is not None:
+            if etag := meta.get("etag"):
+                headers["If-None-Match"] = etag
+            if last_modified := meta.get("last_modified"):
+                headers["If-Modified-Since"] = last_modified
+        return ExpansionLookup(key, url, version, body, meta, fresh)
+
+    def finish_expansion(
+        self,
+        lookup: ExpansionLookup,
+        status_code: int,
+        headers: Mapping[str, str],
+        content: Callable[[], bytes],
+    ) -> bytes:
+        """
+        Updates the cache with the response to an expansion request
+
+        :param lookup: Result of `begin_expansion` for the request
+        :param status_code: Status code of the response
+        :param headers: Headers of the response
+        :param content: Function returning the expansion received. Only invoked if the cached body was not revalidated
+        :return: Body of the expansion
+        """
+        metrics = HTTPMetrics.instance()
+        if status_code == 304 and lookup.body is not None:
+            metrics.observe_cache("value_set_expansion", hit=True)
+            self.touch(lookup.key, lookup.meta)
+            return lookup.body
+        metrics.observe_cache("value_set_expansion", hit=False)
+        body = content()
+        self.store(
+            lookup.key,
+            body,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            url=lookup.url,
+            version=lookup.version,
+        )
+        return body
+
+    def remove(self, key: str):
+        """
+        Removes an entry from the cache
+
+        :param key: Key of the entry
+        """
+        with self.__lock:
+            for path in self.__paths(key):
+                path.unlink(missing_ok=True)
+            self.__sizes.pop(key, None)
+
+    def __evict(self):
+        if self.size <= self.__max_size:
+            return
+
+        def last_access(k: str) -> float:
+            try:
+                return self.__paths(k)[0].stat().st_mtime
+            except OSError:
+                return 0
+
+        for key in sorted(self.__sizes.keys(), key=last_access):
+            if self.size <= self.__max_size:
+                break
+            self.__logger.debug(f"Evicting value set expansion cache entry '{key}'")
+            self.remove(key)
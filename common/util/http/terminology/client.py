@@ -1,26 +1,47 @@
-from datetime import datetime, timezone
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Mapping, Optional, List, Literal
+from typing import Mapping, Optional, List, Literal, Iterator
 
 from fhir.resources.R4B.bundle import Bundle, BundleEntry, BundleEntryRequest
 from fhir.resources.R4B.codesystem import CodeSystem
 from fhir.resources.R4B.conceptmap import ConceptMap
 from fhir.resources.R4B.parameters import Parameters
 from fhir.resources.R4B.valueset import ValueSet
+from requests import Response
 from requests.auth import AuthBase
 
 from common.config.project import HTTPConfig
-from common.util.fhir.bundle import BundleType
+from common.util.fhir.bundle import BundleType, build_bundle
 from common.util.http.client import BaseClient
-from common.util.http.exceptions import ClientError
+from common.util.http.exceptions import ClientError, raise_appropriate_exception
+from common.util.http.recording import ExchangeArchive, RecordReplayAdapter
+from common.util.http.terminology.cache import ValueSetExpansionCache
+from common.util.http.terminology.expansion import (
+    ExpansionConcept,
+    iter_expansion_concepts,
+    MissingExpansionError,
+    merge_expansion_pages,
+)
+from common.util.log.functions import get_class_logger
 from common.util.project import Project
 
+# Placeholder server address used when replaying recorded exchanges without a configured server
+REPLAY_BASE_URL = "http://replay.invalid/fhir"
+
 
 class FhirTerminologyClient(BaseClient):
+    __logger = get_class_logger("FhirTerminologyClient")
+
     __content_type_header: tuple[str, str] = ("Content-Type", "application/fhir+json")
     __accept_header: tuple[str, str] = ("Accept", "application/fhir+json")
     __headers = dict([__content_type_header, __accept_header])
 
+    __cache: Optional[ValueSetExpansionCache]
+    __page_size: Optional[int]
+    __page_workers: int
+
     def __init__(
         self,
         base_url: str,
@@ -28,7 +49,24 @@ class FhirTerminologyClient(BaseClient):
         cert: Optional[tuple[str, str]] = None,
         timeout: float = 60,
         http_config: HTTPConfig = None,
+        cache: Optional[ValueSetExpansionCache] = None,
+        page_size: Optional[int] = None,
+        page_workers: int = 4,
+        archive: Optional[ExchangeArchive] = None,
     ):
+        """
+        :param base_url: Base URL of the terminology server
+        :param auth: Authentication to use
+        :param cert: Client certificate and private key files to authenticate with
+        :param timeout: Timeout in seconds. Overridden by `http_config` if provided
+        :param http_config: HTTP configuration
+        :param cache: Cache to store value set expansions in
+        :param page_size: Number of concepts to request per page when expanding value sets. If `None` expansions are
+                          requested in a single request
+        :param page_workers: Maximum number of pages of an expansion fetched concurrently
+        :param archive: Archive to record all exchanges with the server to or to replay them from without network
+                        access, depending on the mode of the archive
+        """
         super().__init__(
             base_url=base_url,
             auth=auth,
@@ -36,13 +74,33 @@ class FhirTerminologyClient(BaseClient):
             timeout=timeout,
             http_config=http_config,
         )
+        self.__cache = cache
+        self.__page_size = page_size
+        self.__page_workers = page_workers
+        if archive is not None:
+            session = self._get_session()
+            for prefix in ("http://", "https://"):
+                session.mount(
+                    prefix,
+                    RecordReplayAdapter(
+                        archive, base_url, delegate=session.adapters[prefix]
+                    ),
+                )
+
+    def _get_expansion_cache(self) -> Optional[ValueSetExpansionCache]:
+        return self.__cache
 
     @staticmethod
     def from_project(
         project: Project, auth: Optional[type[AuthBase]] = None, timeout: float = 60
     ):
+        archive = ExchangeArchive.from_config(
+            project.config.terminology.recording, project.path
+        )
         if "ONTOLOGY_SERVER_ADDRESS" in project.env:
             base_url = project.env["ONTOLOGY_SERVER_ADDRESS"]
+        elif archive is not None and archive.mode == "replay":
+            base_url = REPLAY_BASE_URL
         else:
             raise ValueError(
                 "Server base URL has to be provided either explicitly through the `base_url` parameter"
@@ -55,17 +113,20 @@ class FhirTerminologyClient(BaseClient):
             )
         else:
             cert = None
-        return FhirTerminologyClient(base_url, auth, cert, timeout, project.config.http)
-
-    @classmethod
-    def __build_bundle(
-        cls, bundle_type: BundleType, bundle_entries: List[BundleEntry]
-    ) -> Bundle:
-        return Bundle(
-            type=bundle_type.value,
-            timestamp=datetime.now(timezone.utc),
-            total=len(bundle_entries),
-            entry=bundle_entries,
+        cache = ValueSetExpansionCache.from_config(
+            project.config.terminology.cache, project.path
+        )
+        expansion_config = project.config.terminology.expansion
+        return FhirTerminologyClient(
+            base_url,
+            auth,
+            cert,
+            timeout,
+            project.config.http,
+            cache,
+            expansion_config.page_size,
+            expansion_config.page_workers,
+            archive,
         )
 
     def search_value_set(self, url: str) -> list[ValueSet]:
@@ -92,14 +153,129 @@ class FhirTerminologyClient(BaseClient):
             else:
                 raise
 
+    def __fetch_expansion_pages(
+        self,
+        url: str,
+        version: Optional[str],
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> tuple[Response, List[bytes]]:
+        """
+        Requests the expansion of a value set. If paging is enabled the first page is requested to discover the total
+        number of concepts and the remaining pages are fetched concurrently afterward
+
+        :param url: Canonical URL of the value set
+        :param version: Version of the value set
+        :param headers: Headers to send with the (first) request
+        :return: Response to the first request and the bodies of all pages in order. If the first request was answered
+                 with status 304 no bodies are returned
+        """
+        headers = headers if headers else dict([self.__accept_header])
+        query_params = {"url": url, "version": version}
+        if not self.__page_size:
+            response = self.get(
+                "/ValueSet/$expand", headers=headers, query_params=query_params
+            )
+            return response, [] if response.status_code == 304 else [response.content]
+
+        response = self.get(
+            "/ValueSet/$expand",
+            headers=headers,
+            query_params=query_params | {"count": self.__page_size, "offset": 0},
+        )
+        if response.status_code == 304:
+            return response, []
+        expansion = response.json().get("expansion", {})
+        total = expansion.get("total")
+        # Servers may return fewer concepts than requested so the actual page size is used from here on
+        page_size = len(expansion.get("contains", []))
+        if total is None or page_size == 0 or page_size >= total:
+            return response, [response.content]
+
+        def fetch_page(offset: int) -> bytes:
+            return self.get(
+                "/ValueSet/$expand",
+                headers=dict([self.__accept_header]),
+                query_params=query_params | {"count": page_size, "offset": offset},
+            ).content
+
+        offsets = range(page_size, total, page_size)
+        with ThreadPoolExecutor(
+            max_workers=min(self.__page_workers, len(offsets))
+        ) as executor:
+            pages = list(executor.map(fetch_page, offsets))
+        return response, [response.content, *pages]
+
+    def __expand_value_set_cached(self, url: str, version: Optional[str]) -> bytes:
+        headers = dict([self.__accept_header])
+        lookup = self.__cache.begin_expansion(
+            self._get_base_url(), url, version, headers
+        )
+        if lookup.fresh:
+            return lookup.body
+        response, pages = self.__fetch_expansion_pages(url, version, headers)
+        return self.__cache.finish_expansion(
+            lookup,
+            response.status_code,
+            response.headers,
+            lambda: (
+                pages[0]
+                if len(pages) == 1
+                else json.dumps(merge_expansion_pages(pages)).encode("utf-8")
+            ),
+        )
+
     def expand_value_set(
         self, url: str, version: Optional[str] = None
     ) -> Optional[Mapping[str, any]]:
-        return self.get(
+        if self.__cache is not None:
+            return json.loads(self.__expand_value_set_cached(url, version))
+        _, pages = self.__fetch_expansion_pages(url, version)
+        return json.loads(pages[0]) if len(pages) == 1 else merge_expansion_pages(pages)
+
+    def iter_value_set_expansion(
+        self, url: str, version: Optional[str] = None
+    ) -> Iterator[ExpansionConcept]:
+        """
+        Expands a value set and incrementally parses the response, yielding the concepts of the expansion as
+        lightweight tuples instead of materializing the whole resource
+
+        :param url: Canonical URL of the value set
+        :param version: Version of the value set
+        :return: Iterator over the concepts of the expansion. Empty if the server did not return an expansion
+        """
+        try:
+            yield from self.__iter_value_set_expansion(url, version)
+        except MissingExpansionError as err:
+            self.__logger.warning(
+                f"Failed to expand value set '{url}' => Returning empty expansion"
+            )
+            self.__logger.debug(f"Expansion of value set '{url}' failed: {err}")
+
+    def __iter_value_set_expansion(
+        self, url: str, version: Optional[str]
+    ) -> Iterator[ExpansionConcept]:
+        if self.__cache is not None:
+            body = self.__expand_value_set_cached(url, version)
+            yield from iter_expansion_concepts(io.BytesIO(body))
+            return
+        if self.__page_size:
+            _, pages = self.__fetch_expansion_pages(url, version)
+            global_version = None
+            for page in pages:
+                global_version = yield from iter_expansion_concepts(
+                    io.BytesIO(page), global_version
+                )
+            return
+        with self.get(
             "/ValueSet/$expand",
             headers=dict([self.__accept_header]),
             query_params={"url": url, "version": version},
-        ).json()
+            stream=True,
+        ) as response:
+            if not response.ok:
+                raise_appropriate_exception(response)
+            response.raw.decode_content = True
+            yield from iter_expansion_concepts(response.raw)
 
     def search_code_system(self, **search_params) -> Bundle:
         bundle = self.get(
@@ -164,7 +340,7 @@ class FhirTerminologyClient(BaseClient):
             )
             for p in parameters
         ]
-        bundle = self.__build_bundle(mode, entries)
+        bundle = build_bundle(mode, entries)
         response = self.post(
             headers=dict([self.__content_type_header]), body=bundle.model_dump_json()
         )
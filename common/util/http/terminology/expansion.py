@@ -0,0 +1,161 @@
+import json
+from typing import (
+    NamedTuple,
+    Optional,
+    BinaryIO,
+    Generator,
+    Iterator,
+    List,
+    Mapping,
+    Any,
+)
+
+from common.exceptions import NotFoundError
+from common.util.log.functions import get_logger
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+_logger = get_logger(__file__)
+
+_PARAMETER_PREFIX = "expansion.parameter.item"
+_CONTAINS_PREFIX = "expansion.contains.item"
+
+
+class MissingExpansionError(NotFoundError):
+    """
+    Raised if a resource returned by a server in response to an expansion request does not contain an expansion
+    """
+
+    def __init__(self, resource_type: Optional[str]):
+        super().__init__(f"Resource of type '{resource_type}' contains no expansion")
+        self.resource_type = resource_type
+
+
+class ExpansionConcept(NamedTuple):
+    """
+    Lightweight representation of a concept listed in `ValueSet.expansion.contains`
+    """
+
+    system: Optional[str]
+    code: Optional[str]
+    display: Optional[str]
+    version: Optional[str]
+
+
+def _global_version(parameter: dict) -> Optional[str]:
+    if parameter.get("name") == "version" and (uri := parameter.get("valueUri")):
+        return uri.split("|")[-1]
+    return None
+
+
+def _to_concept(contains: dict, global_version: Optional[str]) -> ExpansionConcept:
+    return ExpansionConcept(
+        contains.get("system"),
+        contains.get("code"),
+        contains.get("display"),
+        contains.get("version", global_version),
+    )
+
+
+def _iter_items(fp: BinaryIO) -> Iterator[tuple[str, Any]]:
+    builder = None
+    current = None
+    for prefix, event, value in ijson.parse(fp):
+        if builder is None:
+            if event == "map_key" and prefix == "" and value == "expansion":
+                yield value, None
+                continue
+            if event == "string" and prefix == "resourceType":
+                yield prefix, value
+                continue
+            if event == "start_map" and prefix in (
+                _PARAMETER_PREFIX,
+                _CONTAINS_PREFIX,
+            ):
+                builder = ijson.ObjectBuilder()
+                current = prefix
+            else:
+                continue
+        builder.event(event, value)
+        if event == "end_map" and prefix == current:
+            yield current, builder.value
+            builder = None
+
+
+def iter_expansion_concepts(
+    fp: BinaryIO, global_version: Optional[str] = None
+) -> Generator[ExpansionConcept, None, Optional[str]]:
+    """
+    Incrementally parses a `ValueSet` resource in JSON format and yields the concepts listed in its expansion without
+    loading the whole document into memory. Concepts without an explicit version inherit the version reported via the
+    `version` expansion parameter. Since FHIR JSON serializes `ValueSet.expansion.parameter` before
+    `ValueSet.expansion.contains`, the parameter is known once the first concept is encountered. Falls back to parsing
+    the whole document if the optional `ijson` dependency is not installed
+
+    :param fp: Binary file-like object providing the JSON document
+    :param global_version: Version to assume until a `version` expansion parameter is encountered. Allows the version
+                           reported by the first page of a paged expansion to be carried over to subsequent pages
+    :return: Generator over the concepts of the expansion returning the last version reported by the document
+    :raises MissingExpansionError: If the document contains no expansion
+    """
+    if ijson is None:
+        resource = json.load(fp)
+        if "expansion" not in resource:
+            raise MissingExpansionError(resource.get("resourceType"))
+        expansion = resource["expansion"]
+        for parameter in expansion.get("parameter", []):
+            global_version = _global_version(parameter) or global_version
+        for contains in expansion.get("contains", []):
+            yield _to_concept(contains, global_version)
+        return global_version
+
+    seen_concepts = False
+    resource_type = None
+    has_expansion = False
+    for prefix, item in _iter_items(fp):
+        if prefix == "resourceType":
+            resource_type = item
+        elif prefix == "expansion":
+            has_expansion = True
+        elif prefix == _PARAMETER_PREFIX:
+            if version := _global_version(item):
+                if seen_concepts:
+                    _logger.warning(
+                        "Expansion parameter 'version' was encountered after the first concept and will not be "
+                        "applied to preceding concepts"
+                    )
+                global_version = version
+        else:
+            seen_concepts = True
+            yield _to_concept(item, global_version)
+    if not has_expansion:
+        raise MissingExpansionError(resource_type)
+    return global_version
+
+
+def merge_expansion_pages(pages: List[bytes]) -> Mapping[str, Any]:
+    """
+    Stitches the pages of a paged value set expansion together such that the result resembles an expansion obtained
+    in a single request
+
+    :param pages: JSON-encoded `ValueSet` resources representing consecutive pages of the expansion
+    :return: `ValueSet` resource listing the concepts of all pages in order
+    """
+    value_set = json.loads(pages[0])
+    expansion = value_set.setdefault("expansion", {})
+    contains = expansion.setdefault("contains", [])
+    for page in pages[1:]:
+        contains.extend(json.loads(page).get("expansion", {}).get("contains", []))
+    expansion.pop("offset", None)
+    if "parameter" in expansion:
+        expansion["parameter"] = [
+            p
+            for p in expansion["parameter"]
+            if p.get("name") not in {"count", "offset"}
+        ]
+    if not contains:
+        del expansion["contains"]
+    return value_set
@@ -0,0 +1,200 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Literal, Iterable, Tuple, List
+
+from fhir.resources.R4B.parameters import Parameters, ParametersParameter
+
+from common.util.collections.functions import batched
+from common.util.fhir.bundle import BundleType
+from common.util.http.exceptions import ClientError, ServerError
+from common.util.http.metrics import HTTPMetrics
+from common.util.http.terminology.client import FhirTerminologyClient
+from common.util.log.functions import get_class_logger
+
+LookupKey = Tuple[str, str, Optional[str]]
+
+
+class CodeSystemLookupEngine:
+    """
+    Resolves `CodeSystem/$lookup` operations for many concepts at once. Lookups are collected via `request`,
+    deduplicated and resolved either through batch `Bundle` resources or a bounded thread pool issuing individual
+    requests. Results are memoized for the lifetime of the engine such that each concept is looked up at most once
+    """
+
+    __logger = get_class_logger("CodeSystemLookupEngine")
+
+    __client: FhirTerminologyClient
+    __mode: Literal["batch", "concurrent"]
+    __batch_size: int
+    __max_workers: int
+    __memo: dict[LookupKey, Optional[Parameters]]
+    __pending: dict[LookupKey, None]
+    __lock: threading.RLock
+
+    def __init__(
+        self,
+        client: FhirTerminologyClient,
+        mode: Literal["batch", "concurrent"] = "batch",
+        batch_size: int = 100,
+        max_workers: int = 8,
+    ):
+        """
+        :param client: Client used to issue the lookup requests
+        :param mode: Whether lookups should be resolved via batch `Bundle` resources (`batch`) or individual requests
+                     issued in parallel (`concurrent`). In batch mode the engine falls back to concurrent requests if
+                     the server fails to process a batch
+        :param batch_size: Maximum number of lookups per batch `Bundle`
+        :param max_workers: Maximum number of concurrent requests
+        """
+        self.__client = client
+        self.__mode = mode
+        self.__batch_size = batch_size
+        self.__max_workers = max_workers
+        self.__memo = {}
+        self.__pending = {}
+        self.__lock = threading.RLock()
+
+    def request(self, system: str, code: str, version: Optional[str] = None):
+        """
+        Registers a concept to be looked up during the next resolution
+
+        :param system: Code system URL of the concept
+        :param code: Code of the concept
+        :param version: Version of the code system
+        """
+        key = (system, code, version)
+        with self.__lock:
+            if key not in self.__memo:
+                self.__pending[key] = None
+
+    def request_all(self, concepts: Iterable[Tuple[str, str] | LookupKey]):
+        """
+        Registers multiple concepts to be looked up during the next resolution
+
+        :param concepts: Tuples of code system URL, code and optionally version
+        """
+        for concept in concepts:
+            self.request(*concept)
+
+    def resolve(self):
+        """
+        Looks up all pending concepts
+        """
+        with self.__lock:
+            keys = list(self.__pending.keys())
+            self.__pending.clear()
+        if not keys:
+            return
+        self.__logger.debug(f"Resolving {len(keys)} pending concept lookups")
+        if self.__mode == "batch":
+            failed = []
+            for chunk in batched(keys, self.__batch_size):
+                failed.extend(self.__resolve_batch(chunk))
+            keys = failed
+        self.__resolve_concurrently(keys)
+
+    def lookup(
+        self, system: str, code: str, version: Optional[str] = None
+    ) -> Optional[Parameters]:
+        """
+        Returns the lookup result for a concept, resolving it and all other pending concepts if necessary
+
+        :param system: Code system URL of the concept
+        :param code: Code of the concept
+        :param version: Version of the code system
+        :return: `Parameters` resource returned by the server or `None` if the concept could not be found
+        """
+        key = (system, code, version)
+        metrics = HTTPMetrics.instance()
+        with self.__lock:
+            if key in self.__memo:
+                metrics.observe_cache("code_system_lookup", hit=True)
+                return self.__memo[key]
+        metrics.observe_cache("code_system_lookup", hit=False)
+        self.request(system, code, version)
+        self.resolve()
+        with self.__lock:
+            return self.__memo.get(key)
+
+    def display(self, system: str, code: str, version: Optional[str] = None) -> str:
+        """
+        Returns the display of a concept
+
+        :param system: Code system URL of the concept
+        :param code: Code of the concept
+        :param version: Version of the code system
+        :return: Display value of the concept or "" if no display is available
+        """
+        if parameters := self.lookup(system, code, version):
+            for parameter in parameters.parameter or []:
+                if parameter.name == "display":
+                    return str(parameter.valueString) if parameter.valueString else ""
+        return ""
+
+    def __memoize(self, key: LookupKey, result: Optional[Parameters]):
+        with self.__lock:
+            self.__memo[key] = result
+
+    @staticmethod
+    def __lookup_parameters(key: LookupKey) -> Parameters:
+        system, code, version = key
+        parameters = [
+            ParametersParameter(name="system", valueUri=system),
+            ParametersParameter(name="code", valueCode=code),
+        ]
+        if version is not None:
+            parameters.append(ParametersParameter(name="version", valueString=version))
+        return Parameters(parameter=parameters)
+
+    def __resolve_batch(self, keys: List[LookupKey]) -> List[LookupKey]:
+        try:
+            bundle = self.__client.bulk_lookup(
+                [self.__lookup_parameters(key) for key in keys], mode=BundleType.BATCH
+            )
+        except (ClientError, ServerError) as err:
+            self.__logger.warning(
+                f"Batch lookup of {len(keys)} concepts failed => Falling back to individual requests [reason={err}]"
+            )
+            return keys
+        entries = bundle.entry or []
+        if len(entries) != len(keys):
+            self.__logger.warning(
+                f"Batch response contains {len(entries)} entries but {len(keys)} were expected => Falling back to "
+                f"individual requests"
+            )
+            return keys
+        failed = []
+        for key, entry in zip(keys, entries):
+            status = entry.response.status if entry.response else ""
+            if status.startswith("2") and entry.resource is not None:
+                resource = entry.resource
+                if not isinstance(resource, Parameters):
+                    resource = Parameters.model_validate(resource.model_dump())
+                self.__memoize(key, resource)
+            elif status.startswith("4"):
+                self.__memoize(key, None)
+            else:
+                failed.append(key)
+        return failed
+
+    def __lookup_single(self, key: LookupKey):
+        try:
+            result = self.__client.code_system_lookup(*key)
+        except ClientError as err:
+            self.__logger.debug(
+                f"Lookup of concept [system={key[0]}, code={key[1]}, version={key[2]}] failed [reason={err}]"
+            )
+            result = None
+        self.__memoize(key, result)
+
+    def __resolve_concurrently(self, keys: List[LookupKey]):
+        if not keys:
+            return
+        if len(keys) == 1:
+            self.__lookup_single(keys[0])
+            return
+        with ThreadPoolExecutor(
+            max_workers=min(self.__max_workers, len(keys))
+        ) as executor:
+            # Consume results to propagate exceptions
+            list(executor.map(self.__lookup_single, keys))
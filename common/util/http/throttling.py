@@ -0,0 +1,221 @@
+import threading
+import time
+from typing import Optional, Self
+from urllib.parse import urlsplit
+
+from common.config.project import HTTPConfig, ThrottlingConfig
+from common.util.log.functions import get_class_logger
+
+OVERLOAD_STATUS_CODES: frozenset[int] = frozenset([429, 503])
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the rate at which requests are issued. Besides the steady refill rate the bucket
+    can be paused until a given point in time, e.g. as requested by a server via the `Retry-After` header
+    """
+
+    __rate: Optional[float]
+    __capacity: float
+    __tokens: float
+    __updated: float
+    __paused_until: float
+    __lock: threading.Lock
+
+    def __init__(self, rate: Optional[float], burst: Optional[int] = None):
+        """
+        :param rate: Number of tokens added per second. If `None` tokens are unlimited and only pauses are enforced
+        :param burst: Maximum number of tokens the bucket can hold. Defaults to one second worth of tokens
+        """
+        self.__rate = rate
+        self.__capacity = float(burst if burst is not None else max(rate or 1, 1))
+        self.__tokens = self.__capacity
+        self.__updated = time.monotonic()
+        self.__paused_until = 0
+        self.__lock = threading.Lock()
+
+    def __refill(self, now: float):
+        self.__tokens = min(
+            self.__capacity, self.__tokens + (now - self.__updated) * self.__rate
+        )
+        self.__updated = now
+
+    def acquire(self):
+        """
+        Takes a token from the bucket, blocking until one becomes available
+        """
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                if now >= self.__paused_until:
+                    if self.__rate is None:
+                        return
+                    self.__refill(now)
+                    if self.__tokens >= 1:
+                        self.__tokens -= 1
+                        return
+                    wait = (1 - self.__tokens) / self.__rate
+                else:
+                    wait = self.__paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Stops handing out tokens for the given amount of time
+
+        :param seconds: Duration of the pause in seconds
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__paused_until = max(self.__paused_until, now + seconds)
+            # Tokens accumulated before the pause should not cause a burst afterward
+            self.__tokens = 0
+            self.__updated = self.__paused_until
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight using additive-increase/multiplicative-decrease (AIMD). Each successful
+    request grows the limit by `1 / limit` (i.e. by one per window of successful requests) while overload responses
+    shrink it by a constant factor
+    """
+
+    __limit: float
+    __min_limit: int
+    __max_limit: int
+    __decrease_factor: float
+    __in_flight: int
+    __condition: threading.Condition
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        :param initial_limit: Initial number of allowed requests in flight
+        :param min_limit: Lower bound of the limit
+        :param max_limit: Upper bound of the limit
+        :param decrease_factor: Factor the limit is multiplied with on overload
+        """
+        self.__limit = float(initial_limit)
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__decrease_factor = decrease_factor
+        self.__in_flight = 0
+        self.__condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self.__limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    def acquire(self):
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__in_flight < int(self.__limit))
+            self.__in_flight += 1
+
+    def release(self):
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify_all()
+
+    def on_success(self):
+        with self.__condition:
+            self.__limit = min(self.__max_limit, self.__limit + 1 / self.__limit)
+            self.__condition.notify_all()
+
+    def on_overload(self):
+        with self.__condition:
+            self.__limit = max(self.__min_limit, self.__limit * self.__decrease_factor)
+
+
+class RequestThrottle:
+    """
+    Combines a token bucket and an adaptive concurrency limiter for requests to a single server. Instances are shared
+    by all clients targeting the same server (scheme and authority)
+    """
+
+    __logger = get_class_logger("RequestThrottle")
+
+    __instances: dict[str, "RequestThrottle"] = {}
+    __instances_lock = threading.Lock()
+
+    __bucket: TokenBucket
+    __limiter: AdaptiveConcurrencyLimiter
+    __max_retry_after: float
+
+    def __init__(self, config: ThrottlingConfig):
+        self.__bucket = TokenBucket(config.requests_per_second, config.burst)
+        self.__limiter = AdaptiveConcurrencyLimiter(
+            config.initial_concurrency,
+            config.min_concurrency,
+            config.max_concurrency,
+            config.decrease_factor,
+        )
+        self.__max_retry_after = config.max_retry_after
+
+    @classmethod
+    def for_server(
+        cls, base_url: str, http_config: Optional[HTTPConfig]
+    ) -> Optional["RequestThrottle"]:
+        """
+        Returns the shared throttle for the server identified by the given URL
+
+        :param base_url: URL of the server
+        :param http_config: HTTP configuration holding the throttling configuration
+        :return: `RequestThrottle` instance or `None` if no throttling is configured for the server
+        """
+        if http_config is None:
+            return None
+        split = urlsplit(base_url)
+        config = http_config.server_throttling.get(split.netloc, http_config.throttling)
+        if config is None:
+            return None
+        key = f"{split.scheme}://{split.netloc}|{config.model_dump_json()}"
+        with cls.__instances_lock:
+            if key not in cls.__instances:
+                cls.__instances[key] = cls(config)
+            return cls.__instances[key]
+
+    @property
+    def limiter(self) -> AdaptiveConcurrencyLimiter:
+        return self.__limiter
+
+    def acquire_token(self):
+        self.__bucket.acquire()
+
+    def on_response(self, status_code: int, retry_after: Optional[float] = None):
+        """
+        Adapts the throttle to the outcome of a request
+
+        :param status_code: Status code of the response
+        :param retry_after: Delay in seconds requested by the server via the `Retry-After` header
+        """
+        if status_code in OVERLOAD_STATUS_CODES:
+            self.__limiter.on_overload()
+            if retry_after:
+                delay = min(retry_after, self.__max_retry_after)
+                self.__logger.debug(
+                    f"Server requested to retry after {retry_after}s => Pausing requests for {delay}s"
+                )
+                self.__bucket.pause(delay)
+        elif status_code < 400:
+            self.__limiter.on_success()
+
+    def __enter__(self) -> Self:
+        self.__limiter.acquire()
+        try:
+            self.acquire_token()
+        except BaseException:
+            self.__limiter.release()
+            raise
+        return self
+
+    def __exit__(self, *args):
+        self.__limiter.release()
@@ -1,13 +1,14 @@
 import logging.config
 import os
 import sys
+import threading
+from contextlib import contextmanager
 
-from typing import Any, Optional
+from typing import Any, Optional, Iterator
 
 from common.constants.project import PROJECT_ROOT
 from common.util.log import GLOBAL_LOGGING_CONFIG_FILE, LOGGING_DIR
 
-
 # Process logging.yaml file and set logging config after
 LOGGING_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -16,8 +17,24 @@ with open(GLOBAL_LOGGING_CONFIG_FILE, mode="rb") as config_f:
 
     config = yaml.load(config_f, Loader=yaml.Loader)
 
-for name, handler in config["handlers"].items():
+# Processes started via `spawn` or `forkserver` import this module again while preparing to run a worker (with the
+# arguments of the parent process or just `-c`), i.e. before any pool initializer runs. Opening the log file with mode
+# 'w' in them would truncate the log of the parent process, so their records have to be forwarded to the parent process
+# instead. Such processes are marked by the environment they inherit from the process starting them (see
+# `worker_processes`)
+_WORKER_ENV_VAR = "ONTOLOGY_GENERATOR_WORKER_PROCESS"
+_is_child_process = os.environ.get(_WORKER_ENV_VAR) == "1"
+
+for name, handler in list(config["handlers"].items()):
     if handler.get("class") == "logging.FileHandler":
+        if _is_child_process:
+            del config["handlers"][name]
+            for logger_config in [config.get("root", {})] + list(
+                config.get("loggers", {}).values()
+            ):
+                if name in logger_config.get("handlers", []):
+                    logger_config["handlers"].remove(name)
+            continue
         file_name = handler["filename"]
         script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
         handler["filename"] = str(
@@ -52,3 +69,27 @@ def get_class_logger(cls: Any | str) -> logging.LoggerAdapter:
     return logging.LoggerAdapter(
         logging.getLogger(class_name), extra={"className": f".{class_name}"}
     )
+
+
+_worker_lock = threading.Lock()
+_worker_contexts = 0
+
+
+@contextmanager
+def worker_processes() -> Iterator[None]:
+    """
+    Marks processes started within this context as worker processes which do not write to the log files of the
+    current process. Their records have to be forwarded to the current process instead (e.g. via a `QueueHandler`)
+    """
+    global _worker_contexts
+    with _worker_lock:
+        if _worker_contexts == 0 and not _is_child_process:
+            os.environ[_WORKER_ENV_VAR] = "1"
+        _worker_contexts += 1
+    try:
+        yield
+    finally:
+        with _worker_lock:
+            _worker_contexts -= 1
+            if _worker_contexts == 0 and not _is_child_process:
+                os.environ.pop(_WORKER_ENV_VAR, None)
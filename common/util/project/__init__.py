@@ -15,6 +15,7 @@ from common.util.fhir.package.manager import (
     FirelyPackageManager,
     RepositoryPackageManager,
 )
+from common.util.fhir.package.store import ResourceStore
 from common.util.log.functions import get_class_logger
 from common.constants.project import PROJECT_ROOT
 from common.config.project import ProjectConfig
@@ -198,12 +199,16 @@ class Project(ProjectDir):
             params["package_dir"] = self.path
         match manager_conf.type:
             case "firely":
-                return FirelyPackageManager(**params)
+                manager = FirelyPackageManager(**params)
             case "repository":
-                return RepositoryPackageManager(**params)
+                manager = RepositoryPackageManager(**params)
             case "github":
-                return GitHubPackageManager(**params)
+                manager = GitHubPackageManager(**params)
             case _:
                 raise ValueError(
                     f"Unsupported FHIR package manager type '{manager_conf.type}'"
                 )
+        manager.resource_store = ResourceStore.from_config(
+            self.config.fhir_packages.store, self.path
+        )
+        return manager
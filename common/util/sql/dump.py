@@ -0,0 +1,119 @@
+import re
+from os import PathLike
+from typing import Any, Iterator, Sequence, TextIO, Tuple
+
+# Header and footer matching the output of `pg_dump --format=plain -a -O` such that generated scripts can be processed
+# like dumps of actual databases
+DUMP_HEADER = """--
+-- PostgreSQL database dump
+--
+
+SET statement_timeout = 0;
+SET lock_timeout = 0;
+SET idle_in_transaction_session_timeout = 0;
+SET client_encoding = 'UTF8';
+SET standard_conforming_strings = on;
+SELECT pg_catalog.set_config('search_path', '', false);
+SET check_function_bodies = false;
+SET xmloption = content;
+SET client_min_messages = warning;
+SET row_security = off;
+
+"""
+DUMP_FOOTER = """--
+-- PostgreSQL database dump complete
+--
+
+"""
+
+_COPY_ESCAPES = str.maketrans(
+    {
+        "\\": "\\\\",
+        "\b": "\\b",
+        "\f": "\\f",
+        "\n": "\\n",
+        "\r": "\\r",
+        "\t": "\\t",
+        "\v": "\\v",
+    }
+)
+
+_COPY_STATEMENT = re.compile(
+    r"^COPY (?:(?P<schema>\w+)\.)?(?P<table>\w+) \((?P<columns>[^)]*)\) FROM stdin;$"
+)
+
+
+def copy_value(value: Any) -> str:
+    """
+    Encodes a value in the text format of the `COPY` command
+    :param value: Value to encode
+    :return: Encoded value
+    """
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def write_table_data(
+    f: TextIO,
+    name: str,
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    encoded: bool = False,
+):
+    """
+    Writes the rows of a table as a `COPY` block like `pg_dump` does
+    :param f: File to write to
+    :param name: Name of the table in the public schema
+    :param columns: Names of the columns
+    :param rows: Column values of each row
+    :param encoded: Whether the values are already encoded (e.g. as returned by `read_table_data`)
+    """
+    f.write(
+        f"--\n-- Data for Name: {name}; Type: TABLE DATA; Schema: public; Owner: -\n--\n\n"
+    )
+    f.write(f"COPY public.{name} ({', '.join(columns)}) FROM stdin;\n")
+    for row in rows:
+        f.write("\t".join(row if encoded else (copy_value(v) for v in row)))
+        f.write("\n")
+    f.write("\\.\n\n\n")
+
+
+def write_sequence_set(f: TextIO, name: str, last_value: int):
+    """
+    Writes the statement setting the value of a sequence like `pg_dump` does
+    :param f: File to write to
+    :param name: Name of the sequence in the public schema
+    :param last_value: Last value returned by the sequence or 0 if it was never used
+    """
+    f.write(
+        f"--\n-- Name: {name}; Type: SEQUENCE SET; Schema: public; Owner: -\n--\n\n"
+    )
+    value, is_called = (last_value, "true") if last_value else (1, "false")
+    f.write(f"SELECT pg_catalog.setval('public.{name}', {value}, {is_called});\n\n\n")
+
+
+def read_table_data(
+    file: str | PathLike[str], encoding: str = "utf-8"
+) -> Iterator[Tuple[str, Tuple[str, ...], Tuple[str, ...]]]:
+    """
+    Reads the rows of the `COPY` blocks of a plain `pg_dump` script line by line. Values are returned in their encoded
+    form (e.g. `\\N` for `NULL`) which is unambiguous since `pg_dump` encodes equal values identically
+    :param file: Path of the script file
+    :param encoding: Encoding of the script file
+    :return: Iterator over the name of the table, the names of its columns and the values of each row
+    """
+    with open(file, mode="r", encoding=encoding, newline="\n") as f:
+        table, columns = None, ()
+        for line in f:
+            line = line.rstrip("\r\n")
+            if table is None:
+                if match := _COPY_STATEMENT.match(line):
+                    table = match.group("table")
+                    columns = tuple(
+                        c.strip() for c in match.group("columns").split(",")
+                    )
+            elif line == "\\.":
+                table = None
+            else:
+                yield table, columns, tuple(line.split("\t"))
@@ -1,7 +1,9 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from importlib.abc import Traversable
 from pathlib import Path
+from typing import List, Optional, Dict, Tuple, Sequence
 
 import docker
 import time
@@ -11,10 +13,16 @@ import common.resources.sql
 
 from common.constants.docker import POSTGRES_IMAGE
 from common.util.log.functions import get_logger
+from common.util.sql.dump import (
+    DUMP_HEADER,
+    DUMP_FOOTER,
+    read_table_data,
+    write_table_data,
+    write_sequence_set,
+)
 
 from importlib.resources import files
 
-
 logger = get_logger(__file__)
 sql_resources_dir = files(common.resources.sql)
 
@@ -67,7 +75,15 @@ class SqlMerger:
         sql_init_script_dir: str | Path | Traversable = files(common.resources.sql),
         sql_mapped_dir: str | Path | Traversable = "/tmp/sql",
         repeatable_scripts_prefix: str = "R__Load_latest_ui_profile_",
+        jobs: Optional[int] = None,
+        connection_timeout: float = 60,
+        poll_interval: float = 0.5,
     ):
+        """
+        :param jobs: Maximum number of script files loaded concurrently. Defaults to the number of CPUs
+        :param connection_timeout: Number of seconds to wait for the database to accept connections
+        :param poll_interval: Number of seconds between connection attempts while waiting for the database
+        """
         self.db_container = None
         self.conn = None
         self.container_name = container_name
@@ -81,6 +97,9 @@ class SqlMerger:
         self.repeatable_scripts_prefix = repeatable_scripts_prefix
         self.match_expression = f"^{repeatable_scripts_prefix}(\\d+)\\.sql$"
         self.pattern = re.compile(self.match_expression)
+        self.jobs = jobs
+        self.connection_timeout = connection_timeout
+        self.poll_interval = poll_interval
 
     def shutdown(self):
         if self.conn:
@@ -114,7 +133,13 @@ class SqlMerger:
         )
 
     def get_connection(self):
-        for _ in range(5):
+        """
+        Polls the database until it accepts connections instead of waiting for a fixed amount of time. Since the
+        PostgreSQL image only listens on TCP once its initialization is complete, a successful connection also
+        indicates that the database is ready to be populated
+        """
+        deadline = time.monotonic() + self.connection_timeout
+        while True:
             try:
                 self.conn = psycopg2.connect(
                     dbname=self.db_name,
@@ -123,133 +148,117 @@ class SqlMerger:
                     host="localhost",
                     port=self.db_port,
                 )
+                return
             except psycopg2.OperationalError as e:
-                logger.info("Connection failed => Retrying")
-                time.sleep(5)
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(
+                        f"Database did not accept connections within {self.connection_timeout}s"
+                    ) from e
+                logger.debug("Database not ready => Retrying")
+                time.sleep(self.poll_interval)
 
     def setup_container_and_get_connection(self):
         self.setup_db_container()
-        time.sleep(5)
         self.get_connection()
 
-    def populate_db(self):
-        # init empty public schema (ddl only)
+    def __load_script(self, filename: str, schema_name: str):
+        """
+        Loads a module dump into its import schema by piping it through `psql` within a single transaction
+        :param filename: Name of the dump file in the SQL script directory
+        :param schema_name: Name of the import schema
+        """
+        logger.debug(f"Loading script file '{filename}' into schema '{schema_name}'")
+        modified_filename = f"modified_{filename}"
         with (
-            sql_resources_dir.joinpath("init.sql").open(
-                mode="r", encoding="UTF-8"
-            ) as template,
             open(
-                os.path.join(self.sql_script_dir, "public_init.sql"),
-                mode="w",
+                os.path.join(self.sql_script_dir, filename),
+                mode="r",
                 encoding="UTF-8",
-            ) as target,
-        ):
-            target.write(template.read())
-
-        with (
-            sql_resources_dir.joinpath("create_functions.sql").open(
-                mode="r", encoding="UTF-8"
             ) as template,
             open(
-                os.path.join(self.sql_script_dir, "public_create_functions.sql"),
+                os.path.join(self.sql_script_dir, modified_filename),
                 mode="w",
                 encoding="UTF-8",
             ) as target,
         ):
-            target.write(template.read())
-
-        cmd = f"sh -c 'psql -U {self.db_user} -d {self.db_name} < {self.sql_mapped_dir}/public_init.sql'"
-        self.db_container.exec_run(cmd=cmd)
-
-        # create functions to return existing ids if present on public schema
-        cmd = f"sh -c 'psql -U {self.db_user} -d {self.db_name} < {self.sql_mapped_dir}/public_create_functions.sql'"
-        self.db_container.exec_run(cmd=cmd)
+            target.write(template.read().replace("public.", f"{schema_name}."))
+        result = self.db_container.exec_run(
+            cmd=[
+                "psql",
+                "-q",
+                "-v",
+                "ON_ERROR_STOP=1",
+                "--single-transaction",
+                "-U",
+                self.db_user,
+                "-d",
+                self.db_name,
+                "-f",
+                f"{self.sql_mapped_dir}/{modified_filename}",
+            ]
+        )
+        os.remove(os.path.join(self.sql_script_dir, modified_filename))
+        if result.exit_code != 0:
+            raise RuntimeError(
+                f"Failed to load script file '{filename}': {result.output.decode(errors='replace')}"
+            )
+        os.remove(os.path.join(self.sql_script_dir, filename))
 
-        os.remove(os.path.join(self.sql_script_dir, "public_init.sql"))
-        os.remove(os.path.join(self.sql_script_dir, "public_create_functions.sql"))
+    def populate_db(self):
+        init_script = sql_resources_dir.joinpath("init.sql").read_text(encoding="UTF-8")
+        cur = self.conn.cursor()
+        # init empty public schema (ddl only)
+        cur.execute(init_script)
+        self.conn.commit()
 
-        # create and populate schemas for each load_ui_profile file
-        for filename in os.listdir(self.sql_script_dir):
+        # create a schema for each load_ui_profile file
+        scripts = {}
+        for filename in sorted(os.listdir(self.sql_script_dir)):
             if os.path.isfile(os.path.join(self.sql_script_dir, filename)):
-                if re.match(self.match_expression, filename):
-                    logger.debug(f"Loading script file '{filename}' into database")
-                    db_index = self.pattern.search(filename).group(1)
-                    schema_name = f"import_{db_index}"
-                    # initialize the db
-                    with (
-                        sql_resources_dir.joinpath("init.sql").open(
-                            mode="r", encoding="UTF-8"
-                        ) as template,
-                        open(
-                            os.path.join(self.sql_script_dir, f"init_{db_index}.sql"),
-                            mode="w",
-                            encoding="UTF-8",
-                        ) as target,
-                    ):
-                        target.write(f"CREATE schema {schema_name};\n")
-                        target.write(f"SET search_path TO {schema_name};\n\n")
-                        target.write(template.read())
-
-                    cmd = f"sh -c 'psql -U {self.db_user} -d {self.db_name} < {self.sql_mapped_dir}/init_{db_index}.sql'"
-                    # time.sleep(5)
-                    logger.debug(f"Executing command {cmd}")
-                    self.db_container.exec_run(cmd=cmd)
-                    os.remove(os.path.join(self.sql_script_dir, f"init_{db_index}.sql"))
-
-                    # import the data
-                    with (
-                        open(
-                            os.path.join(self.sql_script_dir, filename),
-                            mode="r",
-                            encoding="UTF-8",
-                        ) as template,
-                        open(
-                            os.path.join(self.sql_script_dir, f"modified_{filename}"),
-                            mode="w",
-                            encoding="UTF-8",
-                        ) as target,
-                    ):
-                        target.write(
-                            template.read().replace("public.", f"{schema_name}.")
-                        )
-                    cmd = f"sh -c 'psql -U {self.db_user} -d {self.db_name} < {self.sql_mapped_dir}/modified_{filename}'"
-                    # time.sleep(5)
-                    logger.debug(f"Executing command {cmd}")
-                    self.db_container.exec_run(cmd=cmd)
-                    os.remove(os.path.join(self.sql_script_dir, filename))
-                    os.remove(os.path.join(self.sql_script_dir, f"modified_{filename}"))
-
-                    # remove fk constraints
-                    with (
-                        sql_resources_dir.joinpath("remove_fk_constraints.sql").open(
-                            mode="r", encoding="UTF-8"
-                        ) as template,
-                        open(
-                            os.path.join(
-                                self.sql_script_dir,
-                                "modified_remove_fk_constraints.sql",
-                            ),
-                            mode="w",
-                            encoding="UTF-8",
-                        ) as target,
-                    ):
-                        target.write(f"SET search_path TO {schema_name};\n\n")
-                        target.write(template.read())
-                    cmd = f"sh -c 'psql -U {self.db_user} -d {self.db_name} < {self.sql_mapped_dir}/modified_remove_fk_constraints.sql'"
-                    time.sleep(5)
-                    logger.debug(f"Executing command {cmd}")
-                    self.db_container.exec_run(cmd=cmd)
-                    os.remove(
-                        os.path.join(
-                            self.sql_script_dir, "modified_remove_fk_constraints.sql"
-                        )
+                if match := self.pattern.match(filename):
+                    schema_name = f"import_{match.group(1)}"
+                    cur.execute(f"CREATE SCHEMA {schema_name};")
+                    cur.execute(f"SET LOCAL search_path TO {schema_name};")
+                    cur.execute(init_script)
+                    # Module databases do not enforce unique profile names (see `DataBaseWriter`). Duplicates are
+                    # resolved while merging instead of failing to load the whole dump
+                    cur.execute(
+                        "ALTER TABLE ui_profile DROP CONSTRAINT IF EXISTS ui_profile_name_key;"
                     )
+                    self.conn.commit()
+                    scripts[filename] = schema_name
                 else:
                     logger.warning(
                         f"{filename} does not match pattern {self.match_expression}"
                     )
+        cur.close()
+
+        # populate the schemas concurrently since each script is loaded by a separate psql process
+        logger.info(f"Loading {len(scripts)} script files into database")
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [
+                executor.submit(self.__load_script, filename, schema_name)
+                for filename, schema_name in scripts.items()
+            ]
+            for future in as_completed(futures):
+                future.result()
+
+    @staticmethod
+    def __union(schemas: List[str], select: str) -> str:
+        return "\n                UNION ALL\n".join(
+            select.format(ord=i, schema_name=schema_name)
+            for i, schema_name in enumerate(schemas)
+        )
 
     def merge_schemas(self):
+        """
+        Merges all import schemas into the public schema with a single set-based statement per table. Rows of schemas
+        with a lower name take precedence like they did when merging the schemas one after another. The IDs assigned in
+        the public schema are recorded per schema in temporary mapping tables which are used to translate the foreign
+        keys of the contextualized term codes. UI profiles sharing a name (within or across schemas) are merged into
+        the first one encountered and links referencing the others are redirected to it, matching the former
+        `insert_ui_profile` function which returned the ID of the existing profile on conflict
+        """
         cur = self.conn.cursor()
         query_for_schemas = """
         SELECT schema_name
@@ -258,84 +267,101 @@ class SqlMerger:
         """
 
         cur.execute(query_for_schemas)
-        schema_result = cur.fetchall()
-
-        for schema in schema_result:
-            if schema[0].startswith("import_"):
-                schema_name = schema[0]
-                logger.info(f"Importing schema {schema_name}...to public")
-
-                # Import the context table and write back new foreign keys to import schema
-                query_copy_context = """
-                WITH source_data AS (
-                    SELECT id AS source_id, system, code, version, display
-                    FROM {schema_name}.context
-                ),
-                updated_data AS (
-                    SELECT sd.source_id, insert_context(sd.system, sd.code, sd.version, sd.display) AS target_id
-                    FROM source_data sd
-                )
-                UPDATE {schema_name}.contextualized_termcode ict
-                SET context_id = ud.target_id
-                FROM updated_data ud
-                WHERE ict.context_id = ud.source_id;
-                """.format(
-                    schema_name=schema_name
-                )
-
-                # Import the termcode table and write back new foreign keys to import schema
-                query_copy_termcode = """
-                WITH source_data AS (
-                    SELECT id AS source_id, system, code, version, display
-                    FROM {schema_name}.termcode
-                ),
-                updated_data AS (
-                    SELECT sd.source_id, insert_termcode(sd.system, sd.code, sd.version, sd.display) AS target_id
-                    FROM source_data sd
-                )
-                UPDATE {schema_name}.contextualized_termcode ict
-                SET termcode_id = ud.target_id
-                FROM updated_data ud
-                WHERE ict.termcode_id = ud.source_id;
-                """.format(
-                    schema_name=schema_name
-                )
-
-                # Import the ui_profile table and write back new foreign keys to import schema
-                query_copy_uiprofile = """
+        schemas = [
+            schema[0] for schema in cur.fetchall() if schema[0].startswith("import_")
+        ]
+        if not schemas:
+            logger.warning("No schemas to merge")
+            return
+        logger.info(f"Importing {len(schemas)} schemas to public")
+
+        for table in ["context", "termcode", "ui_profile"]:
+            cur.execute(f"""
+                CREATE TEMPORARY TABLE {table}_id_map(
+                    ord       INTEGER NOT NULL,
+                    source_id INTEGER NOT NULL,
+                    target_id INTEGER NOT NULL,
+                    PRIMARY KEY (ord, source_id)
+                ) ON COMMIT DROP;
+                """)
+
+        # Import the context and termcode tables and record the new IDs
+        for table in ["context", "termcode"]:
+            source = self.__union(
+                schemas,
+                "SELECT {ord} AS ord, id, system, code, version, display FROM {schema_name}.%s"
+                % table,
+            )
+            cur.execute(f"""
                 WITH source_data AS (
-                    SELECT id AS source_id, name, ui_profile
-                    FROM {schema_name}.ui_profile
+                {source}
                 ),
-                updated_data AS (
-                    SELECT sd.source_id, insert_uiprofile(sd.name, sd.ui_profile) AS target_id
-                    FROM source_data sd
-                )
-                UPDATE {schema_name}.contextualized_termcode ict
-                SET ui_profile_id = ud.target_id
-                FROM updated_data ud
-                WHERE ict.ui_profile_id = ud.source_id;
-                """.format(
-                    schema_name=schema_name
-                )
-
-                cur.execute(query_copy_context)
-                cur.execute(query_copy_termcode)
-                cur.execute(query_copy_uiprofile)
-                # commit those changes so that the foreign keys can be found in the following statement
-                self.conn.commit()
-
-                # Import the ui_profile table and write back new foreign keys to import schema
-                query_copy_contextualized_termcodes = """
-                INSERT INTO public.contextualized_termcode (context_termcode_hash, context_id, termcode_id, ui_profile_id)
-                SELECT context_termcode_hash, context_id, termcode_id, ui_profile_id
-                FROM {schema_name}.contextualized_termcode
-                ON CONFLICT DO NOTHING;
-                """.format(
-                    schema_name=schema_name
+                merged_data AS (
+                    INSERT INTO public.{table} (system, code, version, display)
+                    SELECT system, code, version, display
+                    FROM (
+                        SELECT DISTINCT ON (system, code, version) ord, id, system, code, version, display
+                        FROM source_data
+                        ORDER BY system, code, version, ord, id
+                    ) D
+                    ORDER BY ord, id
+                    ON CONFLICT (system, code, version) DO UPDATE SET display = public.{table}.display
+                    RETURNING id, system, code, version
                 )
-                cur.execute(query_copy_contextualized_termcodes)
-                self.conn.commit()
+                INSERT INTO {table}_id_map (ord, source_id, target_id)
+                SELECT sd.ord, sd.id, md.id
+                FROM source_data sd
+                JOIN merged_data md
+                    ON md.system = sd.system AND md.code = sd.code AND md.version IS NOT DISTINCT FROM sd.version;
+                """)
+
+        # Import the ui_profile table and record the new IDs
+        source = self.__union(
+            schemas,
+            "SELECT {ord} AS ord, id, name, ui_profile FROM {schema_name}.ui_profile",
+        )
+        cur.execute(f"""
+            WITH source_data AS (
+            {source}
+            ),
+            merged_data AS (
+                INSERT INTO public.ui_profile (name, ui_profile)
+                SELECT name, ui_profile
+                FROM (
+                    SELECT DISTINCT ON (name) ord, id, name, ui_profile
+                    FROM source_data
+                    ORDER BY name, ord, id
+                ) D
+                ORDER BY ord, id
+                ON CONFLICT (name) DO UPDATE SET name = public.ui_profile.name
+                RETURNING id, name
+            )
+            INSERT INTO ui_profile_id_map (ord, source_id, target_id)
+            SELECT sd.ord, sd.id, md.id
+            FROM source_data sd
+            JOIN merged_data md ON md.name = sd.name;
+            """)
+
+        # Import the contextualized_termcode table translating the foreign keys to the new IDs
+        source = self.__union(
+            schemas,
+            "SELECT {ord} AS ord, context_termcode_hash, context_id, termcode_id, ui_profile_id "
+            "FROM {schema_name}.contextualized_termcode",
+        )
+        cur.execute(f"""
+            INSERT INTO public.contextualized_termcode (context_termcode_hash, context_id, termcode_id, ui_profile_id)
+            SELECT DISTINCT ON (sd.context_termcode_hash) sd.context_termcode_hash, c.target_id, t.target_id, u.target_id
+            FROM (
+            {source}
+            ) sd
+            JOIN context_id_map c ON c.ord = sd.ord AND c.source_id = sd.context_id
+            JOIN termcode_id_map t ON t.ord = sd.ord AND t.source_id = sd.termcode_id
+            JOIN ui_profile_id_map u ON u.ord = sd.ord AND u.source_id = sd.ui_profile_id
+            ORDER BY sd.context_termcode_hash, sd.ord
+            ON CONFLICT DO NOTHING;
+            """)
+        self.conn.commit()
+        cur.close()
 
     def dump_merged_schema(self):
         cmd = f"pg_dump --format=plain -U {self.db_user} -d {self.db_name} -a -O -t termcode -t context -t ui_profile -t mapping -t contextualized_termcode -t contextualized_termcode_to_criteria_set -t criteria_set -f {self.sql_mapped_dir}/R__Load_latest_ui_profile.sql"
@@ -366,3 +392,152 @@ class SqlMerger:
         self.merge_schemas()
         logger.info("Dumping merged schema")
         self.dump_merged_schema()
+
+
+class DumpMerger:
+    """
+    Merges the module dumps like `SqlMerger` without requiring Docker or a database. The `COPY` blocks of the dumps are
+    read line by line, rows are deduplicated by their natural key and their IDs are remapped in memory. The same
+    precedence rules apply, i.e. rows of dumps with a lower index (compared as strings like the import schema names)
+    take precedence and IDs are assigned in the order in which rows are first encountered. `COPY` blocks of other
+    tables are ignored
+    """
+
+    # Tables with a serial ID mapped to the columns forming their natural key and the columns of their rows
+    __tables: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+        "context": (
+            ("system", "code", "version"),
+            ("id", "system", "code", "version", "display"),
+        ),
+        "termcode": (
+            ("system", "code", "version"),
+            ("id", "system", "code", "version", "display"),
+        ),
+        "ui_profile": (("name",), ("id", "name", "ui_profile")),
+    }
+    __link_columns = (
+        "context_termcode_hash",
+        "context_id",
+        "termcode_id",
+        "ui_profile_id",
+    )
+
+    def __init__(
+        self,
+        sql_script_dir: str | Path,
+        repeatable_scripts_prefix: str = "R__Load_latest_ui_profile_",
+        output_file_name: str = "R__Load_latest_ui_profile.sql",
+    ):
+        self.sql_script_dir = sql_script_dir
+        self.output_file_name = output_file_name
+        self.match_expression = f"^{repeatable_scripts_prefix}(\\d+)\\.sql$"
+        self.pattern = re.compile(self.match_expression)
+
+    def shutdown(self):
+        # Nothing to release, present for interchangeability with `SqlMerger`
+        pass
+
+    def script_files(self) -> List[Path]:
+        """
+        Determines the dumps to merge in the order of their precedence
+        :return: Paths of the dump files
+        """
+        scripts = {}
+        for filename in os.listdir(self.sql_script_dir):
+            path = Path(self.sql_script_dir, filename)
+            if path.is_file():
+                if match := self.pattern.match(filename):
+                    scripts[f"import_{match.group(1)}"] = path
+                elif filename != self.output_file_name:
+                    logger.warning(
+                        f"{filename} does not match pattern {self.match_expression}"
+                    )
+        return [scripts[name] for name in sorted(scripts)]
+
+    def merge(self, files: List[Path]) -> Dict[str, List[Sequence[str]]]:
+        """
+        Merges the rows of the given dumps
+        :param files: Paths of the dump files in the order of their precedence
+        :return: Merged rows (with encoded values) keyed by table name in the order they are dumped
+        """
+        merged: Dict[str, Dict[Tuple[str, ...], List[str]]] = {
+            table: {} for table in self.__tables
+        }
+        links: Dict[str, Tuple[str, str, str, str]] = {}
+        for file in files:
+            logger.debug(f"Merging script file '{file.name}'")
+            source: Dict[str, List[Dict[str, str]]] = {
+                table: [] for table in self.__tables
+            }
+            source_links = []
+            for table, columns, values in read_table_data(file):
+                if table in source:
+                    source[table].append(dict(zip(columns, values)))
+                elif table == "contextualized_termcode":
+                    source_links.append(dict(zip(columns, values)))
+
+            id_maps: Dict[str, Dict[str, str]] = {}
+            for table, (key_columns, columns) in self.__tables.items():
+                rows = merged[table]
+                id_map = id_maps[table] = {}
+                for row in sorted(source[table], key=lambda r: int(r["id"])):
+                    key = tuple(row[c] for c in key_columns)
+                    if (merged_row := rows.get(key)) is None:
+                        merged_row = rows[key] = [
+                            str(len(rows) + 1),
+                            *(row[c] for c in columns[1:]),
+                        ]
+                    id_map[row["id"]] = merged_row[0]
+
+            for row in source_links:
+                context_termcode_hash = row["context_termcode_hash"]
+                if context_termcode_hash in links:
+                    continue
+                context_id = id_maps["context"].get(row["context_id"])
+                termcode_id = id_maps["termcode"].get(row["termcode_id"])
+                ui_profile_id = id_maps["ui_profile"].get(row["ui_profile_id"])
+                # Links referencing unknown rows are dropped
+                if context_id and termcode_id and ui_profile_id:
+                    links[context_termcode_hash] = (
+                        context_termcode_hash,
+                        context_id,
+                        termcode_id,
+                        ui_profile_id,
+                    )
+
+        result = {table: list(rows.values()) for table, rows in merged.items()}
+        # Links are inserted ordered by their hash and the (context_id, termcode_id) pair has to be unique as well
+        result["contextualized_termcode"] = []
+        pairs = set()
+        for context_termcode_hash in sorted(links):
+            link = links[context_termcode_hash]
+            if link[1:3] not in pairs:
+                pairs.add(link[1:3])
+                result["contextualized_termcode"].append(link)
+        return result
+
+    def execute_merge(self):
+        files = self.script_files()
+        logger.info(f"Merging {len(files)} script files")
+        result = self.merge(files)
+        dump_file_path = Path(self.sql_script_dir, self.output_file_name)
+        with open(dump_file_path, mode="w", encoding="UTF-8", newline="\n") as f:
+            f.write(DUMP_HEADER)
+            for table, rows in result.items():
+                columns = (
+                    self.__tables[table][1]
+                    if table in self.__tables
+                    else self.__link_columns
+                )
+                # Values are already encoded
+                write_table_data(f, table, columns, rows, encoded=True)
+            for table in self.__tables:
+                write_sequence_set(f, f"{table}_id_seq", len(result[table]))
+            f.write(DUMP_FOOTER)
+        insert_content(
+            dump_file_path,
+            str(sql_resources_dir.joinpath("delete_statements.sql")),
+        )
+        # Remove the merged dumps like `SqlMerger` does
+        for file in files:
+            os.remove(file)
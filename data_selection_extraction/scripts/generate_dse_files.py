@@ -1,5 +1,4 @@
 import argparse
-import collections
 import os
 import json
 
@@ -21,9 +20,8 @@ from data_selection_extraction.core.generators.profile_tree import (
 )
 from cohort_selection_ontology.core.terminology.client import (
     CohortSelectionTerminologyClient,
-    remove_non_direct_ancestors,
 )
-from cohort_selection_ontology.model.tree_map import TreeMap, TermEntryNode
+from cohort_selection_ontology.model.tree_map import CompactTreeMap
 from cohort_selection_ontology.model.ui_data import TermCode
 from common.util.log.functions import get_logger
 from data_selection_extraction.model.detail import ProfileDetailListTA
@@ -203,62 +201,29 @@ def extract_concepts_from_value_set(
 
 
 def generate_cs_tree_map(
-    system: str, version: str | None, concepts: set, project: Project
-) -> TreeMap:
-    _logger.debug("Initializing closure table")
-    client = CohortSelectionTerminologyClient(project)
-
-    closure_name = client.create_concept_map()
-    _logger.debug(f"Created closure table [name='{closure_name}']")
+    system: str,
+    version: str | None,
+    concepts: set,
+    project: Project,
+    client: Optional[CohortSelectionTerminologyClient] = None,
+) -> CompactTreeMap:
+    if client is None:
+        client = CohortSelectionTerminologyClient(project)
     term_codes = list(
         map(
             lambda t: TermCode(system=system, code=t[0], display=t[1], version=version),
             concepts,
         )
     )
-    treemap: TreeMap = TreeMap({}, None, system, version)
-    treemap.entries = {
-        term_code.code: TermEntryNode(term_code=term_code) for term_code in term_codes
-    }
+    ancestors = {}
     _logger.debug("Building closure table")
     try:
-        closure_map = client.get_closure_map(term_codes, closure_name)
-        if groups := closure_map.group:
-            if len(groups) > 1:
-                raise Exception(
-                    "Multiple groups in closure map. Currently not supported."
-                )
-            _logger.debug("Building tree map")
-            for group in groups:
-                mapping = group.element
-                subsumption_map = collections.defaultdict(list)  # Dict of lists
-                for item in mapping:
-                    for target in item.target:
-                        if target.code is not None:
-                            subsumption_map[item.code].append(target.code)
-                        else:
-                            _logger.warning(
-                                f"Coding [system={group.source}, code={item.code}] "
-                                f"has no target coding for system '{group.target}' and will not be "
-                                f"added [equivalence={target.equivalence}, "
-                                f"comment='{target.comment}']"
-                            )
-                # subsumption_map = {item['code']: [target['code'] for target in item['target']] for item in
-                #                   subsumption_map if 'code' in item}
-                for _, parents in subsumption_map.items():
-                    remove_non_direct_ancestors(parents, subsumption_map)
-                for (
-                    node,
-                    parents,
-                ) in subsumption_map.items():
-                    treemap.entries[node].parents += parents
-                    for parent in parents:
-                        treemap.entries[parent].children.append(node)
+        ancestors = client.get_subsumption_map(term_codes).ancestors
     except Exception as e:
         _logger.error(e)
         _logger.debug("Traceback:\n", exc_info=e)
-
-    return treemap
+    _logger.debug("Building tree map")
+    return CompactTreeMap.from_hierarchy(term_codes, ancestors, None, system, version)
 
 
 def generate_dse_mapping_trees(
@@ -302,11 +267,12 @@ def generate_dse_mapping_trees(
     # Generate mapping tree for each code system
     _logger.info("Generating mapping tree")
     tree_maps = []
+    client = CohortSelectionTerminologyClient(project)
     for system, version_map in code_systems.items():
         for version, concept_set in version_map.items():
             _logger.info(f"Generating tree map [system='{system}',version='{version}']")
             tree_maps.append(
-                generate_cs_tree_map(system, version, concept_set, project)
+                generate_cs_tree_map(system, version, concept_set, project, client)
             )
 
     return [tree_map.to_dict() for tree_map in tree_maps]
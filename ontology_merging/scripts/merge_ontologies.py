@@ -12,7 +12,7 @@ from cohort_selection_ontology.model.ui_data import (
 from common.util.http.terminology.client import FhirTerminologyClient
 from common.util.log.functions import get_logger
 from common.util.project import Project
-from common.util.sql.merging import SqlMerger
+from common.util.sql.merging import SqlMerger, DumpMerger
 
 logger = get_logger(__file__)
 
@@ -24,6 +24,12 @@ def configure_args_parser():
     arg_parser.add_argument("--merge_mappings", action="store_true")
     arg_parser.add_argument("--merge_uitrees", action="store_true")
     arg_parser.add_argument("--merge_sqldump", action="store_true")
+    arg_parser.add_argument(
+        "--sqldump_merger",
+        choices=["postgres", "python"],
+        default="postgres",
+        help="Merge the SQL dumps using a PostgreSQL container (default) or in Python without requiring Docker",
+    )
     arg_parser.add_argument("--merge_dse", action="store_true")
     arg_parser.add_argument(
         "-p",
@@ -226,7 +232,10 @@ if __name__ == "__main__":
 
             sql_script_index += 1
 
-        sql_merger = SqlMerger(sql_script_dir=output_sql_script_dir)
+        if args.sqldump_merger == "python":
+            sql_merger = DumpMerger(sql_script_dir=output_sql_script_dir)
+        else:
+            sql_merger = SqlMerger(sql_script_dir=output_sql_script_dir)
         sql_merger.execute_merge()
         sql_merger.shutdown()
 
@@ -0,0 +1,52 @@
+import random
+from typing import Dict, List
+
+
+def generate_poly_hierarchy(
+    size: int, max_parents: int = 3, fan_out: int = 3, seed: int = 42
+) -> Dict[str, List[str]]:
+    """
+    Generates a random rooted poly-hierarchy resembling the shape of SNOMED CT, i.e. a shallow and wide DAG in which
+    most concepts have a single parent and some have multiple parents located at similar depths
+
+    :param size: Number of concepts
+    :param max_parents: Maximum number of parents per concept
+    :param fan_out: Average number of children per concept
+    :param seed: Seed of the random number generator
+    :return: Maps each concept code to the codes of its direct parents
+    """
+    rng = random.Random(seed)
+    parents: Dict[str, List[str]] = {"0": []}
+    ancestors: List[set] = [set()]
+    for i in range(1, size):
+        # Concepts are created breadth-first such that the primary parent lies roughly one level above
+        primary = rng.randrange(max(0, i // fan_out - fan_out), max(1, i // fan_out))
+        candidates = {primary}
+        for _ in range(
+            rng.choices(range(max_parents), weights=[16, 3, 1][:max_parents])[0]
+        ):
+            candidates.add(rng.randrange(max(0, primary - 4 * fan_out), primary + 1))
+        # Parents subsuming other parents are dropped to keep the hierarchy transitively reduced
+        node_ancestors = set().union(*(ancestors[c] for c in candidates))
+        node_parents = sorted(c for c in candidates if c not in node_ancestors)
+        ancestors.append(node_ancestors | candidates)
+        parents[str(i)] = [str(p) for p in node_parents]
+    return parents
+
+
+def transitive_closure(parents: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """
+    Computes all ancestors of each concept. Relies on parents having a smaller numeric code than their children as
+    produced by `generate_poly_hierarchy`
+
+    :param parents: Maps each concept code to the codes of its direct parents
+    :return: Maps each concept code with at least one ancestor to the codes of all of its ancestors
+    """
+    ancestors: Dict[str, set] = {}
+    for code in sorted(parents.keys(), key=int):
+        s = set()
+        for p in parents[code]:
+            s.add(p)
+            s.update(ancestors[p])
+        ancestors[code] = s
+    return {code: sorted(s, key=int) for code, s in ancestors.items() if s}
@@ -0,0 +1,102 @@
+"""
+Benchmarks writing the UI profile tables of a synthetic module to PostgreSQL using batched statements and bulk loading
+via COPY. Requires Docker.
+
+Usage: python -m tests.benchmark.database_writer [--size N] [--profiles N]
+"""
+
+import argparse
+import time
+from typing import Dict, Tuple
+
+import docker
+
+from cohort_selection_ontology.model.ui_data import TermCode
+from cohort_selection_ontology.model.ui_profile import UIProfile
+from cohort_selection_ontology.util.database import DataBaseWriter
+from common.constants.docker import POSTGRES_IMAGE
+
+
+def generate_module(
+    size: int, profiles: int
+) -> Tuple[Dict[Tuple[TermCode, TermCode], str], Dict[str, UIProfile]]:
+    """
+    Generates the contextualized term code to UI profile mapping of a synthetic module
+
+    :param size: Number of contextualized term codes
+    :param profiles: Number of UI profiles
+    :return: Mapping of contextualized term codes to UI profile names and UI profiles keyed by name
+    """
+    contexts = [
+        TermCode(
+            system="fdpg.mii.benchmark", code=f"Context{i}", display=f"Context {i}"
+        )
+        for i in range(10)
+    ]
+    named_ui_profiles = {
+        f"Profile{i}": UIProfile(name=f"Profile {i}") for i in range(profiles)
+    }
+    mapping = {
+        (
+            contexts[i % len(contexts)],
+            TermCode(
+                system="http://snomed.info/sct",
+                code=str(100000 + i),
+                display=f"Concept {i}",
+                version="http://snomed.info/sct/900000000000207008/version/20240701",
+            ),
+        ): f"Profile{i % profiles}"
+        for i in range(size)
+    }
+    return mapping, named_ui_profiles
+
+
+def measure(name: str, port: int, bulk_load: bool, mapping, named_ui_profiles) -> int:
+    writer = DataBaseWriter(port, bulk_load=bulk_load)
+    for table in ["contextualized_termcode", "ui_profile", "termcode", "context"]:
+        writer.cursor.execute(f"TRUNCATE {table} RESTART IDENTITY CASCADE;")
+    writer.db_connection.commit()
+    start = time.perf_counter()
+    writer.write_ui_profiles_to_db(mapping, named_ui_profiles)
+    duration = time.perf_counter() - start
+    writer.cursor.execute("SELECT COUNT(*) FROM contextualized_termcode;")
+    count = writer.cursor.fetchone()[0]
+    print(f"{name:<16} {duration:>10.3f}s ({count} contextualized term codes)")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--profiles", type=int, default=50)
+    args = parser.parse_args()
+
+    mapping, named_ui_profiles = generate_module(args.size, args.profiles)
+    client = docker.from_env()
+    container = client.containers.run(
+        POSTGRES_IMAGE,
+        detach=True,
+        ports={"5432/tcp": None},
+        name="benchmark_database_writer",
+        environment={
+            "POSTGRES_USER": "codex-postgres",
+            "POSTGRES_PASSWORD": "codex-password",
+            "POSTGRES_DB": "codex_ui",
+        },
+    )
+    try:
+        container.reload()
+        port = int(container.ports["5432/tcp"][0]["HostPort"])
+        expected = measure("COPY", port, True, mapping, named_ui_profiles)
+        assert expected == args.size
+        assert (
+            measure("execute_batch", port, False, mapping, named_ui_profiles)
+            == expected
+        )
+    finally:
+        container.stop()
+        container.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmarks the computation of descendant-or-self counts on a synthetic SNOMED CT-sized poly-hierarchy.
+
+Usage: python -m tests.benchmark.descendant_count [--size N] [--fan-out N] [--seed N]
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Dict, Set, Tuple, Optional
+
+from cohort_selection_ontology.model.tree_map import (
+    CompactTreeMap,
+    TreeMap,
+    get_descendant_or_self_count_map,
+)
+from cohort_selection_ontology.model.ui_data import TermCode
+from tests.benchmark.dag import generate_poly_hierarchy, transitive_closure
+
+_SYSTEM = "http://example.org"
+
+
+def baseline(tree_map: TreeMap) -> Dict[str, int]:
+    """
+    Previous implementation merging sets of descendant codes while recursively traversing upwards from the leaves
+    """
+
+    def traverse_parent(
+        parent_key: str,
+        descendants: Set[str],
+        count_map: Dict[str, Tuple[int, Set[str]] | int],
+    ):
+        parent = tree_map.entries[parent_key]
+        if parent_key not in count_map:
+            visits = 0
+            p_descendants = {parent_key}
+        else:
+            visits, p_descendants = count_map[parent_key]
+        visits += 1
+        p_descendants.update(descendants)
+        if len(parent.children) <= visits:
+            count_map[parent_key] = len(p_descendants)
+            for p_parent_key in parent.parents:
+                traverse_parent(p_parent_key, p_descendants, count_map)
+        else:
+            count_map[parent_key] = (visits, p_descendants)
+
+    m = {}
+    for k, v in tree_map.entries.items():
+        if len(v.children) == 0:
+            m[k] = 1
+            for p_key in v.parents:
+                traverse_parent(p_key, {k}, m)
+    return m
+
+
+def measure(name: str, fn, tree_map) -> Optional[Dict[str, int]]:
+    start = time.perf_counter()
+    try:
+        result = fn(tree_map)
+    except RecursionError:
+        print(f"{name:<24} {'recursion limit exceeded':>26}")
+        return None
+    duration = time.perf_counter() - start
+    # Memory is traced in a separate run since tracing distorts the timing of allocation-heavy code
+    tracemalloc.start()
+    fn(tree_map)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<24} {duration:>10.3f}s {peak / 2**20:>10.1f} MiB (peak)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=350000)
+    parser.add_argument("--fan-out", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    parents = generate_poly_hierarchy(args.size, fan_out=args.fan_out, seed=args.seed)
+    term_codes = [
+        TermCode(system=_SYSTEM, code=code, display=code, version="1")
+        for code in parents
+    ]
+    compact = CompactTreeMap.from_hierarchy(
+        term_codes, transitive_closure(parents), None, _SYSTEM, "1"
+    )
+    tree_map = compact.to_tree_map()
+    print(
+        f"Poly-hierarchy of {args.size} concepts with "
+        f"{sum(len(p) for p in parents.values())} parent relationships"
+    )
+
+    expected = measure("traverse_parent", baseline, tree_map)
+    for name, instance in [
+        ("bitset (TreeMap)", tree_map),
+        ("bitset (CompactTreeMap)", compact),
+    ]:
+        result = measure(name, get_descendant_or_self_count_map, instance)
+        assert expected is None or result == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmarks the computation of direct parents from closure maps on a synthetic SNOMED CT-sized poly-hierarchy.
+
+Usage: python -m tests.benchmark.transitive_reduction [--size N] [--fan-out N] [--seed N]
+"""
+
+import argparse
+import time
+from typing import List
+
+from common.util.collections.graph import transitive_reduction
+from tests.benchmark.dag import generate_poly_hierarchy, transitive_closure
+
+
+def remove_non_direct_ancestors(parents: List[str], input_map: dict):
+    """
+    Previous implementation scanning the ancestor lists pairwise
+    """
+    if len(parents) < 2:
+        return
+    parents_copy = parents.copy()
+    for parent in parents_copy:
+        if parent in input_map:
+            parent_parents = input_map[parent]
+            for elem in parents_copy:
+                if elem in parent_parents and elem in parents:
+                    parents.remove(elem)
+
+
+def baseline(closure: dict) -> dict:
+    # The previous implementation mutates the closure map it operates on
+    subsumption_map = {code: list(ancestors) for code, ancestors in closure.items()}
+    for _, parents in subsumption_map.items():
+        remove_non_direct_ancestors(parents, subsumption_map)
+    return subsumption_map
+
+
+def measure(name: str, fn, closure: dict) -> dict:
+    start = time.perf_counter()
+    result = fn(closure)
+    print(f"{name:<24} {time.perf_counter() - start:>10.3f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=350000)
+    parser.add_argument("--fan-out", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    parents = generate_poly_hierarchy(args.size, fan_out=args.fan_out, seed=args.seed)
+    closure = transitive_closure(parents)
+    closure_size = sum(len(a) for a in closure.values())
+    print(
+        f"Closure of {args.size} concepts holds {closure_size} ancestor relationships "
+        f"(max. {max(len(a) for a in closure.values())} per concept)"
+    )
+
+    expected = {c: p for c, p in parents.items() if p}
+    assert measure("transitive_reduction", transitive_reduction, closure) == expected
+    assert measure("remove_non_direct", baseline, closure) == expected
+
+
+if __name__ == "__main__":
+    main()
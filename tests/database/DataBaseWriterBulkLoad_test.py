@@ -0,0 +1,227 @@
+import unittest
+from typing import Dict, List, Optional, Tuple
+
+import docker
+import psycopg2.extras
+
+from cohort_selection_ontology.model.ui_data import TermCode
+from cohort_selection_ontology.model.ui_profile import UIProfile
+from cohort_selection_ontology.util.database import DataBaseWriter, UIProfileWriter
+from common.constants.docker import POSTGRES_IMAGE
+from tests.util.DumpMerger_test import _docker_available
+
+_CONTEXT_1 = TermCode(system="fdpg.mii.test", code="Context1", display="Context 1")
+_CONTEXT_2 = TermCode(
+    system="fdpg.mii.test", code="Context2", display="Context 2", version="1.0.0"
+)
+_TERM_CODE_1 = TermCode(system="http://snomed.info/sct", code="1", display="One")
+_TERM_CODE_2 = TermCode(
+    system="http://snomed.info/sct", code="2", display="Two", version="2024"
+)
+_TERM_CODE_3 = TermCode(system="http://loinc.org", code="3-3", display="Three")
+
+# The second module re-links an existing contextualized term code to another UI profile and references codes
+# inserted while writing the first module
+_MODULES: List[Tuple[Dict[Tuple[TermCode, TermCode], str], Dict[str, UIProfile]]] = [
+    (
+        {
+            (_CONTEXT_1, _TERM_CODE_1): "Profile1",
+            (_CONTEXT_1, _TERM_CODE_2): "Profile2",
+            (_CONTEXT_2, _TERM_CODE_1): "Profile1",
+        },
+        {
+            "Profile1": UIProfile(name="Profile 1"),
+            "Profile2": UIProfile(name="Profile 2"),
+        },
+    ),
+    (
+        {
+            (_CONTEXT_1, _TERM_CODE_1): "Profile3",
+            (_CONTEXT_2, _TERM_CODE_3): "Profile3",
+        },
+        {"Profile3": UIProfile(name="Profile 3")},
+    ),
+]
+
+
+class _RowByRowWriter(UIProfileWriter):
+    """
+    Writes rows with the statements `DataBaseWriter` issued before bulk loading and in-memory ID resolution were
+    introduced, i.e. one statement per row with every foreign key looked up by a sub-select
+    """
+
+    def __init__(self, writer: DataBaseWriter):
+        # Keep the writer alive since it closes the connection once it is garbage collected
+        self.writer = writer
+        self.db_connection = writer.db_connection
+        self.cursor = writer.cursor
+
+    def __insert_codes(self, table: str, codes: List[TermCode]):
+        values = set(
+            (code.system, code.code, code.version if code.version else "", code.display)
+            for code in codes
+        )
+        psycopg2.extras.execute_batch(
+            self.cursor,
+            f"INSERT INTO {table} (system, code, version, display) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT DO NOTHING",
+            values,
+        )
+        self.db_connection.commit()
+
+    def insert_term_codes(self, term_codes: List[TermCode]):
+        self.__insert_codes("termcode", term_codes)
+
+    def insert_context_codes(self, context_codes: List[TermCode]):
+        self.__insert_codes("context", context_codes)
+
+    def insert_ui_profiles(self, named_ui_profile: Dict[str, UIProfile]):
+        psycopg2.extras.execute_batch(
+            self.cursor,
+            "INSERT INTO ui_profile (name , ui_profile) VALUES (%s, %s)",
+            [(name, profile.to_json()) for name, profile in named_ui_profile.items()],
+        )
+        self.db_connection.commit()
+
+    def link_contextualized_term_code_to_ui_profile(
+        self, contextualized_term_codes: List[Tuple[TermCode, TermCode, str]]
+    ):
+        values = [
+            (
+                self.calculate_context_term_code_hash(context, term_code),
+                context.system,
+                context.code,
+                context.version if context.version else "",
+                term_code.system,
+                term_code.code,
+                term_code.version if term_code.version else "",
+                ui_profile_name,
+            )
+            for context, term_code, ui_profile_name in contextualized_term_codes
+        ]
+        psycopg2.extras.execute_batch(
+            self.cursor,
+            """
+            INSERT INTO contextualized_termcode (context_termcode_hash, context_id, termcode_id, ui_profile_id)
+            SELECT %s, C.id, T.id, U.id
+            FROM
+                (SELECT id FROM context WHERE system = %s AND code = %s AND version = %s) C,
+                (SELECT id FROM termcode WHERE system = %s AND code = %s AND version = %s) T,
+                (SELECT id FROM ui_profile WHERE name = %s) U
+            ON CONFLICT (context_termcode_hash)
+            DO UPDATE SET ui_profile_id = EXCLUDED.ui_profile_id;
+            """,
+            values,
+        )
+        self.db_connection.commit()
+
+
+@unittest.skipUnless(_docker_available(), "Docker is not available")
+class DataBaseWriterBulkLoadTest(unittest.TestCase):
+    container = None
+    port = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.container = docker.from_env().containers.run(
+            POSTGRES_IMAGE,
+            detach=True,
+            ports={"5432/tcp": None},
+            name="test_db_bulk_load",
+            environment={
+                "POSTGRES_USER": "codex-postgres",
+                "POSTGRES_PASSWORD": "codex-password",
+                "POSTGRES_DB": "codex_ui",
+            },
+        )
+        cls.container.reload()
+        cls.port = int(cls.container.ports["5432/tcp"][0]["HostPort"])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.container.stop()
+        cls.container.remove()
+
+    def setUp(self):
+        writer = DataBaseWriter(self.port, bulk_load=False)
+        for table in ["contextualized_termcode", "ui_profile", "termcode", "context"]:
+            writer.cursor.execute(f"TRUNCATE {table} RESTART IDENTITY CASCADE;")
+        writer.db_connection.commit()
+
+    def _snapshot(self) -> dict:
+        """
+        Reads the written tables with foreign keys replaced by natural keys since IDs depend on the insertion order
+        """
+        writer = DataBaseWriter(self.port, bulk_load=False)
+        snapshot = {}
+        for table in ["context", "termcode"]:
+            writer.cursor.execute(
+                f"SELECT system, code, version, display FROM {table} ORDER BY system, code, version"
+            )
+            snapshot[table] = writer.cursor.fetchall()
+        writer.cursor.execute(
+            "SELECT name, ui_profile::TEXT FROM ui_profile ORDER BY name"
+        )
+        snapshot["ui_profile"] = writer.cursor.fetchall()
+        writer.cursor.execute("""
+            SELECT ct.context_termcode_hash, c.system, c.code, c.version, t.system, t.code, t.version, u.name
+            FROM contextualized_termcode ct
+            JOIN context c ON c.id = ct.context_id
+            JOIN termcode t ON t.id = ct.termcode_id
+            JOIN ui_profile u ON u.id = ct.ui_profile_id
+            ORDER BY ct.context_termcode_hash
+            """)
+        snapshot["contextualized_termcode"] = writer.cursor.fetchall()
+        return snapshot
+
+    def _write_modules(self, bulk_load: Optional[bool] = None) -> dict:
+        # Each module is written by a new writer like in separate runs such that codes inserted by a previous writer
+        # have to be resolved
+        for mapping, named_ui_profiles in _MODULES:
+            writer = DataBaseWriter(self.port, bulk_load=bool(bulk_load))
+            if bulk_load is None:
+                writer = _RowByRowWriter(writer)
+            writer.write_ui_profiles_to_db(mapping, named_ui_profiles)
+        return self._snapshot()
+
+    def test_matches_row_by_row_writer(self):
+        expected = self._write_modules()
+        self.assertEqual(3, len(expected["ui_profile"]))
+        self.assertEqual(
+            {
+                (
+                    UIProfileWriter.calculate_context_term_code_hash(
+                        _CONTEXT_1, _TERM_CODE_1
+                    ),
+                    "Profile3",
+                ),
+                (
+                    UIProfileWriter.calculate_context_term_code_hash(
+                        _CONTEXT_1, _TERM_CODE_2
+                    ),
+                    "Profile2",
+                ),
+                (
+                    UIProfileWriter.calculate_context_term_code_hash(
+                        _CONTEXT_2, _TERM_CODE_1
+                    ),
+                    "Profile1",
+                ),
+                (
+                    UIProfileWriter.calculate_context_term_code_hash(
+                        _CONTEXT_2, _TERM_CODE_3
+                    ),
+                    "Profile3",
+                ),
+            },
+            {(row[0], row[-1]) for row in expected["contextualized_termcode"]},
+        )
+
+        for bulk_load in [True, False]:
+            with self.subTest(bulk_load=bulk_load):
+                self.setUp()
+                self.assertEqual(expected, self._write_modules(bulk_load))
+
+
+if __name__ == "__main__":
+    unittest.main()
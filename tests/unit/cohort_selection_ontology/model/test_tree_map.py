@@ -8,8 +8,11 @@ from cohort_selection_ontology.model.tree_map import (
     ContextualizedTermCodeInfo,
     TreeMap,
     TermEntryNode,
+    CompactTreeMap,
 )
 from cohort_selection_ontology.model.ui_data import TermCode, Module
+from common.util.collections.graph import transitive_reduction
+from tests.benchmark.dag import generate_poly_hierarchy, transitive_closure
 
 ########################################################################################################################
 # ... ContextualizedTermCodeInfoListTest ...............................................................................
@@ -615,3 +618,94 @@ def test_update_descendant_count(
 
 
 ########################################################################################################################
+
+
+def _tree_map_from_hierarchy(
+    term_codes: list[TermCode], ancestors: Mapping[str, list[str]]
+) -> TreeMap:
+    tree_map = TreeMap(
+        entries={t.code: TermEntryNode(term_code=t) for t in term_codes},
+        context=_TEST_CONTEXT,
+        system="http://example.org",
+        version="1",
+    )
+    for node, parents in transitive_reduction(ancestors).items():
+        tree_map.entries[node].parents += parents
+        for parent in parents:
+            tree_map.entries[parent].children.append(node)
+    return tree_map
+
+
+def test_compact_tree_map_from_hierarchy():
+    term_codes = [
+        TermCode(system="http://example.org", code=c, display=c)
+        for c in ["a", "b", "c", "d"]
+    ]
+
+    tree_map = CompactTreeMap.from_hierarchy(
+        term_codes, {"b": ["a"], "c": ["a"], "d": ["a", "b", "c"]}
+    )
+
+    assert [e.to_ui_tree_entry() for e in tree_map.entries.values()] == [
+        {"key": "a", "parents": [], "children": ["b", "c"]},
+        {"key": "b", "parents": ["a"], "children": ["d"]},
+        {"key": "c", "parents": ["a"], "children": ["d"]},
+        {"key": "d", "parents": ["b", "c"], "children": []},
+    ]
+
+
+def test_compact_tree_map_matches_tree_map():
+    parents = generate_poly_hierarchy(500)
+    term_codes = [
+        TermCode(system="http://example.org", code=c, display=c.upper(), version="1")
+        for c in parents
+    ]
+    ancestors = transitive_closure(parents)
+    tree_map = _tree_map_from_hierarchy(term_codes, ancestors)
+
+    compact = CompactTreeMap.from_hierarchy(
+        term_codes, ancestors, _TEST_CONTEXT, "http://example.org", "1"
+    )
+
+    assert compact.to_dict() == tree_map.to_dict()
+    assert compact.to_tree_map().to_dict() == tree_map.to_dict()
+    assert (
+        CompactTreeMap.from_entries(
+            tree_map.entries.values(), _TEST_CONTEXT, "http://example.org", "1"
+        ).to_dict()
+        == tree_map.to_dict()
+    )
+    for code, entry in tree_map.entries.items():
+        compact_entry = compact.entries[code]
+        assert compact_entry.term_code == entry.term_code
+        assert compact_entry.to_ui_tree_entry() == entry.to_ui_tree_entry()
+    assert "unknown" not in compact.entries
+
+
+def test_update_descendant_count_compact_tree_map():
+    parents = generate_poly_hierarchy(300)
+    term_codes = [
+        TermCode(system="http://example.org", code=c, display=c, version="1")
+        for c in parents
+    ]
+    ancestors = transitive_closure(parents)
+    tree_map = _tree_map_from_hierarchy(term_codes, ancestors)
+    compact = CompactTreeMap.from_hierarchy(
+        term_codes, ancestors, _TEST_CONTEXT, "http://example.org", "1"
+    )
+
+    counts = []
+    for tree_maps in [[tree_map], [compact]]:
+        instance = ContextualizedTermCodeInfoList(
+            entries=[
+                ContextualizedTermCodeInfo(
+                    term_code=t, context=_TEST_CONTEXT, module=_TEST_MODULE
+                )
+                for t in term_codes
+            ]
+        )
+        instance.update_descendant_count(
+            TreeMapList(module_name=_TEST_MODULE.code, entries=tree_maps)
+        )
+        counts.append([e.children_count for e in instance.entries])
+    assert counts[0] == counts[1]
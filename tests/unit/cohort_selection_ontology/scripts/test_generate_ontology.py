@@ -0,0 +1,99 @@
+import json
+import logging
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from cohort_selection_ontology.scripts import generate_ontology
+from common.util.log import LOGGING_DIR
+from common.util.project import Project
+
+_MODULES = ["a", "b"]
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Project:
+    modules_dir = tmp_path / "input" / "cohort_selection_ontology" / "modules"
+    for module in _MODULES:
+        (modules_dir / module).mkdir(parents=True)
+        with open(
+            modules_dir / module / "required_packages.json",
+            mode="w",
+            encoding="utf-8",
+        ) as f:
+            json.dump({}, f)
+    # Lacks the `required_packages.json` file and thus fails
+    (modules_dir / "broken").mkdir()
+    return Project(path=tmp_path)
+
+
+def _log_files() -> list[Path]:
+    return [
+        Path(h.baseFilename)
+        for h in logging.getLogger().handlers
+        if isinstance(h, logging.FileHandler)
+        and Path(h.baseFilename).parent == LOGGING_DIR
+    ]
+
+
+def test_generate_modules_in_parallel(project: Project, monkeypatch):
+    failed = []
+    original = generate_ontology.generate_modules_in_parallel
+
+    def generate_modules_in_parallel(*args):
+        failed.extend(original(*args))
+        return failed
+
+    monkeypatch.setattr(generate_ontology, "Project", lambda name: project)
+    monkeypatch.setattr(
+        generate_ontology, "generate_modules_in_parallel", generate_modules_in_parallel
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        # Workers inherit the script name which determines the name of the log file
+        [sys.argv[0], "--project", "test", "--jobs", "2", "--module"]
+        + _MODULES
+        + ["broken"],
+    )
+    marker = "Logged before the workers were started"
+    logging.getLogger().warning(marker)
+
+    generate_ontology.main()
+
+    assert failed == ["broken"]
+    for module in _MODULES:
+        assert (project.output.cso / "modules" / module / "ui-trees").is_dir()
+    # Spawned workers must not truncate the log file of the parent process
+    assert _log_files()
+    for log_file in _log_files():
+        with open(log_file, mode="r", encoding="utf-8", errors="replace") as f:
+            assert marker in f.read()
+
+
+def test_container_is_removed_if_dump_fails(project: Project, monkeypatch):
+    container = MagicMock()
+    monkeypatch.setattr(
+        generate_ontology, "manage_docker_container", lambda *args, **kwargs: container
+    )
+    monkeypatch.setattr(generate_ontology, "DataBaseWriter", MagicMock())
+
+    def dump_database(*args):
+        raise RuntimeError("pg_dump failed")
+
+    monkeypatch.setattr(generate_ontology, "dump_database", dump_database)
+    args = generate_ontology.configure_args_parser().parse_args(
+        [
+            "--project",
+            "test",
+            "--generate_ui_profiles",
+            "--database_backend",
+            "postgres",
+        ]
+    )
+    # UI profile generation fails as well since the stub module lacks any profiles
+    assert not generate_ontology.generate_module(_MODULES[0], args, project)
+    container.stop.assert_called_once()
+    container.remove.assert_called_once()
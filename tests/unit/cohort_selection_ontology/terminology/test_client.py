@@ -0,0 +1,206 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+from pytest_httpserver import HTTPServer
+from werkzeug import Request, Response
+
+from cohort_selection_ontology.core.terminology import client as client_module
+from cohort_selection_ontology.core.terminology.client import (
+    CohortSelectionTerminologyClient,
+)
+from cohort_selection_ontology.core.terminology.closure import SubsumptionMap
+from cohort_selection_ontology.model.ui_data import TermCode
+from common.util.http.recording import ExchangeArchive
+from common.util.http.terminology.client import FhirTerminologyClient
+from common.util.http.terminology.expansion import ExpansionConcept
+from common.util.project import Project
+
+_VS_URL = "http://example.org/fhir/ValueSet/test"
+_EXPANSION = {
+    "resourceType": "ValueSet",
+    "url": _VS_URL,
+    "expansion": {
+        "contains": [
+            {"system": "http://example.org", "code": "b", "display": "BETA"},
+            {"system": "http://example.org", "code": "a", "display": "Alpha"},
+        ]
+    },
+}
+
+
+@pytest.fixture
+def replay_project(tmp_path: Path, httpserver: HTTPServer, monkeypatch) -> Project:
+    archive_path = tmp_path / "recording.ndjson.gz"
+    httpserver.expect_request("/fhir/ValueSet/$expand").respond_with_json(_EXPANSION)
+    archive = ExchangeArchive(archive_path, mode="record")
+    client = FhirTerminologyClient(httpserver.url_for("/fhir"), archive=archive)
+    client.expand_value_set(_VS_URL)
+    archive.flush()
+    httpserver.clear()
+
+    with open(tmp_path / "config.yml", mode="w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "terminology": {
+                    "recording": {"mode": "replay", "archive": archive_path.name}
+                }
+            },
+            f,
+        )
+    # No server is configured neither via the environment nor the `.env` file
+    monkeypatch.setattr("common.util.project.dotenv.load_dotenv", lambda: None)
+    monkeypatch.delenv("ONTOLOGY_SERVER_ADDRESS", raising=False)
+    return Project(path=tmp_path)
+
+
+def _write_config(project_dir: Path, mode: str, archive_name: str):
+    project_dir.mkdir(parents=True, exist_ok=True)
+    with open(project_dir / "config.yml", mode="w", encoding="utf-8") as f:
+        json.dump(
+            {"terminology": {"recording": {"mode": mode, "archive": archive_name}}}, f
+        )
+
+
+def _closure_handler(request: Request) -> Response:
+    parameters = json.loads(request.get_data())["parameter"]
+    concepts = [p["valueCoding"]["code"] for p in parameters if p["name"] == "concept"]
+    concept_map = {"resourceType": "ConceptMap", "status": "active"}
+    if "a" in concepts and "b" in concepts:
+        concept_map["group"] = [
+            {
+                "source": "http://example.org",
+                "target": "http://example.org",
+                "element": [
+                    {"code": "a", "target": [{"code": "b", "equivalence": "subsumes"}]}
+                ],
+            }
+        ]
+    return Response(json.dumps(concept_map), content_type="application/fhir+json")
+
+
+def _batch_handler(request: Request) -> Response:
+    entries = []
+    for entry in json.loads(request.get_data())["entry"]:
+        parameters = {p["name"]: p for p in entry["resource"]["parameter"]}
+        if parameters["system"]["valueUri"] == "http://loinc.org":
+            resource = {
+                "resourceType": "Parameters",
+                "parameter": [{"name": "display", "valueString": "Loinc concept"}],
+            }
+            entries.append({"resource": resource, "response": {"status": "200 OK"}})
+        else:
+            entries.append({"response": {"status": "404 Not Found"}})
+    bundle = {"resourceType": "Bundle", "type": "batch-response", "entry": entries}
+    return Response(json.dumps(bundle), content_type="application/fhir+json")
+
+
+def test_record_and_replay_run(tmp_path: Path, httpserver: HTTPServer, monkeypatch):
+    # Bundle timestamps and closure table names differ between runs but must not prevent replaying the recorded run
+    monkeypatch.setattr("common.util.project.dotenv.load_dotenv", lambda: None)
+    monkeypatch.delenv("ONTOLOGY_SERVER_ADDRESS", raising=False)
+    expansion = {
+        "resourceType": "ValueSet",
+        "url": _VS_URL,
+        "expansion": {
+            "contains": [
+                {"system": "http://example.org", "code": "a", "display": "A"},
+                {"system": "http://example.org", "code": "b", "display": "B"},
+            ]
+        },
+    }
+    httpserver.expect_request("/e2e/fhir/ValueSet/$expand").respond_with_json(expansion)
+    httpserver.expect_request("/e2e/fhir/$closure", method="POST").respond_with_handler(
+        _closure_handler
+    )
+    httpserver.expect_request("/e2e/fhir", method="POST").respond_with_handler(
+        _batch_handler
+    )
+
+    def run(client: CohortSelectionTerminologyClient):
+        tree_map = client.create_vs_tree_map(_VS_URL)
+        return (
+            tree_map.codes,
+            [list(tree_map.parent_indices(i)) for i in range(len(tree_map.codes))],
+            client.get_system_from_code("1234-5"),
+        )
+
+    record_dir = tmp_path / "record"
+    _write_config(record_dir, "record", "recording.ndjson.gz")
+    expected = run(
+        CohortSelectionTerminologyClient(
+            Project(path=record_dir), base_url=httpserver.url_for("/e2e/fhir")
+        )
+    )
+    assert expected == (["a", "b"], [[1], []], ["http://loinc.org"])
+    ExchangeArchive.shared(record_dir / "recording.ndjson.gz", "record").flush()
+    recorded = len(httpserver.log)
+    assert recorded > 0
+
+    replay_dir = tmp_path / "replay"
+    _write_config(replay_dir, "replay", "recording.ndjson.gz")
+    shutil.copy(record_dir / "recording.ndjson.gz", replay_dir / "recording.ndjson.gz")
+    # A different base URL yields fresh closure tables
+    actual = run(
+        CohortSelectionTerminologyClient(
+            Project(path=replay_dir), base_url="http://replay.invalid/e2e/fhir"
+        )
+    )
+    assert actual == expected
+    assert len(httpserver.log) == recorded
+
+
+def test_replay_without_server(replay_project: Project, httpserver: HTTPServer):
+    client = CohortSelectionTerminologyClient(replay_project)
+    assert list(client.expand_value_set(_VS_URL)) == [
+        TermCode(system="http://example.org", code="a", display="Alpha"),
+        TermCode(system="http://example.org", code="b", display="Beta"),
+    ]
+    assert len(httpserver.log) == 0
+
+
+def test_missing_server_address(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr("common.util.project.dotenv.load_dotenv", lambda: None)
+    monkeypatch.delenv("ONTOLOGY_SERVER_ADDRESS", raising=False)
+    with pytest.raises(ValueError):
+        CohortSelectionTerminologyClient(Project(path=tmp_path))
+
+
+def test_expansion_concepts_are_materialized_lazily(tmp_path: Path, monkeypatch):
+    client = CohortSelectionTerminologyClient(
+        Project(path=tmp_path), base_url="http://example.org/fhir"
+    )
+    concepts = [
+        ExpansionConcept("http://example.org", "c", "gamma", "1"),
+        ExpansionConcept("http://example.org", "a", "ALPHA", "1"),
+        ExpansionConcept("http://example.org", "b", None, "1"),
+        ExpansionConcept("http://example.org", "a", "Duplicate", "1"),
+    ]
+    monkeypatch.setattr(
+        client, "iter_value_set_expansion", lambda url, version=None: iter(concepts)
+    )
+    monkeypatch.setattr(
+        client,
+        "get_subsumption_map",
+        lambda term_codes: SubsumptionMap("http://example.org", "1", {"c": ["a"]}),
+    )
+
+    assert client.expand_value_set_concepts(_VS_URL) == [
+        ExpansionConcept("http://example.org", "b", "", "1"),
+        ExpansionConcept("http://example.org", "a", "Alpha", "1"),
+        ExpansionConcept("http://example.org", "c", "gamma", "1"),
+    ]
+    assert [t.code for t in client.expand_value_set(_VS_URL)] == ["b", "a", "c"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Term code was materialized")
+
+    with monkeypatch.context() as m:
+        m.setattr(client_module, "TermCode", fail)
+        tree_map = client.create_vs_tree_map(_VS_URL)
+    assert tree_map.codes == ["b", "a", "c"]
+    assert tree_map.term_code(1) == TermCode(
+        system="http://example.org", code="a", display="Alpha", version="1"
+    )
+    assert [tree_map.codes[p] for p in tree_map.parent_indices(2)] == ["a"]
@@ -0,0 +1,110 @@
+import uuid
+from typing import Iterable, Dict, Set
+
+from fhir.resources.R4B.conceptmap import ConceptMap
+
+from cohort_selection_ontology.core.terminology.closure import ClosureManager
+from cohort_selection_ontology.model.ui_data import TermCode
+
+_SYSTEM = "http://example.org/cs"
+
+# a <- b <- c <- d, a <- e <- d
+_PARENTS: Dict[str, Set[str]] = {
+    "a": set(),
+    "b": {"a"},
+    "c": {"b"},
+    "d": {"c", "e"},
+    "e": {"a"},
+}
+
+
+def _ancestors(code: str) -> Set[str]:
+    result = set()
+    stack = list(_PARENTS[code])
+    while stack:
+        parent = stack.pop()
+        if parent not in result:
+            result.add(parent)
+            stack.extend(_PARENTS[parent])
+    return result
+
+
+class _ClosureServer:
+    """
+    Mimics the stateful `$closure` operation of a terminology server by returning only relationships involving
+    concepts that were not part of the closure table before
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, Set[str]] = {}
+        self.sent: list[list[str]] = []
+
+    def _get_base_url(self) -> str:
+        return f"http://{uuid.uuid4()}.example.org/fhir"
+
+    def create_concept_map(self) -> str:
+        name = str(uuid.uuid4())
+        self.tables[name] = set()
+        return name
+
+    def get_closure_map(
+        self, term_codes: Iterable[TermCode], closure_name: str
+    ) -> ConceptMap:
+        known = self.tables[closure_name]
+        new = [t.code for t in term_codes if t.code not in known]
+        self.sent.append(new)
+        known.update(new)
+        elements = []
+        for code in sorted(known):
+            targets = [
+                {"code": a, "equivalence": "subsumes"}
+                for a in sorted(_ancestors(code) & known)
+                if code in new or a in new
+            ]
+            if targets:
+                elements.append({"code": code, "target": targets})
+        group = {"source": _SYSTEM, "sourceVersion": "1.0.0", "element": elements}
+        return ConceptMap.model_validate(
+            {
+                "resourceType": "ConceptMap",
+                "status": "active",
+                "group": [group] if elements else [],
+            }
+        )
+
+
+def _term_codes(*codes: str) -> list[TermCode]:
+    return [TermCode(system=_SYSTEM, code=c, display=c.upper()) for c in codes]
+
+
+def test_closure_is_reused_and_extended_incrementally():
+    server = _ClosureServer()
+    manager = ClosureManager(server)
+
+    first = manager.subsumption_map(_term_codes("a", "b", "c"))
+    assert first.system == _SYSTEM
+    assert first.version == "1.0.0"
+    assert first.ancestors == {"b": ["a"], "c": ["a", "b"]}
+
+    # Only previously unknown concepts are sent and the closure table is reused
+    second = manager.subsumption_map(_term_codes("c", "d", "e"))
+    assert len(server.tables) == 1
+    assert server.sent == [["a", "b", "c"], ["d", "e"]]
+    # Ancestors are restricted to the requested concepts while transitivity via unrequested concepts is preserved
+    assert second.ancestors == {"d": ["c", "e"]}
+
+    third = manager.subsumption_map(_term_codes("a", "d"))
+    assert len(server.sent) == 2
+    assert third.ancestors == {"d": ["a"]}
+
+
+def test_closure_per_code_system_version():
+    server = _ClosureServer()
+    manager = ClosureManager(server)
+
+    manager.subsumption_map(_term_codes("a", "b"))
+    manager.subsumption_map(
+        [TermCode(system=_SYSTEM, code="a", display="A", version="2.0.0")]
+    )
+
+    assert len(server.tables) == 2
@@ -0,0 +1,94 @@
+import re
+from pathlib import Path
+
+from cohort_selection_ontology.model.ui_data import TermCode
+from cohort_selection_ontology.model.ui_profile import UIProfile
+from cohort_selection_ontology.util.sql_sink import SqlSinkWriter
+from common.util.sql.dump import copy_value
+
+_CONTEXT = TermCode(system="fdpg.mii.icu", code="Foo", display="Foo", version="1.0.0")
+_TERM_CODE_1 = TermCode(system="http://snomed.info/sct", code="123456", display="foo")
+_TERM_CODE_2 = TermCode(system="http://snomed.info/sct", code="456", display="bar")
+
+
+def _copy_rows(dump: str, table: str) -> list[list[str]]:
+    match = re.search(
+        rf"^COPY public\.{table} \([^)]*\) FROM stdin;\n(.*?)^\\\.$",
+        dump,
+        flags=re.MULTILINE | re.DOTALL,
+    )
+    assert match, f"No COPY statement for table '{table}'"
+    return [line.split("\t") for line in match.group(1).splitlines()]
+
+
+def test_copy_value():
+    assert copy_value(None) == "\\N"
+    assert copy_value("") == ""
+    assert copy_value(42) == "42"
+    assert copy_value('{\n\t"a": "b\\\\c"\r}') == '{\\n\\t"a": "b\\\\\\\\c"\\r}'
+
+
+def test_dump(tmp_path: Path):
+    writer = SqlSinkWriter()
+    writer.write_ui_profiles_to_db(
+        {
+            (_CONTEXT, _TERM_CODE_1): "FooProfile",
+            (_CONTEXT, _TERM_CODE_2): "FooProfile",
+        },
+        {"FooProfile": UIProfile(name="Foo")},
+    )
+    writer.write_ui_profiles_to_db(
+        {
+            # Conflicting display is ignored and the existing link is updated
+            (
+                _CONTEXT,
+                _TERM_CODE_2.model_copy(update={"display": "baz"}),
+            ): "BarProfile",
+            # Links to unknown UI profiles are dropped
+            (
+                _CONTEXT,
+                TermCode(system="http://loinc.org", code="1-8", display="x"),
+            ): "Unknown",
+        },
+        {"BarProfile": UIProfile(name="Bar")},
+    )
+    assert writer.termcode_exists(_TERM_CODE_1)
+    assert writer.context_exists(_CONTEXT)
+    assert writer.ui_profile_exists("BarProfile")
+
+    file = tmp_path / "R__Load_latest_ui_profile.sql"
+    writer.dump(file)
+    dump = file.read_text(encoding="utf-8")
+
+    assert "SET row_security = off;" in dump
+    assert _copy_rows(dump, "context") == [["1", "fdpg.mii.icu", "Foo", "1.0.0", "Foo"]]
+    assert _copy_rows(dump, "termcode") == [
+        ["1", "http://snomed.info/sct", "123456", "", "foo"],
+        ["2", "http://snomed.info/sct", "456", "", "bar"],
+        ["3", "http://loinc.org", "1-8", "", "x"],
+    ]
+    ui_profiles = _copy_rows(dump, "ui_profile")
+    assert [row[:2] for row in ui_profiles] == [
+        ["1", "FooProfile"],
+        ["2", "BarProfile"],
+    ]
+    assert "\n" not in ui_profiles[0][2] and "\\n" in ui_profiles[0][2]
+    assert _copy_rows(dump, "contextualized_termcode") == [
+        [
+            SqlSinkWriter.calculate_context_term_code_hash(_CONTEXT, _TERM_CODE_1),
+            "1",
+            "1",
+            "1",
+        ],
+        [
+            SqlSinkWriter.calculate_context_term_code_hash(_CONTEXT, _TERM_CODE_2),
+            "1",
+            "2",
+            "2",
+        ],
+    ]
+    assert "SELECT pg_catalog.setval('public.termcode_id_seq', 3, true);" in dump
+    # Tables referenced by foreign keys are loaded first
+    assert dump.index("COPY public.ui_profile") < dump.index(
+        "COPY public.contextualized_termcode"
+    )
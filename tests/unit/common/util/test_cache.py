@@ -0,0 +1,22 @@
+from common.util.collections.cache import MeteredLRUCache
+
+
+def test_metered_lru_cache():
+    cache = MeteredLRUCache(maxsize=10, getsizeof=len)
+    cache["a"] = "xxxx"
+    cache["b"] = "xxxx"
+    # Hits refresh the recency of an entry
+    assert cache.get("a") == "xxxx"
+    assert cache.get("c") is None
+    cache["c"] = "xxxx"
+    assert "b" not in cache
+    assert "a" in cache
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 1,
+        "hit_ratio": 0.5,
+        "entries": 2,
+        "size": 8,
+        "max_size": 10,
+    }
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from common.util.collections.graph import (
+    transitive_reduction,
+    descendant_or_self_counts,
+)
+
+
+def _brute_force_reduction(ancestors: dict) -> dict:
+    return {
+        node: [
+            a
+            for a in node_ancestors
+            if not any(a in ancestors.get(b, []) for b in node_ancestors)
+        ]
+        for node, node_ancestors in ancestors.items()
+        if node_ancestors
+    }
+
+
+def test_transitive_reduction_poly_hierarchy():
+    # a <- b <- c <- d, a <- e <- d, root 'r' has no entry of its own
+    ancestors = {
+        "a": ["r"],
+        "b": ["a", "r"],
+        "c": ["r", "b", "a"],
+        "d": ["c", "a", "e", "b", "r"],
+        "e": ["a", "r"],
+        "f": [],
+    }
+
+    assert transitive_reduction(ancestors) == {
+        "a": ["r"],
+        "b": ["a"],
+        "c": ["b"],
+        "d": ["c", "e"],
+        "e": ["a"],
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_transitive_reduction_matches_brute_force(seed: int):
+    rng = random.Random(seed)
+    size = 200
+    ancestors: dict[int, set] = {}
+    for node in range(size):
+        parents = rng.sample(range(node), min(node, rng.randint(0, 3)))
+        ancestors[node] = set(parents).union(*(ancestors[p] for p in parents))
+    closure = {node: sorted(a) for node, a in ancestors.items()}
+
+    assert transitive_reduction(closure) == _brute_force_reduction(closure)
+
+
+def test_descendant_or_self_counts():
+    # 0 <- 1 <- 3, 0 <- 2 <- 3, 3 <- 4, 5 <- 6 <- 7 <- 6 form a cycle with descendant 8 and 9 is unreachable
+    children = [[1, 2], [3], [3], [4], [], [6], [7, 8], [6], [], [9]]
+
+    assert descendant_or_self_counts(children) == [
+        5,
+        3,
+        3,
+        2,
+        1,
+        None,
+        None,
+        None,
+        1,
+        None,
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_descendant_or_self_counts_matches_brute_force(seed: int):
+    rng = random.Random(seed)
+    size = 200
+    parents = [
+        rng.sample(range(node), min(node, rng.randint(0, 3))) for node in range(size)
+    ]
+    children = [[] for _ in range(size)]
+    descendants = [{node} for node in range(size)]
+    for node in reversed(range(size)):
+        for parent in parents[node]:
+            children[parent].append(node)
+            descendants[parent] |= descendants[node]
+
+    assert descendant_or_self_counts(children) == [len(d) for d in descendants]
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+from common.constants.project import PROJECT_ROOT
+from common.util.log import functions
+
+_PROBE = "from common.util.log import functions; print(functions._is_child_process)"
+
+
+def _is_child_process() -> bool:
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, "PYTHONPATH": str(PROJECT_ROOT)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip().splitlines()[-1] == "True"
+
+
+def test_worker_processes():
+    # Scripts run via `python -c` are not workers unless started as such
+    assert not _is_child_process()
+    with functions.worker_processes():
+        with functions.worker_processes():
+            assert _is_child_process()
+        assert _is_child_process()
+    assert not _is_child_process()
@@ -0,0 +1,338 @@
+import io
+import json
+import os
+import tarfile
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+from pytest_httpserver import HTTPServer
+
+from common.util.fhir.package import manager as manager_module
+from common.util.fhir.package.manager import (
+    FhirPackageManager,
+    RepositoryPackageManager,
+    build_package_index,
+    read_package_index_file,
+    update_package_index_file,
+)
+from common.util.fhir.package.store import ResourceStore
+
+_BASE_URL = "http://example.org/fhir/StructureDefinition"
+
+
+def _struct_def(name: str, version: str, base: str | None = None) -> dict:
+    struct_def = {
+        "resourceType": "StructureDefinition",
+        "id": name,
+        "url": f"{_BASE_URL}/{name}",
+        "version": version,
+        "name": name,
+        "status": "active",
+        "kind": "resource",
+        "abstract": False,
+        "type": "Observation",
+        "derivation": "constraint",
+        "snapshot": {"element": [{"id": "Observation", "path": "Observation"}]},
+    }
+    if base:
+        struct_def["baseDefinition"] = f"{_BASE_URL}/{base}"
+    return struct_def
+
+
+def _write_package(cache_dir: Path, name: str, version: str, *resources: dict):
+    package_dir = cache_dir / f"{name}#{version}" / "package"
+    package_dir.mkdir(parents=True)
+    with open(package_dir / "package.json", mode="w", encoding="utf-8") as f:
+        json.dump({"name": name, "version": version}, f)
+    for resource in resources:
+        with open(
+            package_dir / f"{resource['resourceType']}-{resource['id']}.json",
+            mode="w",
+            encoding="utf-8",
+        ) as f:
+            json.dump(resource, f)
+
+
+@pytest.fixture
+def package_manager(tmp_path: Path) -> FhirPackageManager:
+    _write_package(
+        tmp_path,
+        "example.a",
+        "1.0.0",
+        _struct_def("A", "1.0.0"),
+        _struct_def("B", "1.0.0", base="A"),
+    )
+    _write_package(
+        tmp_path,
+        "example.a",
+        "2.0.0",
+        _struct_def("A", "2.0.0"),
+        _struct_def("B", "2.0.0", base="A"),
+        _struct_def("C", "2.0.0", base="A"),
+    )
+    _write_package(
+        tmp_path,
+        "example.b",
+        "1.0.0",
+        _struct_def("D", "1.0.0", base="B"),
+        {
+            "resourceType": "CodeSystem",
+            "id": "cs",
+            "url": "http://example.org/fhir/CodeSystem/cs",
+            "status": "active",
+            "content": "complete",
+        },
+    )
+    manager = FhirPackageManager(tmp_path)
+    manager._update_index()
+    return manager
+
+
+def _urls_and_versions(resources) -> list[tuple[str, str]]:
+    return sorted((r.url, r.version) for r in resources)
+
+
+@pytest.mark.parametrize(
+    "index_pattern",
+    [
+        {"url": f"{_BASE_URL}/A"},
+        {"url": f"{_BASE_URL}/A", "version": "1.0.0"},
+        {"resourceType": "StructureDefinition", "baseDefinition": f"{_BASE_URL}/A"},
+        {"resourceType": "StructureDefinition", "kind": "resource"},
+        {"resourceType": "CodeSystem", "kind": None},
+        {"url": f"{_BASE_URL}/Unknown"},
+    ],
+)
+@pytest.mark.parametrize("latest_only", [True, False])
+def test_iterate_cache_with_index_matches_scan(
+    package_manager: FhirPackageManager, index_pattern, latest_only
+):
+    # Patterns with regex values are not eligible for index lookups and hence fall back to scanning the entries
+    scan_pattern = {
+        k: re.compile(re.escape(v) + "$") if isinstance(v, str) else v
+        for k, v in index_pattern.items()
+    }
+    indexed = list(package_manager.iterate_cache(None, index_pattern, latest_only))
+    scanned = list(package_manager.iterate_cache(None, scan_pattern, latest_only))
+    assert [(r.url, r.version) for r in indexed] == [
+        (r.url, r.version) for r in scanned
+    ]
+
+
+def test_find(package_manager: FhirPackageManager):
+    assert package_manager.find({"url": f"{_BASE_URL}/A"}).version == "2.0.0"
+    assert (
+        package_manager.find(
+            {"url": f"{_BASE_URL}/A", "version": "1.0.0"}, latest_only=False
+        ).version
+        == "1.0.0"
+    )
+    assert package_manager.find({"url": f"{_BASE_URL}/A", "version": "1.0.0"}) is None
+    assert package_manager.find_struct_def(f"{_BASE_URL}/D").version == "1.0.0"
+    assert _urls_and_versions(
+        package_manager.iterate_cache(
+            {"name": "example.a"},
+            {"baseDefinition": f"{_BASE_URL}/A"},
+        )
+    ) == [(f"{_BASE_URL}/B", "2.0.0"), (f"{_BASE_URL}/C", "2.0.0")]
+
+
+def test_index_is_updated_with_new_packages(
+    package_manager: FhirPackageManager, tmp_path: Path
+):
+    assert package_manager.find({"url": f"{_BASE_URL}/E"}) is None
+    _write_package(tmp_path, "example.c", "1.0.0", _struct_def("E", "1.0.0"))
+    package_manager._update_index_with_package(tmp_path / "example.c#1.0.0")
+    assert package_manager.find({"url": f"{_BASE_URL}/E"}).version == "1.0.0"
+
+
+def test_resources_are_cached(package_manager: FhirPackageManager):
+    url = f"{_BASE_URL}/A"
+    first = package_manager.find({"url": url})
+    assert package_manager.find({"url": url}) is first
+    stats = package_manager.cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert 0 < stats["size"] <= stats["max_size"]
+
+
+def test_resources_are_loaded_from_store(tmp_path: Path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    _write_package(cache_dir, "example.a", "1.0.0", _struct_def("A", "1.0.0"))
+    store_path = tmp_path / "store" / "resources.sqlite"
+    url = f"{_BASE_URL}/A"
+
+    cold = FhirPackageManager(cache_dir)
+    cold.resource_store = ResourceStore(store_path)
+    cold._update_index()
+    assert cold.find({"url": url}).name == "A"
+    cold.resource_store.close()
+
+    # A warm start with a fresh in-memory cache does not parse the file
+    def fail(*args, **kwargs):
+        raise AssertionError("Resource was parsed")
+
+    warm = FhirPackageManager(cache_dir)
+    warm.resource_store = ResourceStore(store_path)
+    warm._update_index()
+    with monkeypatch.context() as m:
+        m.setattr(manager_module, "load_json", fail)
+        struct_def = warm.find({"url": url})
+    assert struct_def.name == "A"
+    assert struct_def.get_element_by_id("Observation").path == "Observation"
+
+    # Entries are invalidated if their source file is modified
+    file_path = cache_dir / "example.a#1.0.0" / "package" / "StructureDefinition-A.json"
+    modified = _struct_def("A", "1.0.0")
+    modified["title"] = "Modified"
+    with open(file_path, mode="w", encoding="utf-8") as f:
+        json.dump(modified, f)
+    stat = file_path.stat()
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = FhirPackageManager(cache_dir)
+    reloaded.resource_store = warm.resource_store
+    reloaded._update_index()
+    assert reloaded.find({"url": url}).title == "Modified"
+
+
+def test_build_package_index(tmp_path: Path, monkeypatch):
+    _write_package(
+        tmp_path,
+        "example.a",
+        "1.0.0",
+        *(_struct_def(f"S{i}", "1.0.0", base="A") for i in range(10)),
+    )
+    package_dir = tmp_path / "example.a#1.0.0"
+    with open(package_dir / "package" / "StructureDefinition-S0.json", mode="wb") as f:
+        f.write(b"\xef\xbb\xbf" + json.dumps(_struct_def("S0", "1.0.0")).encode())
+    expected = build_package_index(package_dir)
+    entries = {e["filename"]: e for e in expected["files"]}
+    assert entries["StructureDefinition-S1.json"]["baseDefinition"] == f"{_BASE_URL}/A"
+    assert entries["StructureDefinition-S1.json"]["supplements"] is None
+    assert entries["StructureDefinition-S0.json"]["url"] == f"{_BASE_URL}/S0"
+
+    monkeypatch.setattr(manager_module, "_INDEX_PARALLEL_MIN_FILES", 1)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert build_package_index(package_dir, executor) == expected
+    monkeypatch.setattr(manager_module, "_INDEX_STREAMING_MIN_BYTES", 0)
+    assert build_package_index(package_dir) == expected
+
+
+def test_update_package_index_file(tmp_path: Path):
+    _write_package(tmp_path, "example.a", "1.0.0", _struct_def("A", "1.0.0"))
+    package_dir = tmp_path / "example.a#1.0.0"
+    index = update_package_index_file(package_dir)
+    # Temporary files are not left behind
+    assert sorted(p.name for p in (package_dir / "package").iterdir()) == [
+        ".index.json",
+        "StructureDefinition-A.json",
+        "package.json",
+    ]
+    with open(package_dir / "package" / ".index.json", encoding="utf-8") as f:
+        assert json.load(f) == index
+
+
+def test_index_file_is_reused(tmp_path: Path, monkeypatch):
+    _write_package(tmp_path, "example.a", "1.0.0", _struct_def("A", "1.0.0"))
+    package_dir = tmp_path / "example.a#1.0.0"
+    idx_path = package_dir / "package" / ".index.json"
+    index = update_package_index_file(package_dir)
+    assert read_package_index_file(package_dir) == index
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Index was rebuilt")
+
+    with monkeypatch.context() as m:
+        m.setattr(manager_module, "build_package_index", fail)
+        manager = FhirPackageManager(tmp_path)
+        manager._update_index()
+    assert manager.find({"url": f"{_BASE_URL}/A"}).version == "1.0.0"
+
+    # Index files shipped with packages lack some of the keys relied on and unreadable ones are replaced
+    for content in [
+        json.dumps({"index-version": 2, "files": index["files"]}),
+        '{"index-version": 2, "files": [',
+    ]:
+        idx_path.write_text(content, encoding="utf-8")
+        assert read_package_index_file(package_dir) is None
+        FhirPackageManager(tmp_path)._update_index()
+        assert read_package_index_file(package_dir) == index
+
+
+def test_index_is_built_serially_in_worker_processes(tmp_path: Path, monkeypatch):
+    manager = FhirPackageManager(tmp_path)
+    with manager._index_executor() as executor:
+        assert executor is not None
+    monkeypatch.setattr(
+        manager_module.multiprocessing, "parent_process", lambda: object()
+    )
+    with manager._index_executor() as executor:
+        assert executor is None
+
+
+def _package_tarball(name: str, version: str, dependencies: dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tgz_file:
+        for filename, content in [
+            (
+                "package.json",
+                {"name": name, "version": version, "dependencies": dependencies},
+            ),
+            (f"StructureDefinition-{name}.json", _struct_def(name, version)),
+        ]:
+            data = json.dumps(content).encode("utf-8")
+            info = tarfile.TarInfo(f"package/{filename}")
+            info.size = len(data)
+            tgz_file.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_repository_package_manager_install(
+    tmp_path: Path, httpserver: HTTPServer, monkeypatch
+):
+    # Packages are indexed by worker processes while downloads are still running which must therefore not be forked
+    assert manager_module._index_mp_context().get_start_method() != "fork"
+    monkeypatch.setattr(manager_module, "_INDEX_PARALLEL_MIN_FILES", 1)
+    # Dependencies shared by multiple packages are downloaded once
+    graph = {
+        "a": {"b": "1.0.0", "c": "1.0.0"},
+        "b": {"c": "1.0.0", "d": "1.0.0"},
+        "c": {"d": "1.0.0"},
+        "d": {},
+    }
+    for name, dependencies in graph.items():
+        httpserver.expect_request(f"/{name}-1.0.0.tgz").respond_with_data(
+            _package_tarball(name, "1.0.0", dependencies)
+        )
+    manager = RepositoryPackageManager(tmp_path, httpserver.url_for("/"), max_workers=3)
+    manager.install(("a", "1.0.0"))
+
+    requested = sorted(request.path for request, _ in httpserver.log)
+    assert requested == [f"/{name}-1.0.0.tgz" for name in sorted(graph)]
+    assert sorted(p.name for p in manager.cache_location().iterdir()) == [
+        f"{name}#1.0.0" for name in sorted(graph)
+    ]
+    for name in graph:
+        assert manager.has_package(name, "1.0.0")
+        assert manager.find_struct_def(f"{_BASE_URL}/{name}").version == "1.0.0"
+
+
+def test_repository_package_manager_install_missing_dependency(
+    tmp_path: Path, httpserver: HTTPServer
+):
+    httpserver.expect_request("/a-1.0.0.tgz").respond_with_data(
+        _package_tarball("a", "1.0.0", {"missing": "1.0.0"})
+    )
+    httpserver.expect_request("/missing-1.0.0.tgz").respond_with_data("", status=404)
+    manager = RepositoryPackageManager(tmp_path / "strict", httpserver.url_for("/"))
+    with pytest.raises(Exception, match="Failed to install dependency"):
+        manager.install(("a", "1.0.0"))
+
+    manager = RepositoryPackageManager(tmp_path / "lenient", httpserver.url_for("/"))
+    manager.install(("a", "1.0.0"), lenient_on_deps=True)
+    assert manager.has_package("a", "1.0.0")
+    assert not manager.has_package("missing", "1.0.0")
+    assert not (manager.cache_location() / ".tmp").exists()
@@ -0,0 +1,90 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from pytest_httpserver import HTTPServer
+from requests.exceptions import RetryError
+
+from common.config.project import HTTPConfig
+from common.util.http.exceptions import ClientError
+from common.util.http.terminology.cache import ValueSetExpansionCache
+from common.util.http.terminology.client import FhirTerminologyClient
+
+pytest.importorskip("httpx")
+
+from common.util.http.terminology.async_client import AsyncFhirTerminologyClient
+
+
+def _expansion(url: str) -> dict:
+    return {"resourceType": "ValueSet", "url": url, "expansion": {"contains": []}}
+
+
+def test_expand_value_sets_concurrently(httpserver: HTTPServer):
+    urls = [f"http://example.org/fhir/ValueSet/vs-{i}" for i in range(5)]
+    for url in urls:
+        httpserver.expect_request(
+            "/fhir/ValueSet/$expand", query_string={"url": url}
+        ).respond_with_json(_expansion(url))
+
+    async def run():
+        async with AsyncFhirTerminologyClient(
+            httpserver.url_for("/fhir"), max_concurrency=2
+        ) as client:
+            return await client.expand_value_sets(urls)
+
+    expansions = asyncio.run(run())
+
+    assert [e["url"] for e in expansions] == urls
+
+
+def test_expand_value_set_shares_cache(httpserver: HTTPServer, tmp_path: Path):
+    url = "http://example.org/fhir/ValueSet/vs"
+    httpserver.expect_request("/fhir/ValueSet/$expand").respond_with_json(
+        _expansion(url), headers={"ETag": '"v1"'}
+    )
+
+    async def run(cache: ValueSetExpansionCache):
+        async with AsyncFhirTerminologyClient(
+            httpserver.url_for("/fhir"), cache=cache
+        ) as client:
+            return await client.expand_value_set(url)
+
+    assert asyncio.run(run(ValueSetExpansionCache(tmp_path))) == _expansion(url)
+    assert asyncio.run(run(ValueSetExpansionCache(tmp_path))) == _expansion(url)
+    # Entries stored by the asynchronous client are served to the synchronous one as well
+    client = FhirTerminologyClient(
+        httpserver.url_for("/fhir"), cache=ValueSetExpansionCache(tmp_path)
+    )
+    assert client.expand_value_set(url) == _expansion(url)
+    assert len(httpserver.log) == 1
+
+    # Stale entries are revalidated using the stored validators
+    httpserver.clear()
+    httpserver.expect_request(
+        "/fhir/ValueSet/$expand", headers={"If-None-Match": '"v1"'}
+    ).respond_with_data(status=304)
+    assert asyncio.run(run(ValueSetExpansionCache(tmp_path, ttl=0))) == _expansion(url)
+    assert len(httpserver.log) == 1
+
+
+@pytest.mark.parametrize(
+    "status_code,expected_error", [(404, ClientError), (503, RetryError)]
+)
+def test_async_client_errors(
+    httpserver: HTTPServer, status_code: int, expected_error: type[Exception]
+):
+    httpserver.expect_request("/fhir/CodeSystem/$lookup").respond_with_json(
+        {}, status=status_code
+    )
+
+    async def run():
+        async with AsyncFhirTerminologyClient(
+            httpserver.url_for("/fhir"),
+            http_config=HTTPConfig(timeout=5, retries=2, backoff_factor=0),
+        ) as client:
+            await client.code_system_lookup("http://loinc.org", "1234-5")
+
+    with pytest.raises(expected_error):
+        asyncio.run(run())
+    expected_requests = 3 if status_code == 503 else 1
+    assert len(httpserver.log) == expected_requests
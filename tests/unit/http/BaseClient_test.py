@@ -1,8 +1,12 @@
+import socket
 import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 from pytest_httpserver import HTTPServer
 from requests.exceptions import RetryError
+from werkzeug import Response
 
 from common.config.project import HTTPConfig
 from common.util.http.client import BaseClient
@@ -126,3 +130,140 @@ def test_infinite_base_client(
             return
 
     assert False  # if test exited before timer runs out
+
+
+@pytest.mark.parametrize(
+    "http_config",
+    [
+        HTTPConfig(pool_connections=4, pool_maxsize=64),
+        HTTPConfig(pool_connections=4, pool_maxsize=64, keep_alive=30),
+    ],
+)
+def test_base_client_pool_config(httpserver: HTTPServer, http_config: HTTPConfig):
+    """
+    Tests whether the connection pool configuration is applied to the adapters mounted by BaseClient
+    :param httpserver: HTTPServer - fixture from pytest-httpserver
+    :param http_config: HTTPConfig - case which should be tested
+    """
+    httpserver.expect_request("/fhir/").respond_with_json({})
+    client = BaseClient(httpserver.url_for(""), http_config=http_config)
+
+    assert client.get("fhir/").ok
+    adapter = client._get_session().get_adapter(httpserver.url_for(""))
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == 64
+    assert adapter.poolmanager.pools._maxsize == 4
+    if http_config.keep_alive is not None:
+        assert (
+            socket.SOL_SOCKET,
+            socket.SO_KEEPALIVE,
+            1,
+        ) in adapter.poolmanager.connection_pool_kw["socket_options"]
+
+
+@pytest.mark.parametrize("status_code,expected_error", [(200, None), (503, RetryError)])
+def test_base_client_http2_transport(
+    httpserver: HTTPServer, status_code: int, expected_error: type[Exception] | None
+):
+    """
+    Tests the httpx-based transport (HTTP/1.1 fallback against the plain test server) including retries
+    :param httpserver: HTTPServer - fixture from pytest-httpserver
+    :param status_code: response status code from httpserver
+    :param expected_error: Expected exception type or `None` if the request should succeed
+    """
+    pytest.importorskip("httpx")
+    httpserver.expect_request("/fhir/").respond_with_json({}, status=status_code)
+    client = BaseClient(
+        httpserver.url_for(""),
+        http_config=HTTPConfig(retries=1, backoff_factor=0, http2=True),
+    )
+
+    if expected_error is None:
+        assert client.get("fhir/").json() == {}
+    else:
+        with pytest.raises(expected_error):
+            client.get("fhir/")
+
+
+def test_base_client_http2_transport_streaming(httpserver: HTTPServer):
+    """
+    Tests whether responses received via the httpx-based transport can be streamed
+    :param httpserver: HTTPServer - fixture from pytest-httpserver
+    """
+    pytest.importorskip("httpx")
+    data = bytes(range(256)) * 4096
+    httpserver.expect_request("/data").respond_with_data(data)
+    client = BaseClient(
+        httpserver.url_for(""), http_config=HTTPConfig(retries=0, http2=True)
+    )
+
+    with client.get("data", stream=True) as response:
+        response.raw.decode_content = True
+        assert response.raw.read(1000) == data[:1000]
+        assert response.raw.read() == data[1000:]
+    with client.get("data", stream=True) as response:
+        assert b"".join(response.iter_content(chunk_size=65536)) == data
+    response = client.get("data")
+    assert response.content == data
+    assert response.raw.read() == data
+
+
+@pytest.mark.parametrize("coalesce,expected_calls", [(True, 1), (False, 5)])
+def test_base_client_coalesces_concurrent_requests(
+    httpserver: HTTPServer, coalesce: bool, expected_calls: int
+):
+    """
+    Tests whether identical concurrent requests issued via different clients are collapsed into a single call
+    :param httpserver: HTTPServer - fixture from pytest-httpserver
+    :param coalesce: Whether request coalescing is enabled
+    :param expected_calls: Expected number of requests received by the server
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        time.sleep(0.5)
+        return Response('{"ok": true}', content_type="application/json")
+
+    httpserver.expect_request("/fhir/").respond_with_handler(handler)
+    http_config = HTTPConfig(retries=0, coalesce_requests=coalesce)
+    clients = [
+        BaseClient(httpserver.url_for(""), http_config=http_config) for _ in range(5)
+    ]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        responses = list(
+            executor.map(
+                lambda c: c.get("fhir/", query_params={"a": "1"}).json(), clients
+            )
+        )
+
+    assert responses == [{"ok": True}] * 5
+    assert len(calls) == expected_calls
+
+
+def test_base_client_coalesces_posts_by_body(httpserver: HTTPServer):
+    """
+    Tests whether concurrent POST requests are only collapsed if their bodies are identical
+    :param httpserver: HTTPServer - fixture from pytest-httpserver
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(request.get_data(as_text=True))
+        time.sleep(0.5)
+        return Response(request.get_data(), content_type="application/json")
+
+    httpserver.expect_request("/fhir/", method="POST").respond_with_handler(handler)
+    http_config = HTTPConfig(retries=0, coalesce_requests=True)
+    bodies = ['{"a": 1}', '{"a": 1}', '{"b": 2}']
+    clients = [
+        BaseClient(httpserver.url_for(""), http_config=http_config) for _ in bodies
+    ]
+
+    with ThreadPoolExecutor(max_workers=len(bodies)) as executor:
+        responses = list(
+            executor.map(lambda c, b: c.post("fhir/", body=b).json(), clients, bodies)
+        )
+
+    assert responses == [{"a": 1}, {"a": 1}, {"b": 2}]
+    assert sorted(calls) == ['{"a": 1}', '{"b": 2}']
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from pytest_httpserver import HTTPServer
+from werkzeug import Request, Response
+
+from common.util.http.terminology.client import FhirTerminologyClient
+from common.util.http.terminology.lookup import CodeSystemLookupEngine
+
+
+def _lookup_result(code: str) -> dict:
+    return {
+        "resourceType": "Parameters",
+        "parameter": [{"name": "display", "valueString": f"Display {code}"}],
+    }
+
+
+def _batch_handler(requests: list[dict]):
+    def handler(request: Request) -> Response:
+        bundle = json.loads(request.data)
+        requests.append(bundle)
+        entries = []
+        for entry in bundle["entry"]:
+            params = {p["name"]: p for p in entry["resource"]["parameter"]}
+            code = params["code"]["valueCode"]
+            if code == "unknown":
+                entries.append({"response": {"status": "404"}})
+            else:
+                entries.append(
+                    {"resource": _lookup_result(code), "response": {"status": "200"}}
+                )
+        return Response(
+            json.dumps(
+                {"resourceType": "Bundle", "type": "batch-response", "entry": entries}
+            ),
+            content_type="application/fhir+json",
+        )
+
+    return handler
+
+
+def test_lookups_are_deduplicated_and_batched(httpserver: HTTPServer):
+    requests = []
+    httpserver.expect_request("/fhir", method="POST").respond_with_handler(
+        _batch_handler(requests)
+    )
+    engine = CodeSystemLookupEngine(
+        FhirTerminologyClient(httpserver.url_for("/fhir")), batch_size=2
+    )
+
+    engine.request_all(
+        [
+            ("http://loinc.org", "a"),
+            ("http://loinc.org", "b"),
+            ("http://loinc.org", "a"),
+            ("http://snomed.info/sct", "unknown"),
+        ]
+    )
+    engine.resolve()
+
+    assert len(requests) == 2
+    assert sum(len(r["entry"]) for r in requests) == 3
+    assert engine.display("http://loinc.org", "a") == "Display a"
+    assert engine.display("http://loinc.org", "b") == "Display b"
+    assert engine.display("http://snomed.info/sct", "unknown") == ""
+    # All results are served from memory
+    assert len(requests) == 2
+
+
+@pytest.mark.parametrize("mode", ["batch", "concurrent"])
+def test_lookups_are_resolved_individually(httpserver: HTTPServer, mode: str):
+    httpserver.expect_request("/fhir", method="POST").respond_with_data(status=405)
+    for code in ["a", "b", "c"]:
+        httpserver.expect_request(
+            "/fhir/CodeSystem/$lookup", query_string={"system": "s", "code": code}
+        ).respond_with_json(_lookup_result(code))
+    engine = CodeSystemLookupEngine(
+        FhirTerminologyClient(httpserver.url_for("/fhir")), mode=mode, max_workers=3
+    )
+
+    engine.request_all([("s", "a"), ("s", "b"), ("s", "c")])
+    engine.resolve()
+
+    assert [engine.display("s", c) for c in ["a", "b", "c"]] == [
+        "Display a",
+        "Display b",
+        "Display c",
+    ]
@@ -0,0 +1,297 @@
+import io
+import json
+import logging
+from pathlib import Path
+
+import pytest
+
+from pytest_httpserver import HTTPServer
+from werkzeug import Request, Response
+
+from requests.exceptions import ConnectionError
+
+from common.config.project import HTTPConfig
+from common.util.http import recording
+from common.util.http.recording import ExchangeArchive
+from common.util.http.terminology import expansion
+from common.util.http.terminology.cache import ValueSetExpansionCache
+from common.util.http.terminology.client import FhirTerminologyClient
+
+_VS_URL = "http://example.org/fhir/ValueSet/test"
+_EXPANSION = {
+    "resourceType": "ValueSet",
+    "url": _VS_URL,
+    "expansion": {
+        "contains": [{"system": "http://example.org", "code": "a", "display": "A"}]
+    },
+}
+
+
+def _expand_handler(requests: list[Request], etag: str = '"v1"'):
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status=304, headers={"ETag": etag})
+        return Response(
+            json.dumps(_EXPANSION),
+            status=200,
+            headers={"ETag": etag},
+            content_type="application/fhir+json",
+        )
+
+    return handler
+
+
+def test_expand_value_set_is_served_from_cache(httpserver: HTTPServer, tmp_path: Path):
+    requests = []
+    httpserver.expect_request("/fhir/ValueSet/$expand").respond_with_handler(
+        _expand_handler(requests)
+    )
+    cache = ValueSetExpansionCache(tmp_path, ttl=3600)
+    client = FhirTerminologyClient(httpserver.url_for("/fhir"), cache=cache)
+
+    assert client.expand_value_set(_VS_URL) == _EXPANSION
+    assert client.expand_value_set(_VS_URL) == _EXPANSION
+    assert len(requests) == 1
+
+    # Another client sharing the cache directory should not hit the server either
+    other = FhirTerminologyClient(
+        httpserver.url_for("/fhir"), cache=ValueSetExpansionCache(tmp_path, ttl=3600)
+    )
+    assert other.expand_value_set(_VS_URL) == _EXPANSION
+    assert len(requests) == 1
+
+    # Different version results in a different cache entry
+    client.expand_value_set(_VS_URL, version="1.0.0")
+    assert len(requests) == 2
+
+
+def test_stale_expansion_is_revalidated(httpserver: HTTPServer, tmp_path: Path):
+    requests = []
+    httpserver.expect_request("/fhir/ValueSet/$expand").respond_with_handler(
+        _expand_handler(requests)
+    )
+    cache = ValueSetExpansionCache(tmp_path, ttl=0)
+    client = FhirTerminologyClient(httpserver.url_for("/fhir"), cache=cache)
+
+    assert client.expand_value_set(_VS_URL) == _EXPANSION
+    assert client.expand_value_set(_VS_URL) == _EXPANSION
+    assert len(requests) == 2
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers.get("If-None-Match") == '"v1"'
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path: Path):
+    cache = ValueSetExpansionCache(tmp_path, max_size=10)
+    cache.store("aa01", b"12345")
+    cache.store("bb02", b"12345")
+    cache.lookup("aa01")
+    cache.store("cc03", b"12345")
+
+    assert cache.lookup("aa01")[0] == b"12345"
+    assert cache.lookup("bb02")[0] is None
+    assert cache.lookup("cc03")[0] == b"12345"
+    assert cache.size == 10
+
+
+_LARGE_EXPANSION = {
+    "resourceType": "ValueSet",
+    "url": _VS_URL,
+    "expansion": {
+        "total": 1000,
+        "parameter": [
+            {"name": "count", "valueInteger": 1000},
+            {"name": "version", "valueUri": "http://example.org|2024"},
+        ],
+        "contains": [
+            {"system": "http://example.org", "code": str(i), "display": f"C{i}"}
+            for i in range(999)
+        ]
+        + [
+            {
+                "system": "http://example.org",
+                "code": "999",
+                "display": "C999",
+                "version": "2025",
+            }
+        ],
+    },
+}
+
+
+@pytest.mark.parametrize("use_ijson", [True, False])
+def test_iter_expansion_concepts(monkeypatch, use_ijson: bool):
+    if use_ijson:
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(expansion, "ijson", None)
+
+    concepts = list(
+        expansion.iter_expansion_concepts(
+            io.BytesIO(json.dumps(_LARGE_EXPANSION).encode("utf-8"))
+        )
+    )
+
+    assert len(concepts) == 1000
+    assert concepts[0] == ("http://example.org", "0", "C0", "2024")
+    assert concepts[-1] == ("http://example.org", "999", "C999", "2025")
+
+
+@pytest.mark.parametrize("use_ijson", [True, False])
+def test_iter_value_set_expansion_without_expansion(
+    httpserver: HTTPServer, monkeypatch, caplog, use_ijson: bool
+):
+    if use_ijson:
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(expansion, "ijson", None)
+    httpserver.expect_request("/fhir/ValueSet/$expand").respond_with_json(
+        {"resourceType": "ValueSet", "url": _VS_URL}
+    )
+    client = FhirTerminologyClient(httpserver.url_for("/fhir"))
+
+    with caplog.at_level(logging.DEBUG):
+        assert list(client.iter_value_set_expansion(_VS_URL)) == []
+
+    assert [
+        (r.levelno, r.getMessage())
+        for r in caplog.records
+        if r.name == "FhirTerminologyClient"
+    ] == [
+        (
+            logging.WARNING,
+            f"Failed to expand value set '{_VS_URL}' => Returning empty expansion",
+        ),
+        (
+            logging.DEBUG,
+            f"Expansion of value set '{_VS_URL}' failed: Resource of type 'ValueSet' contains no expansion",
+        ),
+    ]
+
+
+@pytest.mark.parametrize("http2", [False, True])
+@pytest.mark.parametrize("cached", [True, False])
+def test_iter_value_set_expansion(
+    httpserver: HTTPServer, tmp_path: Path, cached: bool, http2: bool
+):
+    if http2:
+        pytest.importorskip("httpx")
+    httpserver.expect_request("/fhir/ValueSet/$expand").respond_with_json(
+        _LARGE_EXPANSION
+    )
+    cache = ValueSetExpansionCache(tmp_path) if cached else None
+    client = FhirTerminologyClient(
+        httpserver.url_for("/fhir"),
+        cache=cache,
+        http_config=HTTPConfig(http2=http2, retries=0) if http2 else None,
+    )
+
+    concepts = list(client.iter_value_set_expansion(_VS_URL))
+
+    assert [c.code for c in concepts] == [str(i) for i in range(1000)]
+    assert client.expand_value_set(_VS_URL) == _LARGE_EXPANSION
+
+
+def _paged_expand_handler(requests: list[Request], page_limit: int = 300):
+    def handler(request: Request) -> Response:
+        requests.append(request)
+        contains = _LARGE_EXPANSION["expansion"]["contains"]
+        offset = int(request.args.get("offset", 0))
+        count = min(int(request.args.get("count", len(contains))), page_limit)
+        value_set = {
+            **_LARGE_EXPANSION,
+            "expansion": {
+                **_LARGE_EXPANSION["expansion"],
+                "offset": offset,
+                "contains": contains[offset : offset + count],
+            },
+        }
+        return Response(json.dumps(value_set), content_type="application/fhir+json")
+
+    return handler
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_paged_expand_value_set(httpserver: HTTPServer, tmp_path: Path, cached: bool):
+    requests = []
+    httpserver.expect_request("/fhir/ValueSet/$expand").respond_with_handler(
+        _paged_expand_handler(requests)
+    )
+    cache = ValueSetExpansionCache(tmp_path) if cached else None
+    client = FhirTerminologyClient(
+        httpserver.url_for("/fhir"), cache=cache, page_size=500, page_workers=3
+    )
+
+    value_set = client.expand_value_set(_VS_URL)
+
+    # The server caps pages at 300 concepts => 4 requests
+    assert len(requests) == 4
+    assert sorted(int(r.args["offset"]) for r in requests) == [0, 300, 600, 900]
+    assert (
+        value_set["expansion"]["contains"] == _LARGE_EXPANSION["expansion"]["contains"]
+    )
+    assert "offset" not in value_set["expansion"]
+
+    concepts = list(client.iter_value_set_expansion(_VS_URL))
+    assert [c.code for c in concepts] == [str(i) for i in range(1000)]
+    assert all(c.version == "2024" for c in concepts[:999])
+    assert len(requests) == (4 if cached else 8)
+
+
+def _record_exchanges(server: HTTPServer, archive: ExchangeArchive):
+    server.expect_request("/fhir/ValueSet/$expand").respond_with_json(_EXPANSION)
+    server.expect_request("/fhir/CodeSystem/$lookup").respond_with_data(
+        json.dumps({"resourceType": "Parameters"}), content_type="application/fhir+json"
+    )
+    client = FhirTerminologyClient(server.url_for("/fhir"), archive=archive)
+
+    assert client.expand_value_set(_VS_URL) == _EXPANSION
+    assert list(client.iter_value_set_expansion(_VS_URL, version="1.0.0")) == [
+        expansion.ExpansionConcept("http://example.org", "a", "A", None)
+    ]
+    client.code_system_lookup("http://example.org", "a")
+    archive.flush()
+
+
+@pytest.mark.parametrize("zstd_available", [True, False])
+def test_record_and_replay(
+    httpserver: HTTPServer, tmp_path: Path, monkeypatch, zstd_available: bool
+):
+    if zstd_available:
+        pytest.importorskip("zstandard")
+    else:
+        monkeypatch.setattr(recording, "zstandard", None)
+    archive_path = tmp_path / "recording.ndjson.zst"
+    _record_exchanges(httpserver, ExchangeArchive(archive_path, mode="record"))
+    httpserver.clear()
+
+    archive = ExchangeArchive(archive_path, mode="replay")
+    assert archive.path.suffix == (".zst" if zstd_available else ".gz")
+    assert len(archive) == 3
+    # Exchanges are keyed relative to the base URL and can thus be replayed without the server
+    client = FhirTerminologyClient("http://replay.invalid/fhir", archive=archive)
+    assert client.expand_value_set(_VS_URL) == _EXPANSION
+    assert list(client.iter_value_set_expansion(_VS_URL, version="1.0.0")) == [
+        expansion.ExpansionConcept("http://example.org", "a", "A", None)
+    ]
+    assert client.code_system_lookup("http://example.org", "a").parameter is None
+    with pytest.raises(ConnectionError):
+        client.code_system_lookup("http://example.org", "b")
+    assert len(httpserver.log) == 0
+
+
+def test_record_extends_existing_archive(httpserver: HTTPServer, tmp_path: Path):
+    archive_path = tmp_path / "recording.ndjson.gz"
+    _record_exchanges(httpserver, ExchangeArchive(archive_path, mode="record"))
+
+    archive = ExchangeArchive(archive_path, mode="record")
+    client = FhirTerminologyClient(httpserver.url_for("/fhir"), archive=archive)
+    client.code_system_lookup("http://example.org", "b")
+    archive.flush()
+
+    assert len(ExchangeArchive(archive_path, mode="replay")) == 4
+
+
+def test_replay_requires_existing_archive(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        ExchangeArchive(tmp_path / "missing.ndjson.gz", mode="replay")
@@ -0,0 +1,150 @@
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+from pytest_httpserver import HTTPServer
+from werkzeug import Response
+
+from common.config.project import HTTPConfig
+from common.util.http.client import BaseClient
+from common.util.http.exceptions import ClientError
+from common.util.http import metrics as metrics_module
+from common.util.http.metrics import LatencyHistogram, HTTPMetrics
+
+
+@pytest.fixture
+def metrics() -> HTTPMetrics:
+    metrics = HTTPMetrics.instance()
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for i in range(1, 101):
+        histogram.observe(i / 100)
+
+    assert histogram.count == 100
+    assert histogram.percentile(50) == 0.5
+    assert histogram.percentile(95) == 0.95
+    assert histogram.percentile(99) == 0.99
+    buckets = dict(histogram.cumulative_buckets())
+    assert buckets[0.1] == 10
+    assert buckets[1] == 100
+
+
+def test_base_client_records_metrics(httpserver: HTTPServer, metrics: HTTPMetrics):
+    httpserver.expect_request("/fhir/ValueSet/a").respond_with_data("abcd")
+    httpserver.expect_request("/fhir/ValueSet/b").respond_with_data("ab")
+    httpserver.expect_request("/fhir/ValueSet/c").respond_with_data("", status=404)
+    httpserver.expect_request("/fhir/$lookup", method="POST").respond_with_data("{}")
+    client = BaseClient(
+        httpserver.url_for("/fhir"), http_config=HTTPConfig(metrics_report=False)
+    )
+
+    client.get("ValueSet/{id}", path_params={"id": "a"})
+    client.get("ValueSet/{id}", path_params={"id": "b"})
+    with pytest.raises(ClientError):
+        client.get("ValueSet/{id}", path_params={"id": "c"})
+    client.post("$lookup", body="123")
+
+    report = metrics.report()
+    endpoints = {(e["method"], e["endpoint"]): e for e in report["endpoints"]}
+    authority = f"{httpserver.host}:{httpserver.port}"
+    read = endpoints[("GET", f"{authority}/fhir/ValueSet/{{id}}")]
+    assert read["requests"] == 3
+    assert read["errors"] == 1
+    assert read["status_codes"] == {"200": 2, "404": 1}
+    assert read["bytes_received"] == 6
+    assert read["latency"]["p50"] is not None
+    lookup = endpoints[("POST", f"{authority}/fhir/$lookup")]
+    assert lookup["bytes_sent"] == 3
+    assert report["totals"]["requests"] == 4
+
+
+def test_retries_are_counted(httpserver: HTTPServer, metrics: HTTPMetrics):
+    responses = iter([Response(status=503), Response(status=503), Response("ok")])
+    httpserver.expect_request("/fhir/").respond_with_handler(lambda _: next(responses))
+    client = BaseClient(
+        httpserver.url_for(""),
+        http_config=HTTPConfig(
+            retries=3, backoff_factor=0, coalesce_requests=False, metrics_report=False
+        ),
+    )
+
+    client.get("fhir/")
+
+    report = metrics.report()
+    assert report["totals"]["retries"] == 2
+    assert report["retries"] == [
+        {"method": "GET", "path": "/fhir/", "reasons": {"503": 2}}
+    ]
+    assert report["endpoints"][0]["status_codes"] == {"200": 1}
+
+
+def test_prometheus_export(tmp_path: Path, metrics: HTTPMetrics):
+    metrics.observe_request("GET", 'host/a"b', 200, 0.2, 0, 10)
+    metrics.observe_cache("value_set_expansion", hit=True)
+    metrics.observe_cache("value_set_expansion", hit=False)
+    metrics.observe_cache("value_set_expansion", hit=False)
+
+    text = metrics.to_prometheus()
+    assert (
+        'http_client_requests_total{method="GET",endpoint="host/a\\"b",status="200"} 1'
+        in text
+    )
+    assert (
+        'http_client_request_duration_seconds_bucket{method="GET",endpoint="host/a\\"b",le="0.25"} 1'
+        in text
+    )
+    assert (
+        'http_client_request_duration_seconds_bucket{method="GET",endpoint="host/a\\"b",le="0.1"} 0'
+        in text
+    )
+    assert (
+        'http_client_cache_lookups_total{cache="value_set_expansion",result="miss"} 2'
+        in text
+    )
+
+    report_path = tmp_path / "metrics.json"
+    metrics.write_report(report_path, prometheus=True)
+    with open(report_path, mode="r", encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["caches"]["value_set_expansion"]["hit_ratio"] == pytest.approx(1 / 3)
+    assert report_path.with_suffix(".prom").read_text(encoding="utf-8") == text
+
+
+def test_report_is_opt_in():
+    assert not HTTPConfig().metrics_report
+
+
+def _observe_in_worker() -> int:
+    metrics = HTTPMetrics.instance()
+    metrics.register_report()
+    metrics.observe_request("GET", "host/worker", 200, 0.1, 0, 1)
+    return os.getpid()
+
+
+def test_worker_processes_write_own_reports(
+    tmp_path: Path, metrics: HTTPMetrics, monkeypatch
+):
+    monkeypatch.setattr(metrics_module, "LOGGING_DIR", tmp_path)
+    metrics.observe_request("GET", "host/parent", 200, 0.1, 0, 1)
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("fork")
+    ) as executor:
+        pid = executor.submit(_observe_in_worker).result()
+
+    script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    report_path = tmp_path / f"{script_name}.{pid}.http-metrics.json"
+    assert list(tmp_path.iterdir()) == [report_path]
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+    # Requests of the parent sent before the fork are not part of the worker's report
+    assert [e["endpoint"] for e in report["endpoints"]] == ["host/worker"]
+    assert [e["endpoint"] for e in metrics.report()["endpoints"]] == ["host/parent"]
@@ -0,0 +1,86 @@
+import time
+
+from pytest_httpserver import HTTPServer
+from werkzeug import Response
+
+from common.config.project import HTTPConfig, ThrottlingConfig
+from common.util.http.client import BaseClient
+from common.util.http.throttling import (
+    TokenBucket,
+    AdaptiveConcurrencyLimiter,
+    RequestThrottle,
+)
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, burst=1)
+
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+
+    assert time.monotonic() - start >= 0.19
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=None)
+    bucket.pause(0.3)
+
+    start = time.monotonic()
+    bucket.acquire()
+
+    assert time.monotonic() - start >= 0.29
+
+
+def test_adaptive_concurrency_limiter_aimd():
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=4, min_limit=1, max_limit=8, decrease_factor=0.5
+    )
+
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.limit == 5
+
+    limiter.on_overload()
+    assert limiter.limit == 2
+    limiter.on_overload()
+    limiter.on_overload()
+    assert limiter.limit == 1
+
+    for _ in range(1000):
+        limiter.on_success()
+    assert limiter.limit == 8
+
+
+def test_base_client_honors_retry_after(httpserver: HTTPServer):
+    """
+    Tests whether a 429 response shrinks the concurrency limit and pauses requests for the duration given by the
+    'Retry-After' header
+    """
+    responses = iter(
+        [
+            Response(status=429, headers={"Retry-After": "1"}),
+            Response('{"ok": true}', content_type="application/json"),
+            Response('{"ok": true}', content_type="application/json"),
+        ]
+    )
+    httpserver.expect_request("/fhir/").respond_with_handler(lambda _: next(responses))
+    http_config = HTTPConfig(
+        retries=2,
+        backoff_factor=0,
+        coalesce_requests=False,
+        throttling=ThrottlingConfig(requests_per_second=100, initial_concurrency=4),
+    )
+    client = BaseClient(httpserver.url_for(""), http_config=http_config)
+    throttle = RequestThrottle.for_server(httpserver.url_for(""), http_config)
+
+    start = time.monotonic()
+    assert client.get("fhir/").json() == {"ok": True}
+    assert time.monotonic() - start >= 0.9
+    # Shrunk from 4 to 2 on overload and grown by 1/2 on success
+    assert throttle.limiter.limit == 2
+
+    # Subsequent requests pass without waiting
+    start = time.monotonic()
+    client.get("fhir/")
+    assert time.monotonic() - start < 0.5
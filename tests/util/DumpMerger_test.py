@@ -0,0 +1,113 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import docker
+
+from common.util.sql.dump import read_table_data
+from common.util.sql.merging import DumpMerger, SqlMerger
+
+_SCRIPTS_DIR = Path(__file__).parent / "scripts"
+_MERGED_FILE_NAME = "R__Load_latest_ui_profile.sql"
+
+
+def _docker_available() -> bool:
+    try:
+        docker.from_env().ping()
+        return True
+    except Exception:
+        return False
+
+
+def _read_dump(path: Path):
+    tables = {}
+    for table, columns, values in read_table_data(path):
+        tables.setdefault(table, []).append(values)
+    with open(path, mode="r", encoding="utf-8") as f:
+        sequences = re.findall(r"^SELECT pg_catalog\.setval\(.*\);$", f.read(), re.M)
+    return tables, sequences
+
+
+class DumpMergerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dirs = []
+
+    def tearDown(self):
+        for tmp_dir in self.tmp_dirs:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _copy_scripts(self) -> Path:
+        # The mergers remove the merged scripts
+        tmp_dir = Path(tempfile.mkdtemp())
+        self.tmp_dirs.append(tmp_dir)
+        for filename in os.listdir(_SCRIPTS_DIR):
+            shutil.copy(_SCRIPTS_DIR / filename, tmp_dir / filename)
+        return tmp_dir
+
+    def test_merge(self):
+        script_dir = self._copy_scripts()
+        DumpMerger(sql_script_dir=script_dir).execute_merge()
+
+        self.assertEqual([_MERGED_FILE_NAME], os.listdir(script_dir))
+        tables, sequences = _read_dump(script_dir / _MERGED_FILE_NAME)
+        self.assertEqual(
+            [
+                ("1", "fdpg.mii.icu", "Foo", "1.0.0", "Foo"),
+                ("2", "fdpg.mii.icu", "Bar", "1.0.0", "Baz"),
+                ("3", "fdpg.test.icu", "Bar", "1.0.0", "Bar"),
+            ],
+            tables["context"],
+        )
+        self.assertEqual(
+            [
+                ("1", "http://snomed.info/sct", "123456", "", "foo"),
+                ("2", "http://snomed.info/sct", "456", "", "bar"),
+                ("3", "http://snomed.info/sct", "123", "", "foo"),
+            ],
+            tables["termcode"],
+        )
+        self.assertEqual(
+            ["FooProfile", "FoobarProfile", "BarProfile"],
+            [row[1] for row in tables["ui_profile"]],
+        )
+        # IDs are remapped and the link of 'ccc...' is dropped since it links the same context and term code as 'aaa...'
+        self.assertEqual(
+            [
+                ("aaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaaa", "1", "2", "3"),
+                ("bbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbbb", "3", "3", "3"),
+                ("ddddddd-dddd-dddd-dddd-ddddddddddddd", "2", "1", "2"),
+            ],
+            tables["contextualized_termcode"],
+        )
+        self.assertIn(
+            "SELECT pg_catalog.setval('public.ui_profile_id_seq', 3, true);",
+            sequences,
+        )
+
+    @unittest.skipUnless(_docker_available(), "Docker is not available")
+    def test_matches_sql_merger(self):
+        expected_dir = self._copy_scripts()
+        sql_merger = SqlMerger(
+            sql_script_dir=expected_dir,
+            container_name="dump_merger_test_container",
+            db_port=5431,
+        )
+        try:
+            sql_merger.execute_merge()
+        finally:
+            sql_merger.shutdown()
+        actual_dir = self._copy_scripts()
+        DumpMerger(sql_script_dir=actual_dir).execute_merge()
+
+        self.assertEqual(
+            _read_dump(expected_dir / _MERGED_FILE_NAME),
+            _read_dump(actual_dir / _MERGED_FILE_NAME),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
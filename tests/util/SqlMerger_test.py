@@ -1,27 +1,90 @@
-import unittest
 import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
 from common.util.sql.merging import SqlMerger
+from tests.util.DumpMerger_test import _docker_available
 
+_SCRIPTS_DIR = Path(__file__).parent / "scripts"
+_MERGED_FILE_NAME = "R__Load_latest_ui_profile.sql"
 
+
+@unittest.skipUnless(_docker_available(), "Docker is not available")
 class SqlMergerTest(unittest.TestCase):
 
-    @classmethod
-    def setUpClass(cls):
-        cls.sql_merger = SqlMerger(
-            sql_init_script_dir="../../common/resources/sql", sql_script_dir="./scripts"
-        )
-        cls.merged_script_targetfile = os.path.abspath(
-            f"{cls.sql_merger.sql_script_dir}/R__Load_latest_ui_profile.sql"
+    def setUp(self):
+        # The merger removes the merged scripts
+        self.script_dir = Path(tempfile.mkdtemp())
+        for filename in os.listdir(_SCRIPTS_DIR):
+            shutil.copy(_SCRIPTS_DIR / filename, self.script_dir / filename)
+        self.sql_merger = SqlMerger(
+            sql_script_dir=self.script_dir, container_name="sql_merger_test_container"
         )
 
-    @classmethod
-    def tearDownClass(cls):
-        if os.path.exists(cls.merged_script_targetfile):
-            os.remove(cls.merged_script_targetfile)
+    def tearDown(self):
+        if self.sql_merger.db_container is not None:
+            self.sql_merger.shutdown()
+        shutil.rmtree(self.script_dir, ignore_errors=True)
+
+    def _row_counts(self) -> dict:
+        counts = {}
+        with self.sql_merger.conn.cursor() as cur:
+            for table in [
+                "context",
+                "termcode",
+                "ui_profile",
+                "contextualized_termcode",
+            ]:
+                cur.execute(f"SELECT COUNT(*) FROM public.{table}")
+                counts[table] = cur.fetchone()[0]
+        return counts
 
     def test_merge(self):
         self.sql_merger.execute_merge()
-        self.assertTrue(os.path.exists(self.merged_script_targetfile))
+        self.assertTrue((self.script_dir / _MERGED_FILE_NAME).exists())
+        # The link 'ccc...' is dropped since it links the same context and term code as 'aaa...'
+        self.assertEqual(
+            {
+                "context": 3,
+                "termcode": 3,
+                "ui_profile": 3,
+                "contextualized_termcode": 3,
+            },
+            self._row_counts(),
+        )
+
+    def test_merge_duplicate_profile_names(self):
+        # Module databases do not enforce unique profile names
+        dump_file = self.script_dir / "R__Load_latest_ui_profile_2.sql"
+        dump_file.write_text(
+            dump_file.read_text(encoding="utf-8").replace("BarProfile", "FooProfile"),
+            encoding="utf-8",
+        )
+        self.sql_merger.setup_container_and_get_connection()
+        self.sql_merger.populate_db()
+        self.sql_merger.merge_schemas()
+
+        self.assertEqual(
+            {
+                "context": 3,
+                "termcode": 3,
+                "ui_profile": 2,
+                "contextualized_termcode": 3,
+            },
+            self._row_counts(),
+        )
+        with self.sql_merger.conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT u.name
+                FROM public.contextualized_termcode ct
+                JOIN public.ui_profile u ON u.id = ct.ui_profile_id
+                WHERE ct.context_termcode_hash IN (
+                    'aaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaaa', 'bbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbbb'
+                )
+                """)
+            self.assertEqual([("FooProfile",)], cur.fetchall())
 
 
 if __name__ == "__main__":
@@ -26,14 +26,6 @@ COPY public.context (id, system, code, version, display) FROM stdin;
 \.
 
 
---
--- Data for Name: mapping; Type: TABLE DATA; Schema: public; Owner: -
---
-
-COPY public.mapping (id, name, type, content) FROM stdin;
-\.
-
-
 --
 -- Data for Name: termcode; Type: TABLE DATA; Schema: public; Owner: -
 --
@@ -58,25 +50,9 @@ COPY public.ui_profile (id, name, ui_profile) FROM stdin;
 -- Data for Name: contextualized_termcode; Type: TABLE DATA; Schema: public; Owner: -
 --
 
-COPY public.contextualized_termcode (context_termcode_hash, context_id, termcode_id, mapping_id, ui_profile_id) FROM stdin;
-aaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaaa	1	2	\N	2
-bbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbbb	2	1	\N	2
-\.
-
-
---
--- Data for Name: criteria_set; Type: TABLE DATA; Schema: public; Owner: -
---
-
-COPY public.criteria_set (id, url) FROM stdin;
-\.
-
-
---
--- Data for Name: contextualized_termcode_to_criteria_set; Type: TABLE DATA; Schema: public; Owner: -
---
-
-COPY public.contextualized_termcode_to_criteria_set (context_termcode_hash, criteria_set_id) FROM stdin;
+COPY public.contextualized_termcode (context_termcode_hash, context_id, termcode_id, ui_profile_id) FROM stdin;
+aaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaaa	1	2	2
+bbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbbb	2	1	2
 \.
 
 
@@ -87,20 +63,6 @@ COPY public.contextualized_termcode_to_criteria_set (context_termcode_hash, crit
 SELECT pg_catalog.setval('public.context_id_seq', 3, true);
 
 
---
--- Name: criteria_set_id_seq; Type: SEQUENCE SET; Schema: public; Owner: -
---
-
-SELECT pg_catalog.setval('public.criteria_set_id_seq', 1, false);
-
-
---
--- Name: mapping_id_seq; Type: SEQUENCE SET; Schema: public; Owner: -
---
-
-SELECT pg_catalog.setval('public.mapping_id_seq', 1, false);
-
-
 --
 -- Name: termcode_id_seq; Type: SEQUENCE SET; Schema: public; Owner: -
 --